@@ -6,7 +6,9 @@ from planetarium.models import (
     PlanetariumDome,
     ShowSession,
     Reservation,
-    Ticket
+    Ticket,
+    SeatHold,
+    IdempotencyKey,
 )
 
 admin.site.register(ShowTheme)
@@ -15,3 +17,5 @@ admin.site.register(PlanetariumDome)
 admin.site.register(ShowSession)
 admin.site.register(Reservation)
 admin.site.register(Ticket)
+admin.site.register(SeatHold)
+admin.site.register(IdempotencyKey)
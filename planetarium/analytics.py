@@ -0,0 +1,123 @@
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Cast, NullIf, Trunc, TruncDate
+from django.utils import timezone
+
+from planetarium.models import SessionOccupancy, ShowSession
+
+REFRESH_BATCH_SIZE = 5000
+
+OCCUPANCY_BUCKETS = ("day", "week", "month")
+
+# group_by value: SessionOccupancy field, name key, name lookup
+OCCUPANCY_GROUPS = {
+    "show": (
+        "astronomy_show",
+        "astronomy_show_title",
+        "astronomy_show__title",
+    ),
+    "dome": (
+        "planetarium_dome",
+        "planetarium_dome_name",
+        "planetarium_dome__name",
+    ),
+}
+
+
+def refresh_occupancy(batch_size=REFRESH_BATCH_SIZE) -> int:
+    """
+    Copy the stale show sessions to SessionOccupancy a batch at a time,
+    return how many. Sessions locked by a reservation are left for the
+    next run.
+    """
+    refreshed = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                ShowSession.objects.filter(occupancy_stale=True)
+                .select_for_update(skip_locked=True, of=("self",))
+                .order_by("id")
+                .values(
+                    "id",
+                    "astronomy_show_id",
+                    "planetarium_dome_id",
+                    "tickets_sold",
+                    show_date=TruncDate("show_time"),
+                    capacity=F("planetarium_dome__rows")
+                    * F("planetarium_dome__seats_in_row"),
+                )[:batch_size]
+            )
+            now = timezone.now()
+            SessionOccupancy.objects.bulk_create(
+                [
+                    SessionOccupancy(
+                        show_session_id=session["id"],
+                        astronomy_show_id=session["astronomy_show_id"],
+                        planetarium_dome_id=session["planetarium_dome_id"],
+                        show_date=session["show_date"],
+                        seats_sold=session["tickets_sold"],
+                        capacity=session["capacity"],
+                        refreshed_at=now,
+                    )
+                    for session in batch
+                ],
+                update_conflicts=True,
+                unique_fields=["show_session"],
+                update_fields=[
+                    "astronomy_show",
+                    "planetarium_dome",
+                    "show_date",
+                    "seats_sold",
+                    "capacity",
+                    "refreshed_at",
+                ],
+            )
+            ShowSession.objects.filter(
+                id__in=[session["id"] for session in batch]
+            ).update(occupancy_stale=False)
+        refreshed += len(batch)
+        # Sessions staled again while refreshing wait for the next run
+        if len(batch) < batch_size:
+            return refreshed
+
+
+def get_occupancy(
+    bucket="day",
+    group_by=None,
+    date_from=None,
+    date_to=None,
+    astronomy_show=None,
+    planetarium_dome=None,
+):
+    """
+    Sessions, sold seats, capacity and fill rate per day, week or month
+    of show date, optionally per show or dome
+    """
+    rows = SessionOccupancy.objects.all()
+    if date_from:
+        rows = rows.filter(show_date__gte=date_from)
+    if date_to:
+        rows = rows.filter(show_date__lte=date_to)
+    if astronomy_show:
+        rows = rows.filter(astronomy_show_id=astronomy_show)
+    if planetarium_dome:
+        rows = rows.filter(planetarium_dome_id=planetarium_dome)
+
+    fields = []
+    expressions = {"bucket": Trunc("show_date", bucket)}
+    if group_by:
+        field, name, lookup = OCCUPANCY_GROUPS[group_by]
+        fields.append(field)
+        expressions[name] = F(lookup)
+
+    return (
+        rows.values(*fields, **expressions)
+        .annotate(
+            sessions=Count("show_session"),
+            total_seats_sold=Sum("seats_sold"),
+            total_capacity=Sum("capacity"),
+            fill_rate=Cast(Sum("seats_sold"), FloatField())
+            / NullIf(Sum("capacity"), 0),
+        )
+        .order_by("bucket", *fields)
+    )
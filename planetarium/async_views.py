@@ -0,0 +1,172 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.views import View
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from planetarium.pagination import OptionalCursorPagination
+from planetarium.views import AstronomyShowViewSet, ShowSessionViewSet
+from user.authentication import ClaimsJWTAuthentication, user_states
+
+
+class AsyncJWTAuthentication(ClaimsJWTAuthentication):
+    """ClaimsJWTAuthentication checking the claims through the async ORM"""
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        claims = self.get_user_claims(validated_token)
+        if claims is not None:
+            state = user_states.get(user_id)
+            if state is None:
+                state = await self.aload_user_state(user_id)
+            if state == claims:
+                return self.get_claims_user(user_id, claims)
+
+        # Tokens without claims or with outdated ones are rare, they get
+        # the lookup and checks of JWTAuthentication in a thread
+        return await sync_to_async(
+            super(ClaimsJWTAuthentication, self).get_user
+        )(validated_token)
+
+
+class AsyncReadOnlyView(View):
+    """
+    Serve the list or retrieve action of a viewset from the event loop.
+
+    Filtering, permissions, throttling, serialization and the error
+    responses come from the viewset; only the queries go through the
+    async ORM, so a single ASGI worker doesn't hold a thread per request
+    while Postgres answers. Responses are not read from the catalog
+    cache.
+    """
+
+    viewset_class = None
+    action = None
+
+    def get_viewset(self, request, *args, **kwargs):
+        viewset = self.viewset_class(
+            action=self.action,
+            args=args,
+            kwargs=kwargs,
+            format_kwarg=None,
+            headers={},
+        )
+        authenticator = AsyncJWTAuthentication()
+        viewset.request = Request(
+            request,
+            parsers=viewset.get_parsers(),
+            authenticators=[authenticator],
+            negotiator=viewset.get_content_negotiator(),
+            parser_context=viewset.get_parser_context(request),
+        )
+        viewset.headers = viewset.default_response_headers
+        return viewset, authenticator
+
+    async def get(self, request, *args, **kwargs):
+        viewset, authenticator = self.get_viewset(request, *args, **kwargs)
+        request = viewset.request
+        try:
+            try:
+                user_auth = await authenticator.aauthenticate(request)
+            except Exception:
+                request.user, request.auth = AnonymousUser(), None
+                raise
+            request.user, request.auth = user_auth or (AnonymousUser(), None)
+            # Permissions and throttles may query the database or a cache
+            await sync_to_async(viewset.initial)(request, *args, **kwargs)
+
+            if self.action == "list":
+                response = await self.list(viewset)
+            else:
+                response = await self.retrieve(viewset)
+        except Exception as exc:
+            response = viewset.handle_exception(exc)
+
+        return viewset.finalize_response(request, response, *args, **kwargs)
+
+    async def list(self, viewset):
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        paginator = viewset.paginator
+        if paginator is None:
+            rows = [row async for row in queryset.aiterator(chunk_size=100)]
+            return Response(viewset.get_serializer(rows, many=True).data)
+
+        page = await self.paginate_queryset(
+            paginator, queryset, viewset.request, viewset
+        )
+        serializer = viewset.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @staticmethod
+    async def paginate_queryset(paginator, queryset, request, view):
+        if (
+            isinstance(paginator, OptionalCursorPagination)
+            and paginator.use_cursor(request)
+        ):
+            # A single keyset query, not worth porting to the async ORM
+            return await sync_to_async(paginator.paginate_queryset)(
+                queryset, request, view
+            )
+
+        # LimitOffsetPagination.paginate_queryset with acount/aiterator
+        paginator.request = request
+        paginator.limit = paginator.get_limit(request)
+        if paginator.limit is None:
+            return None
+        paginator.offset = paginator.get_offset(request)
+        paginator.count = await queryset.acount()
+        if paginator.count == 0 or paginator.offset > paginator.count:
+            return []
+        window = queryset[paginator.offset:paginator.offset + paginator.limit]
+        return [row async for row in window.aiterator(chunk_size=100)]
+
+    async def retrieve(self, viewset):
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        lookup_url_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
+        try:
+            instance = await queryset.aget(
+                **{viewset.lookup_field: viewset.kwargs[lookup_url_kwarg]}
+            )
+        except (
+            queryset.model.DoesNotExist,
+            TypeError,
+            ValueError,
+            ValidationError,
+        ):
+            raise Http404
+        viewset.check_object_permissions(viewset.request, instance)
+        return Response(viewset.get_serializer(instance).data)
+
+
+class AsyncShowSessionListView(AsyncReadOnlyView):
+    viewset_class = ShowSessionViewSet
+    action = "list"
+
+
+class AsyncShowSessionDetailView(AsyncReadOnlyView):
+    viewset_class = ShowSessionViewSet
+    action = "retrieve"
+
+
+class AsyncAstronomyShowListView(AsyncReadOnlyView):
+    viewset_class = AstronomyShowViewSet
+    action = "list"
+
+
+class AsyncAstronomyShowDetailView(AsyncReadOnlyView):
+    viewset_class = AstronomyShowViewSet
+    action = "retrieve"
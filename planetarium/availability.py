@@ -0,0 +1,176 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.utils import timezone
+
+from planetarium.models import HeldSeat, Ticket
+
+AVAILABILITY_BATCH_SIZE = 200
+
+
+def free_runs(seats_in_row, occupied_seats):
+    """Yield (first, last) seat of every run of free seats in a row"""
+    first = 1
+    for seat in occupied_seats:
+        if seat > first:
+            yield first, seat - 1
+        first = seat + 1
+    if first <= seats_in_row:
+        yield first, seats_in_row
+
+
+def block_score(rows, seats_in_row, row, first_seat, size) -> float:
+    """
+    Weighted distance of a block of seats from the best row and the
+    middle seat, lower is better, see settings.SEAT_ASSIGNMENT
+    """
+    scoring = settings.SEAT_ASSIGNMENT
+    best_row = 1 + scoring["BEST_ROW"] * (rows - 1)
+    middle_seat = (seats_in_row + 1) / 2
+    block_middle = first_seat + (size - 1) / 2
+    return (
+        scoring["ROW_WEIGHT"] * abs(row - best_row)
+        + scoring["SEAT_WEIGHT"] * abs(block_middle - middle_seat)
+    )
+
+
+def place_block(seats_in_row, first, last, size) -> int:
+    """First seat of the most central block of size seats in a run"""
+    centre = (seats_in_row - size) // 2 + 1
+    return min(max(centre, first), last - size + 1)
+
+
+def place_in_runs(seats_in_row, occupied, size) -> list:
+    """
+    Return the (row, first_seat) of the most central block of size free
+    seats in every run that is long enough, at most one per run.
+    occupied maps each row to its sorted occupied seats.
+    """
+    return [
+        (row, place_block(seats_in_row, first, last, size))
+        for row, row_seats in occupied.items()
+        for first, last in free_runs(seats_in_row, row_seats)
+        if last - first + 1 >= size
+    ]
+
+
+def with_free_rows(rows, occupied) -> dict:
+    return {row: occupied.get(row, ()) for row in range(1, rows + 1)}
+
+
+def suggest_blocks(rows, seats_in_row, occupied, party_size, limit) -> list:
+    """Return up to limit blocks of party_size free seats side by side"""
+    blocks = place_in_runs(
+        seats_in_row, with_free_rows(rows, occupied), party_size
+    )
+    blocks.sort(
+        key=lambda block: block_score(
+            rows, seats_in_row, block[0], block[1], party_size
+        )
+    )
+    return [
+        {"row": row, "seats": list(range(first_seat, first_seat + party_size))}
+        for row, first_seat in blocks[:limit]
+    ]
+
+
+def assign_seats(rows, seats_in_row, occupied, quantity, allow_split):
+    """
+    Pick the best quantity free seats: the best scored block of seats
+    side by side, or with allow_split, the fewest blocks taken from the
+    longest runs. Return a list of (row, seat) or None.
+    """
+    grid = with_free_rows(rows, occupied)
+    blocks = place_in_runs(seats_in_row, grid, quantity)
+    if blocks:
+        row, first_seat = min(
+            blocks,
+            key=lambda block: block_score(
+                rows, seats_in_row, block[0], block[1], quantity
+            ),
+        )
+        return [
+            (row, seat) for seat in range(first_seat, first_seat + quantity)
+        ]
+    if not allow_split:
+        return None
+
+    # Fill the longest runs first, the best placed one on a tie
+    blocks = []
+    for row, row_seats in grid.items():
+        for first, last in free_runs(seats_in_row, row_seats):
+            size = min(last - first + 1, quantity)
+            first_seat = place_block(seats_in_row, first, last, size)
+            blocks.append(
+                (
+                    -size,
+                    block_score(rows, seats_in_row, row, first_seat, size),
+                    row,
+                    first_seat,
+                )
+            )
+    blocks.sort()
+
+    seats = []
+    for size, _, row, first_seat in blocks:
+        size = min(-size, quantity - len(seats))
+        seats.extend(
+            (row, seat) for seat in range(first_seat, first_seat + size)
+        )
+        if len(seats) == quantity:
+            return sorted(seats)
+    return None
+
+
+def get_occupied_seats(show_session_ids) -> dict:
+    """
+    Sorted sold or held seats per row per show session, in one query
+    """
+    occupied = defaultdict(lambda: defaultdict(list))
+    tickets = (
+        Ticket.objects.filter(show_session_id__in=show_session_ids)
+        .order_by()
+        .values_list("show_session_id", "row", "seat")
+    )
+    held_seats = (
+        HeldSeat.objects.filter(
+            show_session_id__in=show_session_ids,
+            hold__expires_at__gt=timezone.now(),
+        )
+        .order_by()
+        .values_list("show_session_id", "row", "seat")
+    )
+    for show_session_id, row, seat in tickets.union(held_seats).order_by(
+        "show_session_id", "row", "seat"
+    ):
+        occupied[show_session_id][row].append(seat)
+    return occupied
+
+
+def find_available_sessions(
+    show_sessions, party_size, limit, blocks_per_session
+) -> list:
+    """
+    Return the first limit show sessions (dicts with id, rows and
+    seats_in_row) that can seat party_size people side by side, with
+    their suggested blocks. Tickets are loaded for a whole batch of
+    sessions at once.
+    """
+    results = []
+    show_sessions = iter(show_sessions)
+    while batch := list(islice(show_sessions, AVAILABILITY_BATCH_SIZE)):
+        occupied = get_occupied_seats([session["id"] for session in batch])
+        for session in batch:
+            blocks = suggest_blocks(
+                session["rows"],
+                session["seats_in_row"],
+                occupied.get(session["id"], {}),
+                party_size,
+                blocks_per_session,
+            )
+            if blocks:
+                results.append({**session, "blocks": blocks})
+                if len(results) == limit:
+                    return results
+    return results
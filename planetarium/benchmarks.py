@@ -0,0 +1,283 @@
+import http.client
+from abc import ABC, abstractmethod
+import json
+import random
+import re
+import statistics
+import threading
+from collections import Counter
+from time import perf_counter
+from types import SimpleNamespace
+from urllib.parse import urlencode, urlsplit
+
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from planetarium.models import ShowSession
+from user.serializers import TokenObtainPairSerializer
+
+QUERIES_PATTERN = re.compile(r'desc="(\d+) queries"')
+
+
+class Scenario(ABC):
+    name = None
+
+    def __init__(self, user, options):
+        self.user = user
+        self.options = options
+        self.random = random.Random(options["seed"])
+        self.lock = threading.Lock()
+        self.show_session_ids = list(
+            ShowSession.objects.order_by("id").values_list("id", flat=True)
+        )
+        if not self.show_session_ids:
+            raise ValueError("No show sessions, run seed_data first.")
+
+    def choice(self, sequence):
+        with self.lock:
+            return self.random.choice(sequence)
+
+    @abstractmethod
+    def request(self, client):
+        """Send one request of the scenario, return the response"""
+
+
+class ListShowSessions(Scenario):
+    name = "list_sessions"
+    url_name = "planetarium:showsession-list"
+
+    def request(self, client):
+        return client.get(
+            reverse(self.url_name), {"limit": self.options["page_size"]}
+        )
+
+
+class RetrieveShowSession(Scenario):
+    name = "retrieve_session"
+    url_name = "planetarium:showsession-detail"
+
+    def request(self, client):
+        return client.get(
+            reverse(self.url_name, args=[self.choice(self.show_session_ids)])
+        )
+
+
+class AsyncListShowSessions(ListShowSessions):
+    name = "list_sessions_async"
+    url_name = "planetarium:async-showsession-list"
+
+
+class AsyncRetrieveShowSession(RetrieveShowSession):
+    name = "retrieve_session_async"
+    url_name = "planetarium:async-showsession-detail"
+
+
+class ReserveSeats(Scenario):
+    """Book a few random seats, concurrent clients compete for them"""
+
+    name = "reserve"
+
+    def __init__(self, user, options):
+        super().__init__(user, options)
+        emptiest = ShowSession.objects.order_by("tickets_sold", "id")[
+            : options["hot_sessions"]
+        ]
+        self.domes = {
+            show_session: (rows, seats_in_row)
+            for show_session, rows, seats_in_row in emptiest.values_list(
+                "id",
+                "planetarium_dome__rows",
+                "planetarium_dome__seats_in_row",
+            )
+        }
+        self.hot_sessions = sorted(self.domes)
+
+    def request(self, client):
+        show_session = self.choice(self.hot_sessions)
+        rows, seats_in_row = self.domes[show_session]
+        with self.lock:
+            row = self.random.randint(1, rows)
+            first_seat = self.random.randint(1, seats_in_row)
+        last_seat = min(first_seat + self.options["tickets"] - 1, seats_in_row)
+        return client.post(
+            reverse("planetarium:reservation-list"),
+            {
+                "tickets": [
+                    {"row": row, "seat": seat, "show_session": show_session}
+                    for seat in range(first_seat, last_seat + 1)
+                ]
+            },
+            content_type="application/json",
+        )
+
+
+class Login(Scenario):
+    """Obtain a token pair, hashing the password of the benchmark user"""
+
+    name = "login"
+    password = "benchmark-password"
+
+    def __init__(self, user, options):
+        super().__init__(user, options)
+        # Hashed with the current PASSWORD_HASHER, no rehash on login
+        user.set_password(self.password)
+        user.save(update_fields=["password"])
+
+    def request(self, client):
+        return client.post(
+            reverse("auth:token_obtain_pair"),
+            {"email": self.user.email, "password": self.password},
+            content_type="application/json",
+        )
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        ListShowSessions,
+        RetrieveShowSession,
+        AsyncListShowSessions,
+        AsyncRetrieveShowSession,
+        ReserveSeats,
+        Login,
+    )
+}
+
+
+class HttpClient:
+    """
+    The part of the test client API the scenarios use, sent over HTTP
+    to a running server to compare WSGI and ASGI deployments
+    """
+
+    def __init__(self, base_url, headers):
+        url = urlsplit(base_url)
+        connection_class = (
+            http.client.HTTPSConnection
+            if url.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.connection = connection_class(url.hostname, url.port)
+        self.prefix = url.path.rstrip("/")
+        self.headers = headers
+
+    def get(self, path, data=None):
+        if data:
+            path = f"{path}?{urlencode(data)}"
+        return self.request("GET", path)
+
+    def post(self, path, data, content_type):
+        return self.request(
+            "POST", path, json.dumps(data), {"Content-Type": content_type}
+        )
+
+    def request(self, method, path, body=None, headers=None):
+        self.connection.request(
+            method,
+            self.prefix + path,
+            body,
+            {**self.headers, **(headers or {})},
+        )
+        response = self.connection.getresponse()
+        response.read()
+        return SimpleNamespace(
+            status_code=response.status, headers=response.headers
+        )
+
+    def close(self):
+        self.connection.close()
+
+
+class BenchmarkResult:
+    def __init__(self, scenario, concurrency):
+        self.scenario = scenario
+        self.concurrency = concurrency
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.queries = []
+        self.statuses = Counter()
+        self.duration = 0.0
+
+    def record(self, latency, response):
+        match = QUERIES_PATTERN.search(
+            response.headers.get("Server-Timing", "")
+        )
+        with self.lock:
+            self.latencies.append(latency)
+            self.statuses[response.status_code] += 1
+            if match:
+                self.queries.append(int(match.group(1)))
+
+    def summary(self) -> dict:
+        percentiles = statistics.quantiles(
+            self.latencies, n=100, method="inclusive"
+        )
+        return {
+            "scenario": self.scenario,
+            "concurrency": self.concurrency,
+            "requests": len(self.latencies),
+            "duration_s": round(self.duration, 3),
+            "rps": round(len(self.latencies) / self.duration, 1),
+            "p50_ms": round(percentiles[49] * 1000, 2),
+            "p95_ms": round(percentiles[94] * 1000, 2),
+            "p99_ms": round(percentiles[98] * 1000, 2),
+            "queries_per_request": (
+                round(statistics.mean(self.queries), 2)
+                if self.queries
+                else None
+            ),
+            "statuses": dict(sorted(self.statuses.items())),
+        }
+
+
+def run_benchmark(
+    scenario, requests, concurrency, base_url=None
+) -> BenchmarkResult:
+    """
+    Drive the scenario through Django test clients in threads,
+    or through HTTP connections to the server at base_url
+    """
+    result = BenchmarkResult(scenario.name, concurrency)
+    token = str(
+        TokenObtainPairSerializer.get_token(scenario.user).access_token
+    )
+    per_worker = [
+        requests // concurrency + (worker < requests % concurrency)
+        for worker in range(concurrency)
+    ]
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(count):
+        if base_url:
+            client = HttpClient(base_url, {"Authorization": f"Bearer {token}"})
+        else:
+            # Not an INTERNAL_IPS address, so the debug toolbar stays out
+            client = Client(
+                HTTP_HOST="localhost",
+                HTTP_AUTHORIZATION=f"Bearer {token}",
+                REMOTE_ADDR="10.0.0.1",
+            )
+        try:
+            barrier.wait()
+            for _ in range(count):
+                start = perf_counter()
+                response = scenario.request(client)
+                result.record(perf_counter() - start, response)
+        finally:
+            if base_url:
+                client.close()
+            connection.close()
+
+    threads = [
+        threading.Thread(target=worker, args=(count,))
+        for count in per_worker
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = perf_counter()
+    for thread in threads:
+        thread.join()
+    result.duration = perf_counter() - start
+    return result
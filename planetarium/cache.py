@@ -0,0 +1,94 @@
+import hashlib
+import json
+import uuid
+
+from django.core.cache import caches
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+CATALOG_CACHE_ALIAS = "catalog"
+
+
+def get_catalog_cache():
+    return caches[CATALOG_CACHE_ALIAS]
+
+
+def namespace_version_key(namespace) -> str:
+    return f"planetarium:catalog:{namespace}:version"
+
+
+def get_namespace_version(namespace) -> str:
+    cache = get_catalog_cache()
+    key = namespace_version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_namespaces(*namespaces) -> None:
+    """Drop every cached response of the namespaces at once"""
+    get_catalog_cache().set_many(
+        {
+            namespace_version_key(namespace): uuid.uuid4().hex
+            for namespace in namespaces
+        },
+        None,
+    )
+
+
+class CachedResponseMixin:
+    """
+    Cache list and retrieve responses per URL in the catalog cache
+    and answer If-None-Match requests with 304 Not Modified.
+    """
+
+    cache_namespace = None
+
+    def get_response_cache_key(self, request) -> str:
+        url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        version = get_namespace_version(self.cache_namespace)
+        return f"planetarium:catalog:{self.cache_namespace}:{version}:{url}"
+
+    def get_cached_response(self, request, get_response):
+        cache = get_catalog_cache()
+        key = self.get_response_cache_key(request)
+
+        cached = cache.get(key)
+        if cached is None:
+            response = get_response()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = JSONRenderer().render(response.data)
+            cached = {
+                "data": json.loads(content),
+                "etag": quote_etag(hashlib.md5(content).hexdigest()),
+            }
+            cache.set(key, cached)
+
+        headers = {"ETag": cached["etag"]}
+        etags = parse_etags(request.headers.get("If-None-Match", ""))
+        if cached["etag"] in etags or "*" in etags:
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers=headers
+            )
+        return Response(cached["data"], headers=headers)
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request,
+            lambda: super(CachedResponseMixin, self).list(
+                request, *args, **kwargs
+            ),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request,
+            lambda: super(CachedResponseMixin, self).retrieve(
+                request, *args, **kwargs
+            ),
+        )
@@ -0,0 +1,51 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = (
+        "A request with this Idempotency-Key is still being processed."
+    )
+    default_code = "idempotency_key_in_use"
+
+
+class IdempotencyKeyMismatch(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = (
+        "This Idempotency-Key was already used with a different request."
+    )
+    default_code = "idempotency_key_mismatch"
+
+
+class HoldExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "The seat hold has expired."
+    default_code = "hold_expired"
+
+
+class ScheduleConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Some of the show sessions overlap in their dome."
+    default_code = "schedule_conflict"
+
+    def __init__(self, conflicts):
+        super().__init__()
+        self.detail = {"detail": self.detail, "conflicts": conflicts}
+
+
+class SeatsUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Some of the requested seats are no longer available."
+    default_code = "seats_unavailable"
+
+    def __init__(self, seats):
+        super().__init__()
+        self.seats = set(seats)
+        self.detail = {
+            "detail": self.detail,
+            "seats": [
+                {"show_session": show_session, "row": row, "seat": seat}
+                for show_session, row, seat in sorted(self.seats)
+            ],
+        }
@@ -0,0 +1,123 @@
+import csv
+from datetime import datetime
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from planetarium.models import Ticket
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+# Column name: Ticket lookup, one row per ticket
+EXPORT_COLUMNS = {
+    "reservation_id": "reservation_id",
+    "reserved_at": "reservation__created_at",
+    "user_email": "reservation__user__email",
+    "ticket_id": "id",
+    "show_session_id": "show_session_id",
+    "show_time": "show_session__show_time",
+    "astronomy_show": "show_session__astronomy_show__title",
+    "planetarium_dome": "show_session__planetarium_dome__name",
+    "row": "row",
+    "seat": "seat",
+}
+
+
+def get_export_queryset(date_from=None, date_to=None, show_session=None):
+    """
+    The tickets joined with their reservation and show session
+    as flat tuples in EXPORT_COLUMNS order
+    """
+    tickets = Ticket.objects.all()
+    if date_from:
+        tickets = tickets.filter(reservation__created_at__date__gte=date_from)
+    if date_to:
+        tickets = tickets.filter(reservation__created_at__date__lte=date_to)
+    if show_session:
+        tickets = tickets.filter(show_session_id=show_session)
+
+    return tickets.order_by("reservation_id", "id").values_list(
+        *EXPORT_COLUMNS.values()
+    )
+
+
+def get_export_rows(chunk_size=EXPORT_CHUNK_SIZE, **filters):
+    """Stream the export rows a chunk at a time"""
+    return get_export_queryset(**filters).iterator(chunk_size=chunk_size)
+
+
+async def aget_export_rows(chunk_size=EXPORT_CHUNK_SIZE, **filters):
+    """Stream the export rows a chunk at a time, for async iteration"""
+    # Each chunk is fetched in the sync thread holding the cursor,
+    # QuerySet.aiterator runs values_list() queries in the event loop
+    rows = get_export_rows(chunk_size=chunk_size, **filters)
+    fetch = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    try:
+        while chunk := await fetch():
+            for row in chunk:
+                yield row
+    finally:
+        await sync_to_async(rows.close)()
+
+
+class Echo:
+    """File-like object returning what is written to it"""
+
+    def write(self, value):
+        return value
+
+
+def get_csv_format():
+    encoder = DjangoJSONEncoder()
+    writer = csv.writer(Echo())
+
+    def format_row(row):
+        # Timestamps formatted as in the NDJSON output
+        return writer.writerow(
+            encoder.default(value) if isinstance(value, datetime) else value
+            for value in row
+        )
+
+    return writer.writerow(EXPORT_COLUMNS), format_row
+
+
+def get_ndjson_format():
+    encoder = DjangoJSONEncoder()
+
+    def format_row(row):
+        return encoder.encode(dict(zip(EXPORT_COLUMNS, row))) + "\n"
+
+    return None, format_row
+
+
+def get_export_format(output):
+    """The header line, or None, and the row formatter of the output"""
+    if output == "csv":
+        return get_csv_format()
+    return get_ndjson_format()
+
+
+def iter_export(output, rows):
+    header, format_row = get_export_format(output)
+    if header is not None:
+        yield header
+    for row in rows:
+        yield format_row(row)
+
+
+async def aiter_export(output, rows):
+    """
+    iter_export over async rows, ASGI servers buffer a sync iterator
+    of a streaming response in full before sending it
+    """
+    header, format_row = get_export_format(output)
+    if header is not None:
+        yield header
+    async for row in rows:
+        yield format_row(row)
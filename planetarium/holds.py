@@ -0,0 +1,44 @@
+from django.db import transaction
+from django.utils import timezone
+
+from planetarium.models import HeldSeat, SeatHold
+from planetarium.occupancy import invalidate_seat_maps
+
+EXPIRE_BATCH_SIZE = 5000
+
+
+def release_expired_seats(show_session_id) -> None:
+    """Free the seats of the expired holds of a locked show session"""
+    HeldSeat.objects.filter(
+        show_session_id=show_session_id,
+        hold__expires_at__lte=timezone.now(),
+    ).delete()
+
+
+def release_holds(hold_ids, show_session_ids) -> None:
+    # HeldSeat has no dependents or signals, so this is a single DELETE
+    # and the holds are left with no seats for the collector to cascade to
+    HeldSeat.objects.filter(hold_id__in=hold_ids).delete()
+    SeatHold.objects.filter(id__in=hold_ids).delete()
+    transaction.on_commit(lambda: invalidate_seat_maps(show_session_ids))
+
+
+def expire_holds(batch_size=EXPIRE_BATCH_SIZE) -> int:
+    """Delete the expired holds a batch at a time, return how many"""
+    now = timezone.now()
+    expired = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                SeatHold.objects.filter(expires_at__lte=now)
+                .select_for_update(skip_locked=True)
+                .order_by("expires_at")
+                .values_list("id", "show_session_id")[:batch_size]
+            )
+            if not batch:
+                return expired
+            release_holds(
+                [hold_id for hold_id, _ in batch],
+                {show_session_id for _, show_session_id in batch},
+            )
+        expired += len(batch)
@@ -0,0 +1,115 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from planetarium.exceptions import IdempotencyKeyInUse, IdempotencyKeyMismatch
+from planetarium.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_KEY_MAX_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+def get_request_hash(request) -> str:
+    data = request.data
+    if hasattr(data, "lists"):
+        data = dict(data.lists())
+    payload = json.dumps(
+        [request.method, request.path, data],
+        sort_keys=True,
+        cls=DjangoJSONEncoder,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def purge_idempotency_keys() -> int:
+    """Delete the keys older than IDEMPOTENCY_KEY_TTL, return how many"""
+    expired = IdempotencyKey.objects.filter(
+        created_at__lte=timezone.now() - settings.IDEMPOTENCY_KEY_TTL
+    )
+    deleted, _ = expired.delete()
+    return deleted
+
+
+def claim_idempotency_key(user, key, request_hash):
+    """
+    Return the new IdempotencyKey of a first request, or the stored
+    response of a replayed one.
+    """
+    with transaction.atomic():
+        IdempotencyKey.objects.filter(
+            user=user,
+            key=key,
+            created_at__lte=timezone.now() - settings.IDEMPOTENCY_KEY_TTL,
+        ).delete()
+        record, created = IdempotencyKey.objects.get_or_create(
+            user=user, key=key, defaults={"request_hash": request_hash}
+        )
+    if created:
+        return record, None
+    if record.request_hash != request_hash:
+        raise IdempotencyKeyMismatch()
+    if record.status_code is None:
+        raise IdempotencyKeyInUse()
+    return None, Response(
+        record.response_body,
+        status=record.status_code,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+class IdempotentCreateMixin:
+    """
+    Handle an Idempotency-Key header on create: the first response is
+    stored with a hash of the request and replayed to retries of the
+    same request for IDEMPOTENCY_KEY_TTL, without creating anything.
+    Server errors are not stored, so those requests can be retried.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not 0 < len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise ValidationError(
+                {
+                    IDEMPOTENCY_HEADER: (
+                        f"Must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} "
+                        "characters long."
+                    )
+                }
+            )
+
+        record, response = claim_idempotency_key(
+            request.user, key, get_request_hash(request)
+        )
+        if response is not None:
+            return response
+
+        try:
+            # The response is stored with the objects it describes
+            with transaction.atomic():
+                response = super().create(request, *args, **kwargs)
+                self.store_response(record, response)
+        except Exception as exc:
+            try:
+                response = self.handle_exception(exc)
+            except Exception:
+                record.delete()
+                raise
+            if response.status_code >= 500:
+                record.delete()
+            else:
+                self.store_response(record, response)
+        return response
+
+    @staticmethod
+    def store_response(record, response) -> None:
+        record.status_code = response.status_code
+        record.response_body = response.data
+        record.save(update_fields=["status_code", "response_body"])
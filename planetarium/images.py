@@ -0,0 +1,140 @@
+import io
+import logging
+import os
+from concurrent.futures import as_completed
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from planetarium.cache import invalidate_namespaces
+from planetarium.models import AstronomyShow
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMAT = "WEBP"
+VARIANT_EXTENSION = ".webp"
+VARIANT_QUALITY = 82
+
+
+def render_variants(content, variants) -> dict:
+    """
+    Resize an encoded image to every variant, return the encoded copies
+    by variant name. Pure Pillow work, run in a worker process.
+    """
+    with Image.open(io.BytesIO(content)) as image:
+        # JPEGs decode straight at a reduced scale when it is large enough
+        image.draft(
+            "RGB",
+            (
+                max(variant["size"][0] for variant in variants.values()),
+                max(variant["size"][1] for variant in variants.values()),
+            ),
+        )
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert(
+                "RGBA" if "transparency" in image.info else "RGB"
+            )
+
+        rendered = {}
+        for name, variant in variants.items():
+            if variant["crop"]:
+                copy = ImageOps.fit(
+                    image, variant["size"], Image.Resampling.LANCZOS
+                )
+            else:
+                copy = image.copy()
+                copy.thumbnail(variant["size"], Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            copy.save(output, VARIANT_FORMAT, quality=VARIANT_QUALITY)
+            rendered[name] = output.getvalue()
+        return rendered
+
+
+def get_image_storage():
+    return AstronomyShow._meta.get_field("image").storage
+
+
+def variant_name(image_name, variant) -> str:
+    root, _ = os.path.splitext(image_name)
+    return f"{root}-{variant}{VARIANT_EXTENSION}"
+
+
+def find_unused_files(names) -> set:
+    """The stored names no show has as its image or one of its variants"""
+    used = Q(image__in=names)
+    for variant in settings.IMAGE_VARIANTS:
+        used |= Q(**{f"image_variants__{variant}__in": names})
+    shows = AstronomyShow.objects.filter(used).values_list(
+        "image", "image_variants"
+    )
+    return set(names).difference(
+        *(
+            {image, *image_variants.values()}
+            for image, image_variants in shows
+        )
+    )
+
+
+def save_variants(show_id, image_name, rendered) -> int:
+    storage = get_image_storage()
+    image_variants = {
+        variant: storage.save(
+            variant_name(image_name, variant), ContentFile(content)
+        )
+        for variant, content in rendered.items()
+    }
+    updated = AstronomyShow.objects.filter(
+        id=show_id, image=image_name
+    ).update(image_variants=image_variants, image_pending=False)
+    if not updated:
+        # The image was replaced or the show deleted meanwhile. Files are
+        # stored by content, another show may have the same ones.
+        for name in find_unused_files(list(image_variants.values())):
+            storage.delete(name)
+    return updated
+
+
+def process_pending_images(executor, batch_size) -> int:
+    """
+    Render the variants of a batch of newly uploaded show images in the
+    executor's worker processes, return how many shows were processed.
+    A show whose image changed meanwhile is left for the next batch,
+    one whose image cannot be read or resized gets no variants.
+    """
+    storage = get_image_storage()
+    pending = (
+        AstronomyShow.objects.filter(image_pending=True)
+        .order_by("id")
+        .values_list("id", "image")[:batch_size]
+    )
+
+    processed = 0
+    futures = {}
+    for show_id, image_name in pending:
+        try:
+            with storage.open(image_name, "rb") as image:
+                content = image.read()
+        except OSError:
+            logger.exception("Cannot read the image %s", image_name)
+            processed += save_variants(show_id, image_name, {})
+            continue
+        future = executor.submit(
+            render_variants, content, settings.IMAGE_VARIANTS
+        )
+        futures[future] = (show_id, image_name)
+
+    for future in as_completed(futures):
+        show_id, image_name = futures[future]
+        try:
+            rendered = future.result()
+        except (OSError, ValueError, Image.DecompressionBombError):
+            logger.exception("Cannot resize the image %s", image_name)
+            rendered = {}
+        processed += save_variants(show_id, image_name, rendered)
+
+    if processed:
+        invalidate_namespaces("shows")
+    return processed
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from planetarium.holds import EXPIRE_BATCH_SIZE, expire_holds
+
+
+class Command(BaseCommand):
+    help = "Delete the expired seat holds, once or every --interval seconds"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep sweeping until interrupted",
+        )
+        parser.add_argument("--interval", type=float, default=5)
+        parser.add_argument(
+            "--batch-size", type=int, default=EXPIRE_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_holds(options["batch_size"])
+            if expired or not options["loop"]:
+                self.stdout.write(f"Expired {expired} seat holds.")
+            if not options["loop"]:
+                return
+            close_old_connections()
+            time.sleep(options["interval"])
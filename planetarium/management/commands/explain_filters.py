@@ -0,0 +1,125 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, migrations, transaction
+from django.db.migrations.loader import MigrationLoader
+
+from planetarium.models import (
+    ShowTheme,
+    AstronomyShow,
+    PlanetariumDome,
+    ShowSession,
+    Reservation,
+)
+
+INDEXED_MODELS = (
+    ShowTheme,
+    AstronomyShow,
+    PlanetariumDome,
+    ShowSession,
+    Reservation,
+)
+
+SEARCH_INDEXES_MIGRATION = ("planetarium", "0009_search_indexes")
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Print query plans of the viewset filters, optionally comparing "
+        "them with the plans without the search indexes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--term", default="show 1")
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Run EXPLAIN ANALYZE to include actual timings",
+        )
+        parser.add_argument(
+            "--compare",
+            action="store_true",
+            help=(
+                "Also show the plans with the search indexes dropped. "
+                "The indexes are restored, but the tables stay locked "
+                "until the command finishes"
+            ),
+        )
+
+    def get_querysets(self, term):
+        show_session = ShowSession.objects.order_by("id").first()
+        reservation = Reservation.objects.order_by("id").first()
+        if show_session is None or reservation is None:
+            raise CommandError(
+                "No data to explain, run the seed_data command first."
+            )
+
+        return {
+            "themes?name": ShowTheme.objects.filter(name__icontains=term),
+            "shows?title": AstronomyShow.objects.filter(
+                title__icontains=term
+            ),
+            "domes?name": PlanetariumDome.objects.filter(
+                name__icontains=term
+            ),
+            "show_sessions?show_title": ShowSession.objects.filter(
+                astronomy_show__title__icontains=term
+            ),
+            "show_sessions?dome_name": ShowSession.objects.filter(
+                planetarium_dome__name__icontains=term
+            ),
+            "show_sessions?date": ShowSession.objects.filter(
+                show_time__date=show_session.show_time.date()
+            ),
+            "reservations": Reservation.objects.filter(
+                user_id=reservation.user_id
+            ).order_by("-created_at"),
+            "reservations?date": Reservation.objects.filter(
+                user_id=reservation.user_id,
+                created_at__date=reservation.created_at.date(),
+            ),
+        }
+
+    def get_search_indexes(self):
+        # Only the indexes added for the filters, not the later ones
+        migration = MigrationLoader(connection).get_migration(
+            *SEARCH_INDEXES_MIGRATION
+        )
+        return [
+            (
+                apps.get_model(migration.app_label, operation.model_name),
+                operation.index,
+            )
+            for operation in migration.operations
+            if isinstance(operation, migrations.AddIndex)
+        ]
+
+    def explain(self, querysets, analyze):
+        for name, queryset in querysets.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain(analyze=analyze))
+            self.stdout.write("")
+
+    def handle(self, *args, **options):
+        querysets = self.get_querysets(options["term"])
+        with connection.cursor() as cursor:
+            for model in INDEXED_MODELS:
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+        if options["compare"]:
+            self.stdout.write(self.style.WARNING("Without search indexes"))
+            try:
+                with transaction.atomic():
+                    with connection.schema_editor() as schema_editor:
+                        for model, index in self.get_search_indexes():
+                            schema_editor.remove_index(model, index)
+                    self.explain(querysets, options["analyze"])
+                    raise Rollback
+            except Rollback:
+                pass
+            self.stdout.write(self.style.WARNING("With search indexes"))
+
+        self.explain(querysets, options["analyze"])
@@ -0,0 +1,65 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from planetarium.export import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_FORMATS,
+    get_export_rows,
+    iter_export,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Export every ticket with its reservation and show session "
+        "as NDJSON or CSV, one flat row per ticket"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=tuple(EXPORT_FORMATS), default="ndjson"
+        )
+        parser.add_argument(
+            "--date-from",
+            type=date.fromisoformat,
+            help="Only reservations made on or after this date (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--date-to",
+            type=date.fromisoformat,
+            help="Only reservations made on or before this date (YYYY-MM-DD)",
+        )
+        parser.add_argument("--show-session", type=int)
+        parser.add_argument(
+            "--chunk-size", type=int, default=EXPORT_CHUNK_SIZE
+        )
+        parser.add_argument(
+            "--output",
+            "-o",
+            help="Write to this file instead of stdout",
+        )
+
+    def handle(self, *args, **options):
+        if (
+            options["date_from"]
+            and options["date_to"]
+            and options["date_from"] > options["date_to"]
+        ):
+            raise CommandError("--date-to must not be before --date-from.")
+
+        chunks = iter_export(
+            options["format"],
+            get_export_rows(
+                date_from=options["date_from"],
+                date_to=options["date_to"],
+                show_session=options["show_session"],
+                chunk_size=options["chunk_size"],
+            ),
+        )
+        if options["output"]:
+            with open(options["output"], "w", newline="") as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from planetarium.cache import invalidate_namespaces
+from planetarium.models import SHOW_IMAGE_DIRECTORY, AstronomyShow
+from planetarium.storage import CONTENT_DIRECTORY, get_show_image_storage
+
+
+def walk(storage, directory):
+    """Yield the names of every file under a storage directory"""
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield f"{directory}/{name}"
+    for name in directories:
+        yield from walk(storage, f"{directory}/{name}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the show images and their variants to content addressed "
+        "names, then delete the image files no show refers to"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace",
+            type=float,
+            default=24,
+            help="Keep orphaned files younger than this many hours, "
+            "they may belong to an upload in progress",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would be moved and deleted",
+        )
+
+    def handle(self, *args, **options):
+        storage = get_show_image_storage()
+        dry_run = options["dry_run"]
+
+        moved = 0
+        shows = (
+            AstronomyShow.objects.exclude(image__isnull=True)
+            .exclude(image="")
+            .values_list("id", "image", "image_variants")
+        )
+        for show_id, image, variants in shows.iterator():
+            names = {
+                name: name
+                for name in (image, *variants.values())
+                if not storage.is_content_name(name) and storage.exists(name)
+            }
+            if not names:
+                continue
+            self.stdout.write(f"Show {show_id}: moving {len(names)} files")
+            if dry_run:
+                continue
+            for name in names:
+                with storage.open(name, "rb") as content:
+                    names[name] = storage.save(name, content)
+            # Unless the show got a new image meanwhile
+            moved += AstronomyShow.objects.filter(
+                id=show_id, image=image
+            ).update(
+                image=names.get(image, image),
+                image_variants={
+                    variant: names.get(name, name)
+                    for variant, name in variants.items()
+                },
+            )
+        if moved:
+            invalidate_namespaces("shows")
+
+        referenced = set()
+        for image, variants in AstronomyShow.objects.values_list(
+            "image", "image_variants"
+        ).iterator():
+            referenced.add(image)
+            referenced.update(variants.values())
+
+        cutoff = timezone.now() - timedelta(hours=options["grace"])
+        removed = 0
+        for directory in (SHOW_IMAGE_DIRECTORY, CONTENT_DIRECTORY):
+            for name in list(walk(storage, directory)):
+                if (
+                    name in referenced
+                    or storage.get_modified_time(name) > cutoff
+                ):
+                    continue
+                self.stdout.write(f"Deleting {name}")
+                if not dry_run:
+                    storage.delete(name)
+                removed += 1
+
+        self.stdout.write(
+            f"Moved the files of {moved} shows, deleted {removed} orphans."
+        )
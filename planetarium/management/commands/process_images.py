@@ -0,0 +1,40 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from planetarium.images import process_pending_images
+
+
+class Command(BaseCommand):
+    help = (
+        "Make the resized variants of the uploaded show images in a pool "
+        "of worker processes, once or every --interval seconds"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep processing until interrupted",
+        )
+        parser.add_argument("--interval", type=float, default=2)
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--batch-size", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                processed = process_pending_images(
+                    executor, options["batch_size"]
+                )
+                if processed or not options["loop"]:
+                    self.stdout.write(f"Processed {processed} show images.")
+                if processed == options["batch_size"]:
+                    continue
+                if not options["loop"]:
+                    return
+                close_old_connections()
+                time.sleep(options["interval"])
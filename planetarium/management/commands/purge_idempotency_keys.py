@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from planetarium.idempotency import purge_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = "Delete the reservation Idempotency-Keys past IDEMPOTENCY_KEY_TTL"
+
+    def handle(self, *args, **options):
+        purged = purge_idempotency_keys()
+        self.stdout.write(f"Purged {purged} idempotency keys.")
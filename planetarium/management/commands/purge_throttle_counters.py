@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from planetarium.throttling import purge_throttle_counters
+
+
+class Command(BaseCommand):
+    help = "Delete the idle counters of the DatabaseThrottleStore"
+
+    def handle(self, *args, **options):
+        purged = purge_throttle_counters()
+        self.stdout.write(f"Purged {purged} throttle counters.")
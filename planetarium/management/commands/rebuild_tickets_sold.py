@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from planetarium.models import ShowSession, Ticket
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ShowSession.tickets_sold counters from tickets"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only verify the counters, exit with an error on mismatch",
+        )
+
+    def handle(self, *args, **options):
+        sold = (
+            Ticket.objects.filter(show_session=OuterRef("pk"))
+            .order_by()
+            .values("show_session")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        with transaction.atomic():
+            mismatched = list(
+                ShowSession.objects.select_for_update()
+                .annotate(actual=Coalesce(Subquery(sold), 0))
+                .exclude(tickets_sold=F("actual"))
+                .order_by("id")
+                .values_list("id", "tickets_sold", "actual")
+            )
+            for show_session_id, tickets_sold, actual in mismatched:
+                self.stdout.write(
+                    f"Show session {show_session_id}: "
+                    f"counter {tickets_sold}, tickets {actual}"
+                )
+
+            if not mismatched:
+                self.stdout.write(
+                    self.style.SUCCESS("All tickets_sold counters match.")
+                )
+                return
+            if options["check"]:
+                raise CommandError(
+                    f"{len(mismatched)} tickets_sold counters do not match."
+                )
+
+            ShowSession.objects.filter(
+                id__in=[row[0] for row in mismatched]
+            ).update(
+                tickets_sold=Coalesce(Subquery(sold), 0),
+                occupancy_stale=True,
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {len(mismatched)} tickets_sold counters."
+            )
+        )
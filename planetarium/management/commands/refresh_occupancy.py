@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from planetarium.analytics import REFRESH_BATCH_SIZE, refresh_occupancy
+from planetarium.models import ShowSession
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the show sessions whose tickets changed since the last run "
+        "to the occupancy analytics table"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Refresh every show session",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=REFRESH_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        if options["full"]:
+            ShowSession.objects.update(occupancy_stale=True)
+        refreshed = refresh_occupancy(options["batch_size"])
+        self.stdout.write(f"Refreshed {refreshed} show sessions.")
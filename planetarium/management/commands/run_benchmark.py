@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hashers_by_algorithm
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from planetarium.benchmarks import SCENARIOS, run_benchmark
+from planetarium.models import Reservation
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the booking hot paths through the Django test client and "
+        "report latency percentiles, throughput and queries per request"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "scenarios",
+            nargs="*",
+            help=(
+                f"Scenarios to run ({', '.join(sorted(SCENARIOS))}), "
+                f"all of them by default"
+            ),
+        )
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            nargs="+",
+            default=[1, 8],
+            help="Run every scenario with each of these client counts",
+        )
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument(
+            "--hot-sessions",
+            type=int,
+            default=5,
+            help="Number of sessions the reserve scenario competes for",
+        )
+        parser.add_argument("--tickets", type=int, default=2)
+        parser.add_argument(
+            "--email", default="benchmark@planetarium.local"
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--url",
+            help=(
+                "Send the requests to a running server instead of the "
+                "in-process test client, e.g. http://localhost:8000"
+            ),
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the reservations made by the benchmark user",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print one JSON summary per line",
+        )
+        parser.add_argument(
+            "--hashers",
+            nargs="+",
+            help=(
+                "Run every scenario with each of these password hasher "
+                "algorithms first in PASSWORD_HASHERS and report the "
+                "requests per second per hashing core, e.g. "
+                "login --hashers pbkdf2_sha256 argon2"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        user, _ = get_user_model().objects.get_or_create(
+            email=options["email"]
+        )
+        names = options["scenarios"] or sorted(SCENARIOS)
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(unknown)}")
+        hashers = get_hashers_by_algorithm()
+        unknown = set(options["hashers"] or ()) - set(hashers)
+        if unknown:
+            raise CommandError(f"Unknown hashers: {', '.join(unknown)}")
+        if options["hashers"] and options["url"]:
+            raise CommandError("--hashers needs the in-process test client.")
+
+        # Conflicting reservations are expected, don't log every 4xx
+        logging.getLogger("django.request").setLevel(logging.ERROR)
+        try:
+            # Measure the application, not the per-user request throttles
+            with override_settings(
+                THROTTLE_STORE="planetarium.throttling.NullThrottleStore"
+            ):
+                for hasher in options["hashers"] or [None]:
+                    with self.prefer_hasher(hashers.get(hasher)):
+                        self.run_scenarios(user, names, hasher, options)
+        except ValueError as error:
+            raise CommandError(error)
+        finally:
+            if not options["keep"]:
+                Reservation.objects.filter(user=user).delete()
+
+    def run_scenarios(self, user, names, hasher, options):
+        for name in names:
+            for concurrency in options["concurrency"]:
+                scenario = SCENARIOS[name](user, options)
+                result = run_benchmark(
+                    scenario,
+                    options["requests"],
+                    concurrency,
+                    options["url"],
+                )
+                summary = result.summary()
+                if hasher:
+                    summary["hasher"] = hasher
+                    summary["rps_per_core"] = round(
+                        summary["rps"] / self.hashing_cores(concurrency), 1
+                    )
+                self.report(summary, options["json"])
+
+    @staticmethod
+    def prefer_hasher(hasher):
+        """Hash the new passwords with hasher"""
+        if hasher is None:
+            return nullcontext()
+        path = f"{type(hasher).__module__}.{type(hasher).__qualname__}"
+        others = [
+            other for other in settings.PASSWORD_HASHERS if other != path
+        ]
+        return override_settings(PASSWORD_HASHERS=[path, *others])
+
+    @staticmethod
+    def hashing_cores(concurrency) -> int:
+        """Cores the clients can keep busy hashing passwords"""
+        cores = min(concurrency, os.cpu_count())
+        if settings.PASSWORD_HASHING_WORKERS:
+            cores = min(cores, settings.PASSWORD_HASHING_WORKERS)
+        return cores
+
+    def report(self, summary, as_json):
+        if as_json:
+            self.stdout.write(json.dumps(summary))
+            return
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(
+                f"{summary['scenario']} "
+                f"(concurrency {summary['concurrency']})"
+            )
+        )
+        self.stdout.write(
+            f"  {summary['requests']} requests in "
+            f"{summary['duration_s']}s, {summary['rps']} req/s\n"
+            f"  p50 {summary['p50_ms']}ms, p95 {summary['p95_ms']}ms, "
+            f"p99 {summary['p99_ms']}ms\n"
+            f"  queries/request {summary['queries_per_request']}, "
+            f"statuses {summary['statuses']}"
+        )
+        if "hasher" in summary:
+            self.stdout.write(
+                f"  {summary['hasher']}: {summary['rps_per_core']} req/s "
+                f"per hashing core"
+            )
@@ -0,0 +1,262 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from planetarium.models import (
+    ShowTheme,
+    AstronomyShow,
+    PlanetariumDome,
+    ShowSession,
+    Reservation,
+    Ticket,
+)
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic dataset for benchmarks and query plans"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="Seed")
+        parser.add_argument("--themes", type=int, default=20)
+        parser.add_argument("--shows", type=int, default=200)
+        parser.add_argument("--domes", type=int, default=10)
+        parser.add_argument("--sessions", type=int, default=5000)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=180,
+            help="Spread sessions over this many days from today",
+        )
+        parser.add_argument(
+            "--fill",
+            type=float,
+            default=0.6,
+            help="Average share of sold seats per session",
+        )
+        parser.add_argument(
+            "--tickets-per-reservation", type=int, default=4
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.prefix = options["prefix"]
+        self.batch_size = options["batch_size"]
+
+        with transaction.atomic():
+            users = self.create_users(options["users"])
+            themes = self.create_themes(options["themes"])
+            shows = self.create_shows(options["shows"], themes)
+            domes = self.create_domes(options["domes"])
+        sessions = self.create_sessions(
+            options["sessions"], options["days"], shows, domes
+        )
+        tickets = self.create_tickets(
+            sessions,
+            users,
+            options["fill"],
+            options["tickets_per_reservation"],
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {len(themes)} themes, {len(shows)} shows, "
+                f"{len(domes)} domes, {len(sessions)} sessions "
+                f"and {tickets} tickets."
+            )
+        )
+
+    def slug(self, value):
+        return self.prefix.lower().replace(" ", "-") + f"-{value}"
+
+    def create_users(self, count):
+        password = make_password(None)
+        get_user_model().objects.bulk_create(
+            [
+                get_user_model()(
+                    email=f"{self.slug(f'user-{i}')}@planetarium.local",
+                    password=password,
+                )
+                for i in range(count)
+            ],
+            ignore_conflicts=True,
+        )
+        return list(
+            get_user_model()
+            .objects.filter(
+                email__startswith=f"{self.slug('user-')}",
+                email__endswith="@planetarium.local",
+            )
+            .values_list("id", flat=True)
+        )
+
+    def create_themes(self, count):
+        ShowTheme.objects.bulk_create(
+            [
+                ShowTheme(name=f"{self.prefix} theme {i}")
+                for i in range(count)
+            ],
+            ignore_conflicts=True,
+        )
+        return list(
+            ShowTheme.objects.filter(
+                name__startswith=f"{self.prefix} theme "
+            )
+        )
+
+    def create_shows(self, count, themes):
+        AstronomyShow.objects.bulk_create(
+            [
+                AstronomyShow(
+                    title=f"{self.prefix} show {i}",
+                    description=f"Synthetic show number {i}",
+                )
+                for i in range(count)
+            ],
+            ignore_conflicts=True,
+        )
+        shows = list(
+            AstronomyShow.objects.filter(
+                title__startswith=f"{self.prefix} show "
+            )
+        )
+        through = AstronomyShow.show_themes.through
+        through.objects.bulk_create(
+            [
+                through(astronomyshow_id=show.id, showtheme_id=theme.id)
+                for show in shows
+                for theme in self.random.sample(
+                    themes, min(len(themes), self.random.randint(1, 3))
+                )
+            ],
+            ignore_conflicts=True,
+        )
+        return shows
+
+    def create_domes(self, count):
+        PlanetariumDome.objects.bulk_create(
+            [
+                PlanetariumDome(
+                    name=f"{self.prefix} dome {i}",
+                    rows=self.random.randint(8, 25),
+                    seats_in_row=self.random.randint(10, 30),
+                )
+                for i in range(count)
+            ],
+            ignore_conflicts=True,
+        )
+        return list(
+            PlanetariumDome.objects.filter(
+                name__startswith=f"{self.prefix} dome "
+            )
+        )
+
+    @staticmethod
+    def get_hours(dome_id, show_time, end_time):
+        """The hourly slots of a dome a session takes"""
+        hour = show_time.replace(minute=0, second=0, microsecond=0)
+        hours = set()
+        while hour < end_time:
+            hours.add((dome_id, hour))
+            hour += timedelta(hours=1)
+        return hours
+
+    def create_sessions(self, count, days, shows, domes):
+        start = timezone.now().replace(minute=0, second=0, microsecond=0)
+        # Slots taken by earlier runs or other sessions are skipped, the
+        # sessions of a dome must not overlap
+        taken = set()
+        for scheduled in ShowSession.objects.filter(
+            planetarium_dome__in=domes,
+            show_time__lt=start + timedelta(days=days),
+            end_time__gt=start,
+        ).values_list("planetarium_dome_id", "show_time", "end_time"):
+            taken |= self.get_hours(*scheduled)
+
+        slots = [
+            (dome, timedelta(days=day, hours=hour))
+            for dome in domes
+            for day in range(days)
+            for hour in range(9, 22)
+        ]
+        sessions = []
+        for dome, offset in self.random.sample(slots, len(slots)):
+            if len(sessions) == count:
+                break
+            show = self.random.choice(shows)
+            show_time = start + offset
+            end_time = ShowSession.get_end_time(show_time, show)
+            hours = self.get_hours(dome.id, show_time, end_time)
+            if hours & taken:
+                continue
+            taken |= hours
+            sessions.append(
+                ShowSession(
+                    astronomy_show=show,
+                    planetarium_dome=dome,
+                    show_time=show_time,
+                    end_time=end_time,
+                )
+            )
+
+        if len(sessions) < count:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Only {len(sessions)} free slots for sessions, "
+                    "raise --days or --domes for more."
+                )
+            )
+        return ShowSession.objects.bulk_create(
+            sessions, batch_size=self.batch_size
+        )
+
+    def create_tickets(self, sessions, users, fill, tickets_per_reservation):
+        created = 0
+        reservations = []
+        tickets = []
+        for session in sessions:
+            dome = session.planetarium_dome
+            share = min(1.0, max(0.0, self.random.gauss(fill, 0.2)))
+            seats = self.random.sample(
+                range(dome.capacity), int(dome.capacity * share)
+            )
+            session.tickets_sold = len(seats)
+            for start in range(0, len(seats), tickets_per_reservation):
+                reservation = Reservation(user_id=self.random.choice(users))
+                reservations.append(reservation)
+                tickets.extend(
+                    Ticket(
+                        row=index // dome.seats_in_row + 1,
+                        seat=index % dome.seats_in_row + 1,
+                        show_session=session,
+                        reservation=reservation,
+                    )
+                    for index in seats[
+                        start:start + tickets_per_reservation
+                    ]
+                )
+            if len(tickets) >= self.batch_size:
+                created += self.flush(reservations, tickets)
+
+        created += self.flush(reservations, tickets)
+        ShowSession.objects.bulk_update(
+            sessions, ["tickets_sold"], batch_size=self.batch_size
+        )
+        return created
+
+    def flush(self, reservations, tickets):
+        count = len(tickets)
+        with transaction.atomic():
+            Reservation.objects.bulk_create(reservations)
+            Ticket.objects.bulk_create(tickets, batch_size=self.batch_size)
+        self.stdout.write(f"Inserted {count} tickets...")
+        reservations.clear()
+        tickets.clear()
+        return count
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-18 04:07
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_tickets_sold(apps, schema_editor):
+    ShowSession = apps.get_model("planetarium", "ShowSession")
+    Ticket = apps.get_model("planetarium", "Ticket")
+    sold = (
+        Ticket.objects.filter(show_session=OuterRef("pk"))
+        .order_by()
+        .values("show_session")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    ShowSession.objects.update(tickets_sold=Coalesce(Subquery(sold), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("planetarium", "0007_astronomyshow_show_themes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="showsession",
+            name="tickets_sold",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            populate_tickets_sold, migrations.RunPython.noop
+        ),
+    ]
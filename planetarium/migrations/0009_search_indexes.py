@@ -0,0 +1,67 @@
+# Generated by Django 5.1.7 on 2026-10-18 04:08
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+import django.db.models.functions.datetime
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("planetarium", "0008_showsession_tickets_sold"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="astronomyshow",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("title"), name="gin_trgm_ops"
+                ),
+                name="astronomyshow_title_trgm",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="planetariumdome",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("name"), name="gin_trgm_ops"
+                ),
+                name="planetariumdome_name_trgm",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                fields=["user", "created_at"], name="reservation_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                django.db.models.functions.datetime.TruncDate("created_at"),
+                name="reservation_created_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="showsession",
+            index=models.Index(
+                django.db.models.functions.datetime.TruncDate("show_time"),
+                name="showsession_show_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="showtheme",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("name"), name="gin_trgm_ops"
+                ),
+                name="showtheme_name_trgm",
+            ),
+        ),
+    ]
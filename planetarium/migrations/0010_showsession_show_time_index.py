@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-18 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("planetarium", "0009_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="showsession",
+            index=models.Index(
+                fields=["show_time", "id"], name="showsession_show_time_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:02
+
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+import planetarium.models
+from django.conf import settings
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import IntegrityError, migrations, models
+from django.db.models import DurationField, F, Value
+
+
+def populate_end_time(apps, schema_editor):
+    # No show has a duration yet
+    ShowSession = apps.get_model("planetarium", "ShowSession")
+    ShowSession.objects.update(
+        end_time=F("show_time")
+        + Value(settings.SHOW_SESSION_DURATION, output_field=DurationField())
+    )
+
+
+def check_overlaps(apps, schema_editor):
+    """Name the sessions the exclusion constraint would fail on"""
+    ShowSession = apps.get_model("planetarium", "ShowSession")
+    conflicts = []
+    # Dome id: id and end time of its session ending last so far
+    latest = {}
+    for session_id, dome_id, show_time, end_time in (
+        ShowSession.objects.order_by("planetarium_dome_id", "show_time", "id")
+        .values_list("id", "planetarium_dome_id", "show_time", "end_time")
+        .iterator()
+    ):
+        previous = latest.get(dome_id)
+        if previous is not None and show_time < previous[1]:
+            conflicts.append((previous[0], session_id))
+        if previous is None or end_time > previous[1]:
+            latest[dome_id] = (session_id, end_time)
+
+    if conflicts:
+        raise IntegrityError(
+            "Show sessions overlap in their planetarium dome, reschedule "
+            "or delete one of each pair before migrating: "
+            + ", ".join(
+                f"{first} and {second}" for first, second in conflicts
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("planetarium", "0012_idempotency_keys"),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.AddField(
+            model_name="astronomyshow",
+            name="duration",
+            field=models.DurationField(
+                blank=True,
+                help_text="Dome time taken by a session of the show, SHOW_SESSION_DURATION when empty",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="showsession",
+            name="end_time",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_end_time, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="showsession",
+            name="end_time",
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.RunPython(check_overlaps, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="showsession",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                expressions=[
+                    ("planetarium_dome", "="),
+                    (
+                        planetarium.models.TsTzRange(
+                            "show_time",
+                            "end_time",
+                            django.contrib.postgres.fields.ranges.RangeBoundary(),
+                        ),
+                        "&&",
+                    ),
+                ],
+                name="showsession_dome_no_overlap",
+            ),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.1.7 on 2026-10-18 04:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("planetarium", "0013_show_session_end_time"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SessionOccupancy",
+            fields=[
+                (
+                    "show_session",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="occupancy",
+                        serialize=False,
+                        to="planetarium.showsession",
+                    ),
+                ),
+                ("show_date", models.DateField()),
+                ("seats_sold", models.PositiveIntegerField()),
+                ("capacity", models.PositiveIntegerField()),
+                ("refreshed_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="showsession",
+            name="occupancy_stale",
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="showsession",
+            index=models.Index(
+                condition=models.Q(("occupancy_stale", True)),
+                fields=["id"],
+                name="showsession_stale_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="sessionoccupancy",
+            name="astronomy_show",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="planetarium.astronomyshow",
+            ),
+        ),
+        migrations.AddField(
+            model_name="sessionoccupancy",
+            name="planetarium_dome",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="planetarium.planetariumdome",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sessionoccupancy",
+            index=models.Index(fields=["show_date"], name="occupancy_show_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="sessionoccupancy",
+            index=models.Index(
+                fields=["astronomy_show", "show_date"],
+                name="occupancy_show_date_show_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sessionoccupancy",
+            index=models.Index(
+                fields=["planetarium_dome", "show_date"],
+                name="occupancy_show_date_dome_idx",
+            ),
+        ),
+    ]
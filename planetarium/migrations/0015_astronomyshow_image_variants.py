@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-18 04:54
+
+from django.db import migrations, models
+
+
+def queue_existing_images(apps, schema_editor):
+    AstronomyShow = apps.get_model("planetarium", "AstronomyShow")
+    AstronomyShow.objects.exclude(image__isnull=True).exclude(image="").update(
+        image_pending=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("planetarium", "0014_session_occupancy"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="astronomyshow",
+            name="image_pending",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name="astronomyshow",
+            name="image_variants",
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        migrations.RunPython(
+            queue_existing_images, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name="astronomyshow",
+            index=models.Index(
+                condition=models.Q(("image_pending", True)),
+                fields=["id"],
+                name="astronomyshow_pending_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 04:56
+
+import planetarium.models
+import planetarium.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("planetarium", "0015_astronomyshow_image_variants"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="astronomyshow",
+            name="image",
+            field=models.ImageField(
+                null=True,
+                storage=planetarium.storage.get_show_image_storage,
+                upload_to=planetarium.models.create_custom_path,
+            ),
+        ),
+    ]
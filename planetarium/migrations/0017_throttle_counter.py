@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("planetarium", "0016_astronomyshow_image_storage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ThrottleCounter",
+            fields=[
+                ("key", models.TextField(primary_key=True, serialize=False)),
+                ("current_window", models.BigIntegerField()),
+                ("current_count", models.PositiveIntegerField()),
+                ("previous_count", models.PositiveIntegerField()),
+                ("expires_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+        # Skip the WAL, losing the counters on a crash is acceptable
+        migrations.RunSQL(
+            "ALTER TABLE planetarium_throttlecounter SET UNLOGGED",
+            "ALTER TABLE planetarium_throttlecounter SET LOGGED",
+        ),
+    ]
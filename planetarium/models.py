@@ -1,16 +1,51 @@
 import os
 import uuid
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import (
+    DateTimeRangeField,
+    RangeBoundary,
+    RangeOperators,
+)
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import F, Func, Q
+from django.db.models.functions import TruncDate, Upper
+from django.utils import timezone
 from django.utils.text import slugify
 
+from planetarium.storage import get_show_image_storage
+
+
+def trigram_index(field_name, name):
+    # icontains filters compare UPPER(column) LIKE UPPER(%value%)
+    return GinIndex(
+        OpClass(Upper(field_name), name="gin_trgm_ops"),
+        name=name,
+    )
+
+
+class TsTzRange(Func):
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
+
+
+def show_session_period():
+    """The [show_time, end_time) range of a show session"""
+    return TsTzRange("show_time", "end_time", RangeBoundary())
+
+
+SHOW_IMAGE_DIRECTORY = "uploads/images"
+
 
 def create_custom_path(instance, filename):
     _, extension = os.path.splitext(filename)
     return os.path.join(
-        "uploads/images/",
+        SHOW_IMAGE_DIRECTORY,
         f"{slugify(instance.title)}-{uuid.uuid4()}{extension}",
     )
 
@@ -18,6 +53,9 @@ def create_custom_path(instance, filename):
 class ShowTheme(models.Model):
     name = models.CharField(max_length=63, unique=True)
 
+    class Meta:
+        indexes = [trigram_index("name", "showtheme_name_trgm")]
+
     def __str__(self):
         return self.name
 
@@ -25,8 +63,78 @@ class ShowTheme(models.Model):
 class AstronomyShow(models.Model):
     title = models.CharField(max_length=255, unique=True)
     description = models.TextField()
-    image = models.ImageField(null=True, upload_to=create_custom_path)
+    image = models.ImageField(
+        null=True,
+        upload_to=create_custom_path,
+        storage=get_show_image_storage,
+    )
+    # Variant name: storage name of a resized copy, see IMAGE_VARIANTS
+    image_variants = models.JSONField(default=dict, editable=False)
+    # Set on upload, cleared once process_images made the variants
+    image_pending = models.BooleanField(default=False, editable=False)
     show_themes = models.ManyToManyField(ShowTheme)
+    duration = models.DurationField(
+        null=True,
+        blank=True,
+        help_text=(
+            "Dome time taken by a session of the show, "
+            "SHOW_SESSION_DURATION when empty"
+        ),
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The saved duration, to reschedule sessions only when it changes
+        if "duration" in field_names:
+            instance._saved_duration = values[field_names.index("duration")]
+        return instance
+
+    @property
+    def session_duration(self):
+        return self.duration or settings.SHOW_SESSION_DURATION
+
+    def is_duration_changed(self, update_fields) -> bool:
+        if self._state.adding:
+            # A new show has no sessions yet
+            return False
+        if update_fields is not None and "duration" not in update_fields:
+            return False
+        if not hasattr(self, "_saved_duration"):
+            # Not loaded from the database, the sessions tell
+            return True
+        saved = self._saved_duration or settings.SHOW_SESSION_DURATION
+        return saved != self.session_duration
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        duration_changed = self.is_duration_changed(update_fields)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if duration_changed:
+                self.reschedule_sessions()
+        if update_fields is None or "duration" in update_fields:
+            self._saved_duration = self.duration
+
+    def reschedule_sessions(self) -> None:
+        """
+        Move the end times of the sessions to the current duration, an
+        edit making them overlap fails on the exclusion constraint
+        """
+        end_time = F("show_time") + self.session_duration
+        self.showsession_set.exclude(end_time=end_time).update(
+            end_time=end_time
+        )
+
+    class Meta:
+        indexes = [
+            trigram_index("title", "astronomyshow_title_trgm"),
+            models.Index(
+                fields=["id"],
+                condition=Q(image_pending=True),
+                name="astronomyshow_pending_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -41,6 +149,9 @@ class PlanetariumDome(models.Model):
     def capacity(self) -> int:
         return self.rows * self.seats_in_row
 
+    class Meta:
+        indexes = [trigram_index("name", "planetariumdome_name_trgm")]
+
     def __str__(self):
         return self.name
 
@@ -51,15 +162,125 @@ class ShowSession(models.Model):
         PlanetariumDome, on_delete=models.CASCADE
     )
     show_time = models.DateTimeField()
+    end_time = models.DateTimeField(editable=False)
+    tickets_sold = models.PositiveIntegerField(default=0, editable=False)
+    # Set whenever the session or its tickets change, cleared once
+    # refresh_occupancy has copied it to SessionOccupancy
+    occupancy_stale = models.BooleanField(default=True, editable=False)
+
+    @staticmethod
+    def get_end_time(show_time, astronomy_show):
+        return show_time + astronomy_show.session_duration
+
+    def save(self, *args, **kwargs):
+        show_time = self._meta.get_field("show_time").to_python(
+            self.show_time
+        )
+        self.end_time = self.get_end_time(show_time, self.astronomy_show)
+        self.occupancy_stale = True
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def adjust_tickets_sold(counts) -> None:
+        """
+        Apply {show_session_id: delta} changes to the sold counters, a
+        counter going below zero fails on the positive check constraint
+        """
+        for show_session_id, delta in sorted(counts.items()):
+            if delta:
+                ShowSession.objects.filter(id=show_session_id).update(
+                    tickets_sold=F("tickets_sold") + delta,
+                    occupancy_stale=True,
+                )
 
     def __str__(self):
         return f"{self.astronomy_show} {self.show_time}"
 
+    class Meta:
+        indexes = [
+            models.Index(
+                TruncDate("show_time"), name="showsession_show_date_idx"
+            ),
+            models.Index(
+                fields=["show_time", "id"], name="showsession_show_time_idx"
+            ),
+            models.Index(
+                fields=["id"],
+                condition=Q(occupancy_stale=True),
+                name="showsession_stale_idx",
+            ),
+        ]
+        constraints = [
+            # Backed by a GiST index, overlap lookups on the same
+            # expression use it too (needs the btree_gist extension)
+            ExclusionConstraint(
+                name="showsession_dome_no_overlap",
+                expressions=[
+                    ("planetarium_dome", RangeOperators.EQUAL),
+                    (show_session_period(), RangeOperators.OVERLAPS),
+                ],
+            ),
+        ]
+
+
+class SessionOccupancy(models.Model):
+    """
+    Sold seats and capacity of a show session, copied from ShowSession
+    by refresh_occupancy for the analytics endpoints
+    """
+
+    show_session = models.OneToOneField(
+        ShowSession,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="occupancy",
+    )
+    astronomy_show = models.ForeignKey(
+        AstronomyShow, on_delete=models.CASCADE, related_name="+"
+    )
+    planetarium_dome = models.ForeignKey(
+        PlanetariumDome, on_delete=models.CASCADE, related_name="+"
+    )
+    show_date = models.DateField()
+    seats_sold = models.PositiveIntegerField()
+    capacity = models.PositiveIntegerField()
+    refreshed_at = models.DateTimeField()
+
+    @property
+    def fill_rate(self) -> float:
+        return self.seats_sold / self.capacity if self.capacity else 0.0
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["show_date"], name="occupancy_show_date_idx"
+            ),
+            models.Index(
+                fields=["astronomy_show", "show_date"],
+                name="occupancy_show_date_show_idx",
+            ),
+            models.Index(
+                fields=["planetarium_dome", "show_date"],
+                name="occupancy_show_date_dome_idx",
+            ),
+        ]
+
 
 class Reservation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "created_at"],
+                name="reservation_user_created_idx",
+            ),
+            models.Index(
+                TruncDate("created_at"), name="reservation_created_date_idx"
+            ),
+        ]
+
 
 class Ticket(models.Model):
     row = models.IntegerField()
@@ -92,6 +313,31 @@ class Ticket(models.Model):
                     }
                 )
 
+    @staticmethod
+    def find_taken_seats(seats) -> set:
+        """Return the (show_session_id, row, seat) triples already sold"""
+        seats = set(seats)
+        if not seats:
+            return set()
+        candidates = Ticket.objects.filter(
+            show_session_id__in={seat[0] for seat in seats},
+            row__in={seat[1] for seat in seats},
+            seat__in={seat[2] for seat in seats},
+        ).order_by()
+        return seats.intersection(
+            candidates.values_list("show_session_id", "row", "seat")
+        )
+
+    @staticmethod
+    def is_seat_conflict(error) -> bool:
+        """Whether an IntegrityError is a seat sold twice"""
+        # A unique_violation, the seats are the only unique key to break
+        cause = error.__cause__
+        return (
+            getattr(cause, "sqlstate", None) == "23505"
+            and cause.diag.table_name == Ticket._meta.db_table
+        )
+
     def clean(self):
         Ticket.validate_ticket(
             self.row,
@@ -118,3 +364,98 @@ class Ticket(models.Model):
     class Meta:
         unique_together = ("show_session", "row", "seat")
         ordering = ["row", "seat"]
+
+
+class SeatHold(models.Model):
+    show_session = models.ForeignKey(
+        ShowSession, on_delete=models.CASCADE, related_name="holds"
+    )
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    @property
+    def is_active(self) -> bool:
+        return self.expires_at > timezone.now()
+
+    def __str__(self):
+        return f"{self.show_session} (until {self.expires_at})"
+
+    class Meta:
+        ordering = ["expires_at"]
+
+
+class HeldSeat(models.Model):
+    hold = models.ForeignKey(
+        SeatHold, on_delete=models.CASCADE, related_name="seats"
+    )
+    # Copied from the hold, so a seat can only be held once per session
+    show_session = models.ForeignKey(ShowSession, on_delete=models.CASCADE)
+    row = models.IntegerField()
+    seat = models.IntegerField()
+
+    @staticmethod
+    def find_held_seats(seats) -> set:
+        """Return the (show_session_id, row, seat) triples held now"""
+        seats = set(seats)
+        if not seats:
+            return set()
+        candidates = HeldSeat.objects.filter(
+            show_session_id__in={seat[0] for seat in seats},
+            row__in={seat[1] for seat in seats},
+            seat__in={seat[2] for seat in seats},
+            hold__expires_at__gt=timezone.now(),
+        ).order_by()
+        return seats.intersection(
+            candidates.values_list("show_session_id", "row", "seat")
+        )
+
+    def __str__(self):
+        return f"{self.show_session} (row: {self.row}, seat: {self.seat})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["show_session", "row", "seat"],
+                name="heldseat_unique_seat",
+            ),
+        ]
+        ordering = ["row", "seat"]
+
+
+class IdempotencyKey(models.Model):
+    """The stored response of a request sent with an Idempotency-Key"""
+
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.key
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="idempotencykey_unique_key"
+            ),
+        ]
+
+
+class ThrottleCounter(models.Model):
+    """
+    Requests of a throttle key in its current and previous rate window,
+    counted by planetarium.throttling.DatabaseThrottleStore. The table is
+    UNLOGGED, the counters are lost on a crash of the database.
+    """
+
+    key = models.TextField(primary_key=True)
+    current_window = models.BigIntegerField()
+    current_count = models.PositiveIntegerField()
+    previous_count = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
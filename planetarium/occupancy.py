@@ -0,0 +1,91 @@
+import base64
+
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from planetarium.models import HeldSeat, Ticket
+
+SEAT_MAP_CACHE_TIMEOUT = 60 * 5
+
+
+def seat_map_cache_key(show_session_id) -> str:
+    return f"planetarium:seat-map:{show_session_id}"
+
+
+def build_occupancy_bitmap(rows, seats_in_row, occupied_seats) -> bytes:
+    """
+    Pack occupied (row, seat) pairs into a row-major bitmap where
+    seat (1, 1) is the most significant bit of the first byte.
+    """
+    bitmap = bytearray((rows * seats_in_row + 7) // 8)
+    for row, seat in occupied_seats:
+        # Tickets left outside of a dome made smaller
+        if not (1 <= row <= rows and 1 <= seat <= seats_in_row):
+            continue
+        index = (row - 1) * seats_in_row + (seat - 1)
+        bitmap[index // 8] |= 0x80 >> (index % 8)
+    return bytes(bitmap)
+
+
+def count_held_seats():
+    """The seats of the live holds of the outer show session, in SQL"""
+    held_seats = (
+        HeldSeat.objects.filter(
+            show_session_id=OuterRef("id"),
+            hold__expires_at__gt=timezone.now(),
+        )
+        .order_by()
+        .values("show_session_id")
+        .annotate(count=Count("*"))
+        .values("count")
+    )
+    return Coalesce(Subquery(held_seats), 0)
+
+
+def get_seat_map(show_session) -> dict:
+    key = seat_map_cache_key(show_session.id)
+    seat_map = cache.get(key)
+    if seat_map is None:
+        planetarium_dome = show_session.planetarium_dome
+        tickets = (
+            Ticket.objects.filter(show_session_id=show_session.id)
+            .order_by()
+            .values_list("row", "seat", Value(False))
+        )
+        held_seats = (
+            HeldSeat.objects.filter(
+                show_session_id=show_session.id,
+                hold__expires_at__gt=timezone.now(),
+            )
+            .order_by()
+            .values_list("row", "seat", Value(True))
+        )
+        occupied_seats = list(tickets.union(held_seats, all=True))
+        seats_held = sum(held for _, _, held in occupied_seats)
+        bitmap = build_occupancy_bitmap(
+            planetarium_dome.rows,
+            planetarium_dome.seats_in_row,
+            [(row, seat) for row, seat, _ in occupied_seats],
+        )
+        seat_map = {
+            "show_session": show_session.id,
+            "rows": planetarium_dome.rows,
+            "seats_in_row": planetarium_dome.seats_in_row,
+            "tickets_taken": len(occupied_seats) - seats_held,
+            "seats_held": seats_held,
+            "encoding": "base64",
+            "bitmap": base64.b64encode(bitmap).decode("ascii"),
+        }
+        cache.set(key, seat_map, SEAT_MAP_CACHE_TIMEOUT)
+    return seat_map
+
+
+def invalidate_seat_maps(show_session_ids) -> None:
+    cache.delete_many(
+        [
+            seat_map_cache_key(show_session_id)
+            for show_session_id in set(show_session_ids)
+        ]
+    )
@@ -0,0 +1,183 @@
+import json
+from functools import reduce
+from operator import and_, or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    CursorPagination,
+    LimitOffsetPagination,
+    _reverse_ordering,
+)
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination positioned on every ordering field. The parent
+    class positions on the first field only and pages through rows
+    sharing it with an offset, which skips or repeats them as they change.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = self.filter_after_position(
+                queryset, current_position, reverse
+            )
+
+        # One extra row tells whether there is a following page
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            following_position = None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def filter_after_position(self, queryset, position, reverse):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        # (a, b) > (x, y) as a > x OR (a = x AND b > y)
+        conditions = []
+        for index, (order, value) in enumerate(zip(self.ordering, values)):
+            field = order.lstrip("-")
+            lookup = "lt" if reverse != order.startswith("-") else "gt"
+            equal = [
+                Q(**{previous.lstrip("-"): previous_value})
+                for previous, previous_value in zip(
+                    self.ordering[:index], values[:index]
+                )
+            ]
+            conditions.append(
+                reduce(and_, equal, Q(**{f"{field}__{lookup}": value}))
+            )
+        try:
+            return queryset.filter(reduce(or_, conditions))
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field = order.lstrip("-")
+            if isinstance(instance, dict):
+                values.append(instance[field])
+            else:
+                values.append(getattr(instance, field))
+        return json.dumps([str(value) for value in values])
+
+
+class OptionalCursorPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination by default, keyset (cursor) pagination
+    without a total count when the client asks for it with
+    ?pagination=cursor or follows a ?cursor= link.
+    """
+
+    pagination_query_param = "pagination"
+    cursor_query_param = "cursor"
+    cursor_ordering = None
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def use_cursor(self, request) -> bool:
+        return (
+            request.query_params.get(self.pagination_query_param) == "cursor"
+            or self.cursor_query_param in request.query_params
+        )
+
+    def get_cursor_paginator(self) -> CursorPagination:
+        paginator = KeysetCursorPagination()
+        paginator.ordering = self.cursor_ordering
+        paginator.cursor_query_param = self.cursor_query_param
+        paginator.page_size_query_param = self.limit_query_param
+        paginator.max_page_size = self.max_limit
+        return paginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.get_cursor_paginator()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append(
+            {
+                "name": self.pagination_query_param,
+                "required": False,
+                "in": "query",
+                "description": (
+                    "Set to 'cursor' for keyset pagination "
+                    "without a total count."
+                ),
+                "schema": {"type": "string", "enum": ["cursor"]},
+            }
+        )
+        parameters.extend(
+            parameter
+            for parameter in (
+                self.get_cursor_paginator().get_schema_operation_parameters(
+                    view
+                )
+            )
+            if parameter["name"] == self.cursor_query_param
+        )
+        return parameters
+
+
+class ShowSessionPagination(OptionalCursorPagination):
+    cursor_ordering = ("show_time", "id")
+
+
+class ReservationPagination(OptionalCursorPagination):
+    cursor_ordering = ("created_at", "id")
@@ -0,0 +1,77 @@
+from functools import cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.relations import RelatedField
+
+
+def collect_related_lookups(serializer, model, prefix="", many=False):
+    select_related, prefetch_related = set(), set()
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*":
+            continue
+
+        current_model, path, field_many = model, prefix, many
+        nested = field
+        if isinstance(field, serializers.ListSerializer):
+            nested = field.child
+        attrs = field.source_attrs
+        if isinstance(field, RelatedField):
+            if field.use_pk_only_optimization():
+                # Primary keys are read from the <name>_id column
+                attrs = attrs[:-1]
+
+        for attr in attrs:
+            try:
+                model_field = current_model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                break
+            if not model_field.is_relation:
+                break
+            path = f"{path}__{attr}" if path else attr
+            field_many = field_many or (
+                model_field.many_to_many or model_field.one_to_many
+            )
+            (prefetch_related if field_many else select_related).add(path)
+            current_model = model_field.related_model
+        else:
+            if isinstance(nested, serializers.BaseSerializer) and attrs:
+                nested_select, nested_prefetch = collect_related_lookups(
+                    nested, current_model, path, field_many
+                )
+                select_related |= nested_select
+                prefetch_related |= nested_prefetch
+
+    return select_related, prefetch_related
+
+
+@cache
+def get_related_lookups(serializer_class) -> tuple:
+    """
+    Return the (select_related, prefetch_related) lookups needed to
+    render a model serializer without a query per row
+    """
+    model = getattr(getattr(serializer_class, "Meta", None), "model", None)
+    if model is None:
+        return (), ()
+
+    select_related, prefetch_related = collect_related_lookups(
+        serializer_class(), model
+    )
+    return tuple(sorted(select_related)), tuple(sorted(prefetch_related))
+
+
+class EagerLoadingMixin:
+    """Load the relations rendered by the current serializer up front"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        select_related, prefetch_related = get_related_lookups(
+            self.get_serializer_class()
+        )
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
@@ -0,0 +1,93 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.utils import timezone
+
+from planetarium.models import ShowSession, show_session_period
+
+MAX_BULK_SESSIONS = 5000
+
+MAX_SCHEDULE_DAYS = 366
+
+
+def expand_recurrence(weekdays, times, date_from, date_to):
+    """
+    Yield every show time at the given times of day, in the current time
+    zone, on the ISO weekdays (1 is Monday) from date_from to date_to
+    """
+    tz = timezone.get_current_timezone()
+    times = sorted(set(times))
+    day = date_from
+    while day <= date_to:
+        if day.isoweekday() in weekdays:
+            for time in times:
+                yield datetime.combine(day, time, tzinfo=tz)
+        day += timedelta(days=1)
+
+
+def find_overlapping_sessions(planetarium_dome_id, start, end):
+    """
+    Sessions of a dome taking dome time between start and end, found
+    with the GiST index of the showsession_dome_no_overlap constraint
+    """
+    return (
+        ShowSession.objects.annotate(period=show_session_period())
+        .filter(
+            planetarium_dome_id=planetarium_dome_id,
+            period__overlap=DateTimeTZRange(start, end),
+        )
+    )
+
+
+def find_schedule_conflicts(sessions, exclude=()) -> list:
+    """
+    Check new (planetarium_dome_id, show_time, end_time) sessions
+    against each other and the existing sessions of their domes, loaded
+    in one query. Once sorted by show time, a session overlapping any
+    earlier one overlaps the one ending last.
+    """
+    schedules = defaultdict(list)
+    for planetarium_dome_id, show_time, end_time in sessions:
+        schedules[planetarium_dome_id].append((show_time, end_time, None))
+
+    existing = ShowSession.objects.none()
+    for planetarium_dome_id, schedule in schedules.items():
+        existing |= find_overlapping_sessions(
+            planetarium_dome_id,
+            min(session[0] for session in schedule),
+            max(session[1] for session in schedule),
+        )
+    existing = existing.exclude(id__in=exclude).values_list(
+        "planetarium_dome_id", "show_time", "end_time", "id"
+    )
+    for planetarium_dome_id, show_time, end_time, show_session_id in existing:
+        schedules[planetarium_dome_id].append(
+            (show_time, end_time, show_session_id)
+        )
+
+    conflicts = []
+    for planetarium_dome_id, schedule in sorted(schedules.items()):
+        schedule.sort(key=lambda session: session[0])
+        last = None
+        for session in schedule:
+            if (
+                last is not None
+                and session[0] < last[1]
+                and (session[2] is None or last[2] is None)
+            ):
+                if session[2] is None:
+                    new, other = session, last
+                else:
+                    new, other = last, session
+                conflicts.append(
+                    {
+                        "planetarium_dome": planetarium_dome_id,
+                        "show_time": new[0],
+                        "conflicts_with": other[0],
+                        "show_session": other[2],
+                    }
+                )
+            if last is None or session[1] > last[1]:
+                last = session
+    return conflicts
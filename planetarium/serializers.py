@@ -1,7 +1,14 @@
+from collections import Counter
+from itertools import islice
+from datetime import timedelta
+
+from django.conf import settings
 from django.core.validators import MaxLengthValidator
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from rest_framework.validators import UniqueValidator
+from rest_framework.validators import UniqueValidator, UniqueTogetherValidator
 
 from planetarium.models import (
     ShowTheme,
@@ -9,10 +16,78 @@ from planetarium.models import (
     PlanetariumDome,
     ShowSession,
     Reservation,
-    Ticket
+    Ticket,
+    SeatHold,
+    HeldSeat,
+)
+from planetarium.analytics import OCCUPANCY_BUCKETS, OCCUPANCY_GROUPS
+from planetarium.availability import assign_seats, get_occupied_seats
+from planetarium.exceptions import (
+    HoldExpired,
+    ScheduleConflict,
+    SeatsUnavailable,
+)
+from planetarium.export import EXPORT_FORMATS
+from planetarium.holds import release_expired_seats, release_holds
+from planetarium.occupancy import invalidate_seat_maps
+from planetarium.scheduling import (
+    MAX_BULK_SESSIONS,
+    MAX_SCHEDULE_DAYS,
+    expand_recurrence,
+    find_schedule_conflicts,
 )
 
 
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Resolve each distinct primary key only once per serializer"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._instances = {}
+
+    def to_internal_value(self, data):
+        key = str(data)
+        if key not in self._instances:
+            self._instances[key] = super().to_internal_value(data)
+        return self._instances[key]
+
+
+class ValuesListSerializer(serializers.ListSerializer):
+    """
+    Render QuerySet.values() rows that already hold every field of the
+    child serializer, skipping the per row field machinery. Only the
+    fields named in the child's Meta.values_formatted_fields go through
+    their to_representation, the other values are copied as they are.
+    """
+
+    def to_representation(self, data):
+        rows = data.all() if isinstance(data, models.Manager) else data
+        if not rows or not isinstance(rows[0], dict):
+            return super().to_representation(rows)
+
+        names = [field.field_name for field in self.child._readable_fields]
+        formatters = {}
+        for name in self.child.Meta.values_formatted_fields:
+            field = self.child.fields[name]
+            if isinstance(field, serializers.DateTimeField) and not hasattr(
+                field, "timezone"
+            ):
+                # Resolve the active time zone once, not for every row
+                field.timezone = field.default_timezone()
+            formatters[name] = field.to_representation
+        return [
+            {
+                name: (
+                    formatters[name](row[name])
+                    if name in formatters and row[name] is not None
+                    else row[name]
+                )
+                for name in names
+            }
+            for row in rows
+        ]
+
+
 class ShowThemeSerializer(serializers.ModelSerializer):
     name = serializers.CharField(
         validators=[
@@ -29,6 +104,19 @@ class ShowThemeSerializer(serializers.ModelSerializer):
         )
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """URLs of the resized copies of a show image by variant name"""
+
+    def to_representation(self, value):
+        storage = AstronomyShow._meta.get_field("image").storage
+        request = self.context.get("request")
+        urls = {}
+        for variant, name in value.items():
+            url = storage.url(name)
+            urls[variant] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
 class AstronomyShowSerializer(serializers.ModelSerializer):
     title = serializers.CharField(
         validators=[
@@ -36,6 +124,46 @@ class AstronomyShowSerializer(serializers.ModelSerializer):
             MaxLengthValidator(255),
         ]
     )
+    image = serializers.ImageField(read_only=True)
+    image_variants = ImageVariantsField(
+        help_text="Empty until the uploaded image has been resized"
+    )
+
+    def check_schedule(self, attrs) -> None:
+        """The sessions of the show must not overlap at the new duration"""
+        if self.instance is None or "duration" not in attrs:
+            return
+        duration = attrs["duration"] or settings.SHOW_SESSION_DURATION
+        if duration == self.instance.session_duration:
+            return
+        sessions = list(
+            self.instance.showsession_set.values_list(
+                "id", "planetarium_dome_id", "show_time"
+            )
+        )
+        conflicts = find_schedule_conflicts(
+            [
+                (planetarium_dome_id, show_time, show_time + duration)
+                for _, planetarium_dome_id, show_time in sessions
+            ],
+            exclude=[show_session_id for show_session_id, _, _ in sessions],
+        )
+        if conflicts:
+            raise ScheduleConflict(conflicts)
+
+    def validate(self, attrs):
+        data = super(AstronomyShowSerializer, self).validate(attrs)
+        self.check_schedule(attrs)
+        return data
+
+    def save(self, **kwargs):
+        # Sessions written around the check hit the exclusion constraint
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError:
+            self.check_schedule(self.validated_data)
+            raise
 
     class Meta:
         model = AstronomyShow
@@ -44,7 +172,28 @@ class AstronomyShowSerializer(serializers.ModelSerializer):
             "title",
             "description",
             "show_themes",
+            "duration",
+            "image",
+            "image_variants",
+        )
+
+
+class AstronomyShowImageSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
+    def update(self, instance, validated_data):
+        # The variants of the new image are made by process_images
+        validated_data.update(image_variants={}, image_pending=True)
+        return super().update(instance, validated_data)
+
+    class Meta:
+        model = AstronomyShow
+        fields = (
+            "id",
+            "image",
+            "image_variants",
         )
+        extra_kwargs = {"image": {"required": True, "allow_null": False}}
 
 
 class AstronomyShowListSerializer(AstronomyShowSerializer):
@@ -78,7 +227,79 @@ class PlanetariumDomeSerializer(serializers.ModelSerializer):
         )
 
 
+class DomeScheduleFilterSerializer(serializers.Serializer):
+    date_from = serializers.DateField(
+        required=False, help_text="Defaults to today"
+    )
+    date_to = serializers.DateField(
+        required=False, help_text="Defaults to a week after date_from"
+    )
+
+    def validate(self, attrs):
+        data = super(DomeScheduleFilterSerializer, self).validate(attrs)
+        data.setdefault("date_from", timezone.localdate())
+        data.setdefault("date_to", data["date_from"] + timedelta(days=6))
+        if data["date_from"] > data["date_to"]:
+            raise ValidationError(
+                {"date_to": "date_to must not be before date_from."}
+            )
+        if (data["date_to"] - data["date_from"]).days >= MAX_SCHEDULE_DAYS:
+            raise ValidationError(
+                {
+                    "date_to": (
+                        f"The window is limited to {MAX_SCHEDULE_DAYS} days."
+                    )
+                }
+            )
+        return data
+
+
+class DomeScheduleSerializer(serializers.Serializer):
+    id = serializers.IntegerField(read_only=True)
+    astronomy_show_title = serializers.CharField(read_only=True)
+    show_time = serializers.DateTimeField(read_only=True)
+    end_time = serializers.DateTimeField(read_only=True)
+
+
 class ShowSessionSerializer(serializers.ModelSerializer):
+    def get_schedule(self, attrs):
+        """(planetarium_dome_id, show_time, end_time) after the save"""
+        instance = self.instance
+        astronomy_show = attrs.get(
+            "astronomy_show", instance and instance.astronomy_show
+        )
+        planetarium_dome = attrs.get(
+            "planetarium_dome", instance and instance.planetarium_dome
+        )
+        show_time = attrs.get("show_time", instance and instance.show_time)
+        return (
+            planetarium_dome.id,
+            show_time,
+            ShowSession.get_end_time(show_time, astronomy_show),
+        )
+
+    def check_schedule(self, attrs) -> None:
+        conflicts = find_schedule_conflicts(
+            [self.get_schedule(attrs)],
+            exclude=[self.instance.id] if self.instance else (),
+        )
+        if conflicts:
+            raise ScheduleConflict(conflicts)
+
+    def validate(self, attrs):
+        data = super(ShowSessionSerializer, self).validate(attrs)
+        self.check_schedule(attrs)
+        return data
+
+    def save(self, **kwargs):
+        # A session written around the check hits the exclusion constraint
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError:
+            self.check_schedule(self.validated_data)
+            raise
+
     class Meta:
         model = ShowSession
         fields = (
@@ -86,6 +307,7 @@ class ShowSessionSerializer(serializers.ModelSerializer):
             "astronomy_show",
             "planetarium_dome",
             "show_time",
+            "end_time",
         )
 
 
@@ -114,6 +336,9 @@ class ShowSessionListSerializer(ShowSessionSerializer):
             "planetarium_dome_capacity",
             "tickets_available"
         )
+        # ShowSessionViewSet lists values() rows computed in SQL
+        list_serializer_class = ValuesListSerializer
+        values_formatted_fields = ("show_time",)
 
 
 class ShowSessionRetrieveSerializer(ShowSessionSerializer):
@@ -121,7 +346,220 @@ class ShowSessionRetrieveSerializer(ShowSessionSerializer):
     planetarium_dome = ShowThemeSerializer(many=False, read_only=True)
 
 
+class ShowSessionSeatMapSerializer(serializers.Serializer):
+    show_session = serializers.IntegerField(read_only=True)
+    rows = serializers.IntegerField(read_only=True)
+    seats_in_row = serializers.IntegerField(read_only=True)
+    tickets_taken = serializers.IntegerField(read_only=True)
+    seats_held = serializers.IntegerField(read_only=True)
+    encoding = serializers.CharField(read_only=True)
+    bitmap = serializers.CharField(
+        read_only=True,
+        help_text=(
+            "Row-major occupancy bitmap, one bit per seat. "
+            "Seat (1, 1) is the most significant bit of the first byte."
+        ),
+    )
+
+
+class ShowSessionAvailabilityFilterSerializer(serializers.Serializer):
+    party_size = serializers.IntegerField(min_value=1)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    astronomy_show = serializers.IntegerField(required=False, min_value=1)
+    planetarium_dome = serializers.IntegerField(required=False, min_value=1)
+    limit = serializers.IntegerField(
+        required=False, default=20, min_value=1, max_value=100
+    )
+    blocks = serializers.IntegerField(
+        required=False,
+        default=3,
+        min_value=1,
+        max_value=20,
+        help_text="Suggested seat blocks per show session",
+    )
+
+    def validate(self, attrs):
+        data = super(ShowSessionAvailabilityFilterSerializer, self).validate(
+            attrs
+        )
+        if (
+            "date_from" in attrs
+            and "date_to" in attrs
+            and attrs["date_from"] > attrs["date_to"]
+        ):
+            raise ValidationError(
+                {"date_to": "date_to must not be before date_from."}
+            )
+        return data
+
+
+class SeatBlockSerializer(serializers.Serializer):
+    row = serializers.IntegerField(read_only=True)
+    seats = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True
+    )
+
+
+class ShowSessionAvailabilitySerializer(serializers.Serializer):
+    id = serializers.IntegerField(read_only=True)
+    show_time = serializers.DateTimeField(read_only=True)
+    astronomy_show_title = serializers.CharField(read_only=True)
+    planetarium_dome_name = serializers.CharField(read_only=True)
+    tickets_available = serializers.IntegerField(read_only=True)
+    blocks = SeatBlockSerializer(many=True, read_only=True)
+
+
+class ShowSessionBulkItemSerializer(serializers.Serializer):
+    astronomy_show = CachedPrimaryKeyRelatedField(
+        queryset=AstronomyShow.objects.all()
+    )
+    planetarium_dome = CachedPrimaryKeyRelatedField(
+        queryset=PlanetariumDome.objects.all()
+    )
+    show_time = serializers.DateTimeField()
+
+
+class ShowSessionRecurrenceSerializer(serializers.Serializer):
+    astronomy_show = CachedPrimaryKeyRelatedField(
+        queryset=AstronomyShow.objects.all()
+    )
+    planetarium_dome = CachedPrimaryKeyRelatedField(
+        queryset=PlanetariumDome.objects.all()
+    )
+    weekdays = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=7),
+        allow_empty=False,
+        help_text="ISO weekdays, 1 is Monday",
+    )
+    times = serializers.ListField(
+        child=serializers.TimeField(),
+        allow_empty=False,
+        help_text="Times of day in the server time zone",
+    )
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+
+    def validate(self, attrs):
+        data = super(ShowSessionRecurrenceSerializer, self).validate(attrs)
+        if attrs["date_from"] > attrs["date_to"]:
+            raise ValidationError(
+                {"date_to": "date_to must not be before date_from."}
+            )
+        return data
+
+
+class ShowSessionBulkCreateSerializer(serializers.Serializer):
+    """
+    Schedule many show sessions at once, listed one by one or as
+    a recurrence rule, in a single transaction
+    """
+
+    sessions = ShowSessionBulkItemSerializer(
+        many=True,
+        required=False,
+        allow_empty=False,
+        max_length=MAX_BULK_SESSIONS,
+    )
+    recurrence = ShowSessionRecurrenceSerializer(required=False)
+
+    def validate(self, attrs):
+        data = super(ShowSessionBulkCreateSerializer, self).validate(attrs)
+        if ("sessions" in attrs) == ("recurrence" in attrs):
+            raise ValidationError(
+                "Provide either a list of sessions or a recurrence."
+            )
+        if "recurrence" in attrs:
+            recurrence = data.pop("recurrence")
+            show_times = list(
+                islice(
+                    expand_recurrence(
+                        recurrence["weekdays"],
+                        recurrence["times"],
+                        recurrence["date_from"],
+                        recurrence["date_to"],
+                    ),
+                    MAX_BULK_SESSIONS + 1,
+                )
+            )
+            if not show_times:
+                raise ValidationError(
+                    {"recurrence": "The recurrence has no show times."}
+                )
+            if len(show_times) > MAX_BULK_SESSIONS:
+                raise ValidationError(
+                    {
+                        "recurrence": (
+                            "The recurrence has more than "
+                            f"{MAX_BULK_SESSIONS} show times."
+                        )
+                    }
+                )
+            data["sessions"] = [
+                {
+                    "astronomy_show": recurrence["astronomy_show"],
+                    "planetarium_dome": recurrence["planetarium_dome"],
+                    "show_time": show_time,
+                }
+                for show_time in show_times
+            ]
+        return data
+
+    @transaction.atomic
+    def create(self, validated_data):
+        sessions = validated_data["sessions"]
+        planetarium_dome_ids = sorted(
+            {session["planetarium_dome"].id for session in sessions}
+        )
+
+        schedule = [
+            (
+                session["planetarium_dome"].id,
+                session["show_time"],
+                ShowSession.get_end_time(
+                    session["show_time"], session["astronomy_show"]
+                ),
+            )
+            for session in sessions
+        ]
+
+        # Concurrent schedules of the same domes queue up here
+        list(
+            PlanetariumDome.objects.select_for_update()
+            .filter(id__in=planetarium_dome_ids)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        self.check_schedule(schedule)
+
+        # Sessions created one by one don't lock the dome, one written
+        # around the check hits the exclusion constraint
+        try:
+            with transaction.atomic():
+                return ShowSession.objects.bulk_create(
+                    [
+                        ShowSession(**session, end_time=end_time)
+                        for session, (_, _, end_time) in zip(
+                            sessions, schedule
+                        )
+                    ]
+                )
+        except IntegrityError:
+            self.check_schedule(schedule)
+            raise
+
+    @staticmethod
+    def check_schedule(schedule) -> None:
+        conflicts = find_schedule_conflicts(schedule)
+        if conflicts:
+            raise ScheduleConflict(conflicts)
+
+
 class TicketSerializer(serializers.ModelSerializer):
+    show_session = CachedPrimaryKeyRelatedField(
+        queryset=ShowSession.objects.select_related("planetarium_dome")
+    )
+
     def validate(self, attrs):
         data = super(TicketSerializer, self).validate(attrs=attrs)
         Ticket.validate_ticket(
@@ -140,6 +578,9 @@ class TicketSerializer(serializers.ModelSerializer):
             "seat",
             "show_session",
         )
+        # Seat uniqueness is checked for all tickets of a reservation
+        # at once in ReservationSerializer.validate_tickets
+        validators = []
 
 
 class TicketRetrieveSerializer(TicketSerializer):
@@ -149,11 +590,84 @@ class TicketRetrieveSerializer(TicketSerializer):
 class ReservationSerializer(serializers.ModelSerializer):
     tickets = TicketSerializer(many=True, read_only=False, allow_empty=False)
 
+    @staticmethod
+    def get_seats(tickets) -> list:
+        return [
+            (ticket["show_session"].id, ticket["row"], ticket["seat"])
+            for ticket in tickets
+        ]
+
+    @staticmethod
+    def find_unavailable_seats(seats) -> set:
+        return Ticket.find_taken_seats(seats) | HeldSeat.find_held_seats(
+            seats
+        )
+
+    def validate_tickets(self, tickets):
+        seats = self.get_seats(tickets)
+        taken_seats = self.find_unavailable_seats(seats)
+
+        errors = []
+        requested_seats = set()
+        for seat in seats:
+            if seat in taken_seats or seat in requested_seats:
+                errors.append(
+                    {
+                        "non_field_errors": [
+                            UniqueTogetherValidator.message.format(
+                                field_names="show_session, row, seat"
+                            )
+                        ]
+                    }
+                )
+            else:
+                errors.append({})
+            requested_seats.add(seat)
+
+        if any(errors):
+            raise ValidationError(errors, code="unique")
+        return tickets
+
+    @staticmethod
+    def lock_show_sessions(show_session_ids) -> None:
+        # Lock the sessions in a stable order, so concurrent reservations
+        # of the same session queue up here instead of racing to insert
+        list(
+            ShowSession.objects.select_for_update()
+            .filter(id__in=show_session_ids)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         tickets_data = validated_data.pop("tickets")
+        seats = self.get_seats(tickets_data)
+        show_session_ids = sorted({seat[0] for seat in seats})
+
+        self.lock_show_sessions(show_session_ids)
+        taken_seats = self.find_unavailable_seats(seats)
+        if taken_seats:
+            raise SeatsUnavailable(taken_seats)
+
+        return self.save_reservation(validated_data, tickets_data)
+
+    def save_reservation(self, validated_data, tickets_data):
+        """Write a reservation of free seats, the sessions are locked"""
+        seats = self.get_seats(tickets_data)
+        show_session_ids = sorted({seat[0] for seat in seats})
+        # Reported by the view if a seat was sold around the lock
+        self.requested_seats = seats
+
         reservation = Reservation.objects.create(**validated_data)
-        for ticket_data in tickets_data:
-            Ticket.objects.create(reservation=reservation, **ticket_data)
+        Ticket.objects.bulk_create(
+            [
+                Ticket(reservation=reservation, **ticket_data)
+                for ticket_data in tickets_data
+            ]
+        )
+        ShowSession.adjust_tickets_sold(Counter(seat[0] for seat in seats))
+        transaction.on_commit(lambda: invalidate_seat_maps(show_session_ids))
         return reservation
 
     class Meta:
@@ -167,3 +681,262 @@ class ReservationSerializer(serializers.ModelSerializer):
 
 class ReservationRetrieveSerializer(ReservationSerializer):
     tickets = TicketRetrieveSerializer(many=True, read_only=True)
+
+
+class ReservationAutoAssignSerializer(ReservationSerializer):
+    """Reserve the best available seats, see settings.SEAT_ASSIGNMENT"""
+
+    tickets = TicketSerializer(many=True, read_only=True)
+    show_session = CachedPrimaryKeyRelatedField(
+        queryset=ShowSession.objects.select_related("planetarium_dome"),
+        write_only=True,
+    )
+    quantity = serializers.IntegerField(min_value=1, write_only=True)
+    allow_split = serializers.BooleanField(
+        default=False,
+        write_only=True,
+        help_text=(
+            "Accept seats in several blocks when no block of "
+            "quantity seats side by side is free"
+        ),
+    )
+
+    def validate_quantity(self, quantity):
+        max_quantity = settings.SEAT_ASSIGNMENT["MAX_QUANTITY"]
+        if quantity > max_quantity:
+            raise ValidationError(
+                f"Ensure this value is less than or equal to {max_quantity}."
+            )
+        return quantity
+
+    @transaction.atomic
+    def create(self, validated_data):
+        show_session = validated_data.pop("show_session")
+        quantity = validated_data.pop("quantity")
+        allow_split = validated_data.pop("allow_split")
+        planetarium_dome = show_session.planetarium_dome
+
+        self.lock_show_sessions([show_session.id])
+        seats = assign_seats(
+            planetarium_dome.rows,
+            planetarium_dome.seats_in_row,
+            get_occupied_seats([show_session.id]).get(show_session.id, {}),
+            quantity,
+            allow_split,
+        )
+        if seats is None:
+            raise ValidationError(
+                {
+                    "quantity": (
+                        f"{quantity} seats side by side are not available."
+                        if not allow_split
+                        else f"{quantity} seats are not available."
+                    )
+                }
+            )
+
+        return self.save_reservation(
+            validated_data,
+            [
+                {"show_session": show_session, "row": row, "seat": seat}
+                for row, seat in seats
+            ],
+        )
+
+    class Meta:
+        model = Reservation
+        fields = (
+            "id",
+            "created_at",
+            "tickets",
+            "show_session",
+            "quantity",
+            "allow_split",
+        )
+
+
+class ReservationExportFilterSerializer(serializers.Serializer):
+    output = serializers.ChoiceField(
+        choices=tuple(EXPORT_FORMATS), default="ndjson"
+    )
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    show_session = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        data = super(ReservationExportFilterSerializer, self).validate(attrs)
+        if (
+            "date_from" in attrs
+            and "date_to" in attrs
+            and attrs["date_from"] > attrs["date_to"]
+        ):
+            raise ValidationError(
+                {"date_to": "date_to must not be before date_from."}
+            )
+        return data
+
+
+class HeldSeatSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HeldSeat
+        fields = (
+            "row",
+            "seat",
+        )
+
+
+class SeatHoldSerializer(serializers.ModelSerializer):
+    show_session = CachedPrimaryKeyRelatedField(
+        queryset=ShowSession.objects.select_related("planetarium_dome")
+    )
+    seats = HeldSeatSerializer(many=True, allow_empty=False)
+    ttl = serializers.IntegerField(
+        min_value=1,
+        required=False,
+        write_only=True,
+        help_text="Seconds to hold the seats, at most SEAT_HOLD_TTL",
+    )
+
+    def validate(self, attrs):
+        data = super(SeatHoldSerializer, self).validate(attrs=attrs)
+        planetarium_dome = attrs["show_session"].planetarium_dome
+        requested_seats = set()
+        for seat in attrs["seats"]:
+            Ticket.validate_ticket(
+                seat["row"], seat["seat"], planetarium_dome, ValidationError
+            )
+            if (seat["row"], seat["seat"]) in requested_seats:
+                raise ValidationError(
+                    {"seats": "Each seat can only be held once."}
+                )
+            requested_seats.add((seat["row"], seat["seat"]))
+        return data
+
+    @staticmethod
+    def check_held_seats(user, show_session, seats) -> None:
+        """A user can't hold more than SEAT_HOLD_MAX_SEATS per session"""
+        # The show session is locked, holds of the user can't race
+        held = HeldSeat.objects.filter(
+            hold__user=user,
+            show_session=show_session,
+            hold__expires_at__gt=timezone.now(),
+        ).count()
+        if held + len(seats) > settings.SEAT_HOLD_MAX_SEATS:
+            raise ValidationError(
+                {
+                    "seats": (
+                        f"At most {settings.SEAT_HOLD_MAX_SEATS} seats can "
+                        f"be held in a show session, {held} already are."
+                    )
+                }
+            )
+
+    @transaction.atomic
+    def create(self, validated_data):
+        show_session = validated_data["show_session"]
+        seats = [
+            (show_session.id, seat["row"], seat["seat"])
+            for seat in validated_data.pop("seats")
+        ]
+        ttl = timedelta(seconds=validated_data.pop("ttl", 0))
+        max_ttl = settings.SEAT_HOLD_TTL
+
+        ReservationSerializer.lock_show_sessions([show_session.id])
+        release_expired_seats(show_session.id)
+        self.check_held_seats(validated_data["user"], show_session, seats)
+        taken_seats = ReservationSerializer.find_unavailable_seats(seats)
+        if taken_seats:
+            raise SeatsUnavailable(taken_seats)
+
+        hold = SeatHold.objects.create(
+            expires_at=timezone.now() + min(ttl or max_ttl, max_ttl),
+            **validated_data,
+        )
+        HeldSeat.objects.bulk_create(
+            [
+                HeldSeat(
+                    hold=hold,
+                    show_session_id=show_session_id,
+                    row=row,
+                    seat=seat,
+                )
+                for show_session_id, row, seat in seats
+            ]
+        )
+        transaction.on_commit(lambda: invalidate_seat_maps([show_session.id]))
+        return hold
+
+    @transaction.atomic
+    def confirm(self, user):
+        """Turn the held seats into a reservation and drop the hold"""
+        hold = self.instance
+        ReservationSerializer.lock_show_sessions([hold.show_session_id])
+        seats = list(
+            HeldSeat.objects.filter(
+                hold_id=hold.id, hold__expires_at__gt=timezone.now()
+            ).values_list("row", "seat")
+        )
+        if not seats:
+            raise HoldExpired()
+
+        release_holds([hold.id], [hold.show_session_id])
+        return ReservationSerializer().save_reservation(
+            {"user": user},
+            [
+                {"show_session": hold.show_session, "row": row, "seat": seat}
+                for row, seat in seats
+            ],
+        )
+
+    class Meta:
+        model = SeatHold
+        fields = (
+            "id",
+            "show_session",
+            "seats",
+            "ttl",
+            "created_at",
+            "expires_at",
+        )
+        read_only_fields = ("expires_at",)
+
+
+class OccupancyFilterSerializer(serializers.Serializer):
+    bucket = serializers.ChoiceField(choices=OCCUPANCY_BUCKETS, default="day")
+    group_by = serializers.ChoiceField(
+        choices=tuple(OCCUPANCY_GROUPS), required=False
+    )
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    astronomy_show = serializers.IntegerField(required=False, min_value=1)
+    planetarium_dome = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        data = super(OccupancyFilterSerializer, self).validate(attrs)
+        if (
+            "date_from" in attrs
+            and "date_to" in attrs
+            and attrs["date_from"] > attrs["date_to"]
+        ):
+            raise ValidationError(
+                {"date_to": "date_to must not be before date_from."}
+            )
+        return data
+
+
+class OccupancySerializer(serializers.Serializer):
+    bucket = serializers.DateField(
+        read_only=True, help_text="First day of the day, week or month"
+    )
+    astronomy_show = serializers.IntegerField(read_only=True)
+    astronomy_show_title = serializers.CharField(read_only=True)
+    planetarium_dome = serializers.IntegerField(read_only=True)
+    planetarium_dome_name = serializers.CharField(read_only=True)
+    sessions = serializers.IntegerField(read_only=True)
+    seats_sold = serializers.IntegerField(
+        source="total_seats_sold", read_only=True
+    )
+    capacity = serializers.IntegerField(
+        source="total_capacity", read_only=True
+    )
+    fill_rate = serializers.FloatField(read_only=True)
@@ -0,0 +1,120 @@
+from django.db.models import Count, QuerySet
+from django.db.models.signals import (
+    post_save,
+    post_delete,
+    pre_delete,
+    pre_save,
+    m2m_changed,
+)
+from django.dispatch import receiver
+
+from planetarium.cache import invalidate_namespaces
+from planetarium.models import (
+    ShowTheme,
+    AstronomyShow,
+    PlanetariumDome,
+    ShowSession,
+    Reservation,
+    Ticket,
+)
+from planetarium.occupancy import invalidate_seat_maps
+
+
+@receiver(pre_save, sender=Ticket)
+def remember_ticket_show_session(sender, instance, raw=False, **kwargs):
+    # An edit may move the ticket to another show session
+    if raw or instance._state.adding:
+        return
+    instance._previous_show_session_id = (
+        Ticket.objects.filter(pk=instance.pk)
+        .values_list("show_session_id", flat=True)
+        .first()
+    )
+
+
+def get_moved_from(ticket):
+    """The show session a saved ticket was moved from, or None"""
+    previous = getattr(ticket, "_previous_show_session_id", None)
+    if previous != ticket.show_session_id:
+        return previous
+    return None
+
+
+@receiver([post_save, post_delete], sender=Ticket)
+def invalidate_ticket_seat_map(sender, instance, **kwargs):
+    moved_from = get_moved_from(instance)
+    invalidate_seat_maps(
+        [instance.show_session_id]
+        + ([moved_from] if moved_from is not None else [])
+    )
+
+
+@receiver(post_save, sender=Ticket)
+def count_saved_ticket(sender, instance, created, **kwargs):
+    if created:
+        ShowSession.adjust_tickets_sold({instance.show_session_id: 1})
+        return
+    moved_from = get_moved_from(instance)
+    if moved_from is not None:
+        ShowSession.adjust_tickets_sold(
+            {moved_from: -1, instance.show_session_id: 1}
+        )
+
+
+@receiver(post_delete, sender=Ticket)
+def count_deleted_ticket(sender, instance, origin=None, **kwargs):
+    # Tickets deleted along with their reservation are already
+    # accounted for by release_reservation_tickets
+    if isinstance(origin, Ticket) or (
+        isinstance(origin, QuerySet) and origin.model is Ticket
+    ):
+        ShowSession.adjust_tickets_sold({instance.show_session_id: -1})
+
+
+@receiver(pre_delete, sender=Reservation)
+def release_reservation_tickets(sender, instance, **kwargs):
+    counts = (
+        instance.tickets.order_by()
+        .values("show_session")
+        .annotate(count=Count("id"))
+    )
+    ShowSession.adjust_tickets_sold(
+        {row["show_session"]: -row["count"] for row in counts}
+    )
+
+
+@receiver([post_save, post_delete], sender=ShowTheme)
+def invalidate_show_theme_responses(sender, **kwargs):
+    # Show lists and details render the names of their themes
+    invalidate_namespaces("themes", "shows")
+
+
+@receiver([post_save, post_delete], sender=AstronomyShow)
+@receiver(m2m_changed, sender=AstronomyShow.show_themes.through)
+def invalidate_astronomy_show_responses(sender, **kwargs):
+    invalidate_namespaces("shows")
+
+
+@receiver([post_save, post_delete], sender=PlanetariumDome)
+def invalidate_planetarium_dome_responses(sender, **kwargs):
+    invalidate_namespaces("domes")
+
+
+@receiver(post_save, sender=PlanetariumDome)
+def invalidate_planetarium_dome_seat_maps(sender, instance, created, **kwargs):
+    # The seat maps render the rows and seats of the dome
+    if not created:
+        invalidate_seat_maps(
+            ShowSession.objects.filter(planetarium_dome=instance).values_list(
+                "id", flat=True
+            )
+        )
+
+
+@receiver(post_save, sender=PlanetariumDome)
+def refresh_planetarium_dome_occupancy(sender, instance, created, **kwargs):
+    # The capacity of its sessions may have changed
+    if not created:
+        ShowSession.objects.filter(planetarium_dome=instance).update(
+            occupancy_stale=True
+        )
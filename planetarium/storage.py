@@ -0,0 +1,73 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.views.static import serve
+
+CONTENT_DIRECTORY = "content"
+
+CONTENT_NAME = re.compile(
+    rf"^{CONTENT_DIRECTORY}/[0-9a-f]{{2}}/[0-9a-f]{{64}}(\.\w+)?$"
+)
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def get_show_image_storage():
+    return storages["show_images"]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Store files as content/<aa>/<sha256><extension>, whatever name they
+    are saved with. A file with the same content is written only once
+    and its name never points to other content, so its URL can be
+    cached forever, see serve_content.
+    """
+
+    def __init__(self, *args, allow_overwrite=True, **kwargs):
+        # Saves racing past the exists() check write the same content to
+        # the same name, instead of one of them getting a suffixed name
+        super().__init__(*args, allow_overwrite=allow_overwrite, **kwargs)
+
+    def get_content_name(self, name, content) -> str:
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        _, extension = os.path.splitext(name)
+        digest = digest.hexdigest()
+        return (
+            f"{CONTENT_DIRECTORY}/{digest[:2]}/{digest}{extension.lower()}"
+        )
+
+    def is_content_name(self, name) -> bool:
+        return bool(CONTENT_NAME.match(name))
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+def serve_content(request, path):
+    """
+    Serve a content addressed file with immutable cache headers, in
+    development only. Production media must be served by the front
+    server, with the same Cache-Control for content/.
+    """
+    storage = get_show_image_storage()
+    response = serve(
+        request,
+        path,
+        document_root=storage.path(CONTENT_DIRECTORY),
+    )
+    response["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
@@ -1,3 +1,1895 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from importlib import import_module
+from threading import Barrier
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import IntegrityError, connection
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient, APITestCase
+from rest_framework.throttling import SimpleRateThrottle
+
+from planetarium.analytics import refresh_occupancy
+from planetarium.availability import assign_seats
+from planetarium.cache import get_catalog_cache
+from planetarium.idempotency import IDEMPOTENCY_HEADER, purge_idempotency_keys
+from planetarium.images import (
+    get_image_storage,
+    process_pending_images,
+    render_variants,
+    save_variants,
+    variant_name,
+)
+from planetarium.models import (
+    ShowTheme,
+    AstronomyShow,
+    PlanetariumDome,
+    ShowSession,
+    Reservation,
+    Ticket,
+    SeatHold,
+    IdempotencyKey,
+    SessionOccupancy,
+    ThrottleCounter,
+)
+from planetarium.serializers import (
+    ReservationSerializer,
+    ShowSessionListSerializer,
+)
+from planetarium.storage import ContentAddressedStorage
+from planetarium.throttling import (
+    CacheThrottleStore,
+    DatabaseThrottleStore,
+    UserRateThrottle,
+    get_throttle_store,
+    purge_throttle_counters,
+)
+from planetarium.views import ShowThemeViewSet
+from planetarium_api.instrumentation import QueryBudgetExceeded, registry
+from user.serializers import TokenObtainPairSerializer
+
+
+class QueryCountTests(APITestCase):
+    """
+    Every endpoint must run a fixed number of queries,
+    no matter how many rows it renders.
+    """
+
+    def setUp(self):
+        get_catalog_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email="user@planetarium.com", password="test12345"
+        )
+        self.client.force_authenticate(self.user)
+        self.created = 0
+
+    def create_rows(self, count):
+        for _ in range(count):
+            self.created += 1
+            index = self.created
+            themes = [
+                ShowTheme.objects.create(name=f"Theme {index}-{i}")
+                for i in range(2)
+            ]
+            show = AstronomyShow.objects.create(
+                title=f"Show {index}", description="Description"
+            )
+            show.show_themes.set(themes)
+            dome = PlanetariumDome.objects.create(
+                name=f"Dome {index}", rows=10, seats_in_row=10
+            )
+            show_session = ShowSession.objects.create(
+                astronomy_show=show,
+                planetarium_dome=dome,
+                show_time="2030-01-01T18:00:00Z",
+            )
+            reservation = Reservation.objects.create(user=self.user)
+            for seat in range(1, 4):
+                Ticket.objects.create(
+                    row=1,
+                    seat=seat,
+                    show_session=show_session,
+                    reservation=reservation,
+                )
+
+    def assert_num_queries(self, expected, url):
+        get_catalog_cache().clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(context.captured_queries),
+            expected,
+            "\n".join(query["sql"] for query in context.captured_queries),
+        )
+
+    def assert_constant_list_queries(self, expected, url_name):
+        url = reverse(f"planetarium:{url_name}")
+        self.create_rows(1)
+        self.assert_num_queries(expected, url)
+        self.create_rows(4)
+        self.assert_num_queries(expected, url)
+
+    def assert_constant_detail_queries(self, expected, url_name, get_pk):
+        self.create_rows(3)
+        url = reverse(f"planetarium:{url_name}", args=[get_pk()])
+        self.assert_num_queries(expected, url)
+
+    def test_show_theme_list(self):
+        self.assert_constant_list_queries(2, "showtheme-list")
+
+    def test_astronomy_show_list(self):
+        self.assert_constant_list_queries(3, "astronomyshow-list")
+
+    def test_astronomy_show_retrieve(self):
+        self.assert_constant_detail_queries(
+            2,
+            "astronomyshow-detail",
+            lambda: AstronomyShow.objects.first().id,
+        )
+
+    def test_planetarium_dome_list(self):
+        self.assert_constant_list_queries(2, "planetariumdome-list")
+
+    def test_show_session_list(self):
+        self.assert_constant_list_queries(2, "showsession-list")
+
+    def test_show_session_retrieve(self):
+        self.assert_constant_detail_queries(
+            2,
+            "showsession-detail",
+            lambda: ShowSession.objects.first().id,
+        )
+
+    def test_reservation_list(self):
+        self.assert_constant_list_queries(3, "reservation-list")
+
+    def test_reservation_retrieve(self):
+        self.assert_constant_detail_queries(
+            6,
+            "reservation-detail",
+            lambda: Reservation.objects.first().id,
+        )
+
+    def test_reservation_create(self):
+        caches["throttle"].clear()
+        self.create_rows(1)
+        show_session = ShowSession.objects.get().id
+        url = reverse("planetarium:reservation-list")
+
+        def count_queries(seats):
+            tickets = [
+                {"row": row, "seat": seat, "show_session": show_session}
+                for row, seat in seats
+            ]
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(
+                    url, {"tickets": tickets}, format="json"
+                )
+            self.assertEqual(response.status_code, 201)
+            return len(context.captured_queries)
+
+        self.assertEqual(
+            count_queries([(2, 1)]),
+            count_queries(
+                [(row, seat) for row in range(3, 7) for seat in range(1, 11)]
+            ),
+        )
+
+
+class TicketsSoldTests(TestCase):
+    def setUp(self):
+        show = AstronomyShow.objects.create(
+            title="Show", description="Description"
+        )
+        dome = PlanetariumDome.objects.create(
+            name="Dome", rows=5, seats_in_row=5
+        )
+        self.first, self.second = (
+            ShowSession.objects.create(
+                astronomy_show=show,
+                planetarium_dome=dome,
+                show_time=show_time,
+            )
+            for show_time in ("2030-01-01T10:00Z", "2030-01-01T12:00Z")
+        )
+        self.reservation = Reservation.objects.create(
+            user=get_user_model().objects.create_user(
+                email="user@planetarium.com", password="test12345"
+            )
+        )
+
+    def assert_tickets_sold(self, first, second):
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(
+            (self.first.tickets_sold, self.second.tickets_sold),
+            (first, second),
+        )
+
+    def test_moved_ticket_is_counted_in_its_new_session(self):
+        ticket = Ticket.objects.create(
+            row=1,
+            seat=1,
+            show_session=self.first,
+            reservation=self.reservation,
+        )
+        self.assert_tickets_sold(1, 0)
+
+        ticket.show_session = self.second
+        ticket.save()
+        self.assert_tickets_sold(0, 1)
+
+        ticket.row = 2
+        ticket.save()
+        self.assert_tickets_sold(0, 1)
+
+        ticket.delete()
+        self.assert_tickets_sold(0, 0)
+
+    def test_counter_drift_is_not_hidden(self):
+        with self.assertRaises(IntegrityError):
+            ShowSession.adjust_tickets_sold({self.first.id: -1})
+
+
+def create_show_session(rows=10, seats_in_row=10, **kwargs):
+    show = AstronomyShow.objects.create(
+        title="Show", description="Description"
+    )
+    dome = PlanetariumDome.objects.create(
+        name="Dome", rows=rows, seats_in_row=seats_in_row
+    )
+    return ShowSession.objects.create(
+        astronomy_show=show,
+        planetarium_dome=dome,
+        show_time="2030-01-01T10:00Z",
+        **kwargs,
+    )
+
+
+def post_concurrently(user, url, payloads):
+    """POST every payload at once, each from its own thread"""
+    barrier = Barrier(len(payloads))
+
+    def post(payload):
+        client = APIClient()
+        client.force_authenticate(user)
+        barrier.wait()
+        try:
+            return client.post(url, payload, format="json")
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(len(payloads)) as executor:
+        return list(executor.map(post, payloads))
+
+
+class ReservationRaceTests(TransactionTestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+        self.user = get_user_model().objects.create_user(
+            email="user@planetarium.com", password="test12345"
+        )
+        self.show_session = create_show_session()
+
+    def test_one_of_the_racing_reservations_gets_the_seat(self):
+        # Each wants the same seat and one of its own
+        show_session = self.show_session.id
+        responses = post_concurrently(
+            self.user,
+            reverse("planetarium:reservation-list"),
+            [
+                {
+                    "tickets": [
+                        {"row": 1, "seat": 1, "show_session": show_session},
+                        {"row": 2, "seat": seat, "show_session": show_session},
+                    ]
+                }
+                for seat in range(1, 9)
+            ],
+        )
+
+        self.assertEqual(
+            sorted(response.status_code for response in responses),
+            [201] + [409] * 7,
+        )
+        self.show_session.refresh_from_db()
+        self.assertEqual(self.show_session.tickets_sold, 2)
+        self.assertEqual(Ticket.objects.count(), 2)
+
+    def test_racing_auto_assignments_get_distinct_seats(self):
+        responses = post_concurrently(
+            self.user,
+            reverse("planetarium:reservation-best-available"),
+            [{"show_session": self.show_session.id, "quantity": 5}] * 8,
+        )
+
+        self.assertEqual(
+            [response.status_code for response in responses], [201] * 8
+        )
+        seats = Ticket.objects.values_list("row", "seat")
+        self.assertEqual(len(set(seats)), 40)
+
+
+class SeatAssignmentTests(APITestCase):
+    def test_best_block_is_centred(self):
+        self.assertEqual(
+            assign_seats(5, 10, {}, 4, False),
+            [(3, 4), (3, 5), (3, 6), (3, 7)],
+        )
+
+    def test_party_is_only_split_when_allowed(self):
+        # The aisle seats 5 and 6 are taken in every row
+        occupied = {row: [5, 6] for row in range(1, 6)}
+        self.assertIsNone(assign_seats(5, 10, occupied, 5, False))
+        self.assertEqual(
+            assign_seats(5, 10, occupied, 5, True),
+            [(3, 1), (3, 2), (3, 3), (3, 4), (3, 7)],
+        )
+
+    def test_no_seats_when_too_few_are_free(self):
+        self.assertIsNone(assign_seats(1, 4, {1: [2]}, 4, True))
+        self.assertEqual(
+            assign_seats(1, 4, {1: [2]}, 3, True), [(1, 1), (1, 3), (1, 4)]
+        )
+
+    def test_best_available_reserves_the_assigned_seats(self):
+        caches["throttle"].clear()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="user@planetarium.com", password="test12345"
+            )
+        )
+        show_session = create_show_session(rows=3, seats_in_row=6)
+        url = reverse("planetarium:reservation-best-available")
+
+        response = self.client.post(
+            url, {"show_session": show_session.id, "quantity": 3}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [
+                (ticket["row"], ticket["seat"])
+                for ticket in response.data["tickets"]
+            ],
+            [(2, 2), (2, 3), (2, 4)],
+        )
+
+        response = self.client.post(
+            url, {"show_session": show_session.id, "quantity": 16}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("quantity", response.data)
+        show_session.refresh_from_db()
+        self.assertEqual(show_session.tickets_sold, 3)
+
+
+class SeatHoldTests(APITestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="user@planetarium.com", password="test12345"
+            )
+        )
+        self.show_session = create_show_session(rows=2, seats_in_row=4)
+        response = self.hold([(1, 1), (1, 2)])
+        self.assertEqual(response.status_code, 201)
+        self.hold_url = reverse(
+            "planetarium:seathold-detail", args=[response.data["id"]]
+        )
+
+    def hold(self, seats):
+        return self.client.post(
+            reverse("planetarium:seathold-list"),
+            {
+                "show_session": self.show_session.id,
+                "seats": [{"row": row, "seat": seat} for row, seat in seats],
+            },
+            format="json",
+        )
+
+    def expire_holds(self):
+        SeatHold.objects.update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+    def get_tickets_available(self):
+        """Per the show session list and the availability search"""
+        show_sessions = self.client.get(
+            reverse("planetarium:showsession-list")
+        ).data["results"]
+        available = self.client.get(
+            reverse("planetarium:showsession-availability"),
+            {"party_size": 1, "date_from": "2030-01-01"},
+        ).data
+        return (
+            show_sessions[0]["tickets_available"],
+            available[0]["tickets_available"],
+        )
+
+    def test_held_seats_are_not_available(self):
+        self.assertEqual(self.get_tickets_available(), (6, 6))
+        self.expire_holds()
+        self.assertEqual(self.get_tickets_available(), (8, 8))
+
+    def test_confirm_reserves_the_held_seats(self):
+        response = self.client.post(self.hold_url + "confirm/")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["tickets"]), 2)
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_expired_hold_is_gone(self):
+        self.expire_holds()
+
+        self.assertEqual(self.client.get(self.hold_url).status_code, 200)
+        response = self.client.post(self.hold_url + "confirm/")
+        self.assertEqual(response.status_code, 410)
+        self.assertFalse(Ticket.objects.exists())
+        response = self.client.get(reverse("planetarium:seathold-list"))
+        self.assertEqual(response.data["results"], [])
+
+    @override_settings(SEAT_HOLD_MAX_SEATS=3)
+    def test_held_seats_per_user_are_capped(self):
+        response = self.hold([(2, 1), (2, 2)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("2 already are", str(response.data["seats"]))
+
+        self.assertEqual(self.hold([(2, 1)]).status_code, 201)
+        self.assertEqual(self.hold([(2, 2)]).status_code, 400)
+
+        # Expired holds don't count, nor do the holds of other users
+        self.expire_holds()
+        self.assertEqual(self.hold([(2, 1), (2, 2), (2, 3)]).status_code, 201)
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="other@planetarium.com", password="test12345"
+            )
+        )
+        self.assertEqual(self.hold([(1, 1), (1, 2), (1, 3)]).status_code, 201)
+
+
+class IdempotencyTests(APITestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="user@planetarium.com", password="test12345"
+            )
+        )
+        self.show_session = create_show_session()
+
+    def reserve(self, seat, key):
+        return self.client.post(
+            reverse("planetarium:reservation-list"),
+            {
+                "tickets": [
+                    {
+                        "row": 1,
+                        "seat": seat,
+                        "show_session": self.show_session.id,
+                    }
+                ]
+            },
+            format="json",
+            headers={IDEMPOTENCY_HEADER: key},
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.reserve(1, "key")
+        retry = self.reserve(1, "key")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_client_errors_are_replayed(self):
+        self.reserve(1, "first")
+        self.assertEqual(self.reserve(1, "second").status_code, 400)
+
+        Ticket.objects.all().delete()
+        retry = self.reserve(1, "second")
+        self.assertEqual(retry.status_code, 400)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.reserve(1, "key")
+
+        response = self.reserve(2, "key")
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    def test_key_in_use_is_a_conflict(self):
+        self.reserve(1, "key")
+        # As if the first request were still being processed
+        IdempotencyKey.objects.update(status_code=None, response_body=None)
+
+        response = self.reserve(1, "key")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_expired_keys_are_purged(self):
+        self.reserve(1, "old")
+        self.reserve(2, "new")
+        IdempotencyKey.objects.filter(key="old").update(
+            created_at=timezone.now() - settings.IDEMPOTENCY_KEY_TTL
+        )
+
+        self.assertEqual(purge_idempotency_keys(), 1)
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list("key", flat=True)),
+            ["new"],
+        )
+
+
+class BulkScheduleTests(APITestCase):
+    def setUp(self):
+        self.url = reverse("planetarium:showsession-bulk")
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                email="admin@planetarium.com", password="test12345"
+            )
+        )
+        self.existing = create_show_session()
+        self.show = self.existing.astronomy_show_id
+        self.dome = self.existing.planetarium_dome_id
+        self.other_dome = PlanetariumDome.objects.create(
+            name="Other dome", rows=10, seats_in_row=10
+        ).id
+
+    def schedule(self, *sessions):
+        return self.client.post(
+            self.url,
+            {
+                "sessions": [
+                    {
+                        "astronomy_show": self.show,
+                        "planetarium_dome": dome,
+                        "show_time": show_time,
+                    }
+                    for dome, show_time in sessions
+                ]
+            },
+            format="json",
+        )
+
+    def test_sessions_are_scheduled(self):
+        response = self.schedule(
+            (self.dome, "2030-01-01T11:00Z"),
+            (self.other_dome, "2030-01-01T10:00Z"),
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(ShowSession.objects.count(), 3)
+
+    def test_any_overlap_rejects_the_whole_schedule(self):
+        response = self.schedule(
+            (self.dome, "2030-01-01T10:59Z"),
+            (self.other_dome, "2030-01-02T10:00Z"),
+            (self.other_dome, "2030-01-02T10:20Z"),
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            [
+                (conflict["planetarium_dome"], conflict["show_session"])
+                for conflict in response.data["conflicts"]
+            ],
+            [(self.dome, self.existing.id), (self.other_dome, None)],
+        )
+        self.assertEqual(ShowSession.objects.count(), 1)
+
+    def test_recurrence_is_checked_for_overlaps(self):
+        recurrence = {
+            "astronomy_show": self.show,
+            "planetarium_dome": self.dome,
+            "weekdays": [1, 2],
+            "times": ["10:00", "14:00"],
+            "date_from": "2029-12-31",
+            "date_to": "2030-01-08",
+        }
+
+        response = self.client.post(
+            self.url, {"recurrence": recurrence}, format="json"
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(response.data["conflicts"]), 1)
+
+        recurrence["date_from"] = "2030-01-02"
+        response = self.client.post(
+            self.url, {"recurrence": recurrence}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 4)
+
+
+class ShowDurationTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                email="admin@planetarium.com", password="test12345"
+            )
+        )
+        self.show_session = create_show_session()
+        self.show = self.show_session.astronomy_show
+        self.url = reverse(
+            "planetarium:astronomyshow-detail", args=[self.show.id]
+        )
+
+    def test_sessions_end_with_the_new_duration(self):
+        response = self.client.patch(self.url, {"duration": "01:30:00"})
+
+        self.assertEqual(response.status_code, 200)
+        self.show_session.refresh_from_db()
+        self.assertEqual(
+            self.show_session.end_time - self.show_session.show_time,
+            timedelta(minutes=90),
+        )
+
+    def test_duration_overlapping_the_next_session_is_rejected(self):
+        other_show = AstronomyShow.objects.create(
+            title="Other show", description="Description"
+        )
+        next_session = ShowSession.objects.create(
+            astronomy_show=other_show,
+            planetarium_dome=self.show_session.planetarium_dome,
+            show_time=self.show_session.end_time + timedelta(minutes=15),
+        )
+
+        response = self.client.patch(self.url, {"duration": "01:30:00"})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            response.data["conflicts"][0]["show_session"], next_session.id
+        )
+        self.show.refresh_from_db()
+        self.assertIsNone(self.show.duration)
+        self.show_session.refresh_from_db()
+        self.assertEqual(
+            self.show_session.end_time,
+            self.show_session.show_time + settings.SHOW_SESSION_DURATION,
+        )
+
+    def test_sessions_are_rescheduled_only_on_a_new_duration(self):
+        with mock.patch.object(
+            AstronomyShow, "reschedule_sessions"
+        ) as reschedule_sessions:
+            show = AstronomyShow.objects.create(
+                title="New show", description="Description"
+            )
+            show.title = "Renamed show"
+            show.save()
+            show = AstronomyShow.objects.get(pk=show.pk)
+            show.duration = settings.SHOW_SESSION_DURATION
+            show.save()
+            reschedule_sessions.assert_not_called()
+
+            show.duration = timedelta(minutes=90)
+            show.save(update_fields=["title"])
+            reschedule_sessions.assert_not_called()
+            show.save()
+            reschedule_sessions.assert_called_once()
+
+            show.save()
+            reschedule_sessions.assert_called_once()
+
+
+class OverlapCheckMigrationTests(TestCase):
+    def test_overlapping_sessions_are_reported(self):
+        # Sessions scheduled before the exclusion constraint, dropped
+        # along with the test transaction
+        (constraint,) = (
+            constraint
+            for constraint in ShowSession._meta.constraints
+            if constraint.name == "showsession_dome_no_overlap"
+        )
+        with connection.schema_editor() as schema_editor:
+            schema_editor.remove_constraint(ShowSession, constraint)
+        check_overlaps = import_module(
+            "planetarium.migrations.0013_show_session_end_time"
+        ).check_overlaps
+
+        first = create_show_session()
+        first.refresh_from_db()
+        ShowSession.objects.create(
+            astronomy_show=first.astronomy_show,
+            planetarium_dome=first.planetarium_dome,
+            show_time=first.end_time,
+        )
+        ShowSession.objects.create(
+            astronomy_show=first.astronomy_show,
+            planetarium_dome=PlanetariumDome.objects.create(
+                name="Other dome", rows=10, seats_in_row=10
+            ),
+            show_time=first.show_time,
+        )
+        check_overlaps(apps, None)
+
+        overlapping = ShowSession.objects.create(
+            astronomy_show=first.astronomy_show,
+            planetarium_dome=first.planetarium_dome,
+            show_time=first.show_time + timedelta(minutes=30),
+        )
+        with self.assertRaisesMessage(
+            IntegrityError, f"migrating: {first.id} and {overlapping.id}"
+        ):
+            check_overlaps(apps, None)
+
+
+class OccupancyRefreshTests(APITestCase):
+    def setUp(self):
+        self.show_session = create_show_session(rows=2, seats_in_row=4)
+        self.other = ShowSession.objects.create(
+            astronomy_show=self.show_session.astronomy_show,
+            planetarium_dome=self.show_session.planetarium_dome,
+            show_time="2030-01-09T10:00Z",
+        )
+        self.reservation = Reservation.objects.create(
+            user=get_user_model().objects.create_user(
+                email="user@planetarium.com", password="test12345"
+            )
+        )
+        for seat in (1, 2):
+            Ticket.objects.create(
+                row=1,
+                seat=seat,
+                show_session=self.show_session,
+                reservation=self.reservation,
+            )
+
+    def get_occupancy(self):
+        return dict(
+            SessionOccupancy.objects.values_list("show_session", "seats_sold")
+        )
+
+    def test_only_stale_sessions_are_refreshed(self):
+        self.assertEqual(refresh_occupancy(batch_size=1), 2)
+        self.assertEqual(
+            self.get_occupancy(), {self.show_session.id: 2, self.other.id: 0}
+        )
+        self.assertEqual(refresh_occupancy(), 0)
+
+        Ticket.objects.create(
+            row=1,
+            seat=1,
+            show_session=self.other,
+            reservation=self.reservation,
+        )
+        self.assertEqual(refresh_occupancy(), 1)
+        self.assertEqual(
+            self.get_occupancy(), {self.show_session.id: 2, self.other.id: 1}
+        )
+
+        self.reservation.delete()
+        self.assertEqual(refresh_occupancy(), 2)
+        self.assertEqual(
+            self.get_occupancy(), {self.show_session.id: 0, self.other.id: 0}
+        )
+
+    def test_dome_resize_refreshes_the_capacity(self):
+        refresh_occupancy()
+        planetarium_dome = self.show_session.planetarium_dome
+        planetarium_dome.rows = 3
+        planetarium_dome.save()
+
+        self.assertEqual(refresh_occupancy(), 2)
+        self.assertEqual(
+            set(SessionOccupancy.objects.values_list("capacity", flat=True)),
+            {12},
+        )
+
+    def test_occupancy_report(self):
+        refresh_occupancy()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                email="admin@planetarium.com", password="test12345"
+            )
+        )
+
+        response = self.client.get(
+            reverse("planetarium:occupancy-list"), {"bucket": "month"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {
+                    "bucket": "2030-01-01",
+                    "sessions": 2,
+                    "seats_sold": 2,
+                    "capacity": 16,
+                    "fill_rate": 0.125,
+                }
+            ],
+        )
+
+
+class ShowImageTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                email="admin@planetarium.com", password="test12345"
+            )
+        )
+        self.show = AstronomyShow.objects.create(
+            title="Show", description="Description"
+        )
+
+    @staticmethod
+    def make_image(color):
+        image = io.BytesIO()
+        Image.new("RGB", (800, 600), color).save(image, "JPEG")
+        image.seek(0)
+        image.name = "poster.jpg"
+        return image
+
+    def upload(self, show, image):
+        return self.client.post(
+            reverse("planetarium:astronomyshow-upload-image", args=[show.id]),
+            {"image": image},
+            format="multipart",
+        )
+
+    def test_uploaded_image_is_resized_in_the_background(self):
+        response = self.upload(self.show, self.make_image("red"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["image_variants"], {})
+
+        with ThreadPoolExecutor(1) as executor:
+            self.assertEqual(process_pending_images(executor, 10), 1)
+        self.show.refresh_from_db()
+        self.assertFalse(self.show.image_pending)
+        self.assertEqual(
+            set(self.show.image_variants), set(settings.IMAGE_VARIANTS)
+        )
+
+    def test_variants_of_a_replaced_image_are_deleted(self):
+        self.upload(self.show, self.make_image("red"))
+        self.show.refresh_from_db()
+        storage = get_image_storage()
+        with storage.open(self.show.image.name, "rb") as image:
+            rendered = render_variants(image.read(), settings.IMAGE_VARIANTS)
+        names = {
+            variant: storage.get_content_name(
+                variant_name(self.show.image.name, variant),
+                ContentFile(content),
+            )
+            for variant, content in rendered.items()
+        }
+        # Another show already has the same thumbnail file
+        AstronomyShow.objects.create(
+            title="Other show",
+            description="Description",
+            image_variants={
+                "thumbnail": storage.save(
+                    "thumbnail.webp", ContentFile(rendered["thumbnail"])
+                )
+            },
+        )
+
+        old_image = self.show.image.name
+        self.upload(self.show, self.make_image("blue"))
+        self.assertEqual(save_variants(self.show.id, old_image, rendered), 0)
+
+        self.assertTrue(storage.exists(names["thumbnail"]))
+        self.assertFalse(storage.exists(names["card"]))
+        self.assertFalse(storage.exists(names["full"]))
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        self.storage = ContentAddressedStorage(location=location)
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save("a.png", ContentFile(b"content"))
+        second = self.storage.save("b.PNG", ContentFile(b"content"))
+        other = self.storage.save("a.png", ContentFile(b"other"))
+
+        self.assertEqual(first, second)
+        self.assertTrue(first.endswith(".png"))
+        self.assertNotEqual(first, other)
+
+    def test_racing_saves_share_the_name(self):
+        # Both saves passed the exists() check before either wrote
+        with mock.patch.object(self.storage, "exists", return_value=False):
+            names = {
+                self.storage.save("a.png", ContentFile(b"content"))
+                for _ in range(2)
+            }
+
+        self.assertEqual(len(names), 1)
+        directory = os.path.dirname(self.storage.path(names.pop()))
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+
+class ThrottleStoreTests(TestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+
+    def assert_counts_windows(self, store):
+        self.assertEqual(store.hit("key", 10, 60), (1, 0))
+        self.assertEqual(store.hit("key", 10, 60), (2, 0))
+        self.assertEqual(store.hit("other", 10, 60), (1, 0))
+        store.release("key", 10, 60)
+        # The next window starts over, with this one as the previous one
+        self.assertEqual(store.hit("key", 11, 60), (1, 1))
+        # A skipped window leaves no previous count
+        self.assertEqual(store.hit("key", 13, 60), (1, 0))
+
+    def test_cache_store(self):
+        self.assert_counts_windows(CacheThrottleStore())
+
+    def test_database_store(self):
+        self.assert_counts_windows(DatabaseThrottleStore())
+        self.assertEqual(
+            ThrottleCounter.objects.get(key="key").expires_at.timestamp(),
+            15 * 60,
+        )
+
+    def test_idle_counters_are_purged(self):
+        store = DatabaseThrottleStore()
+        store.hit("idle", 10, 60)
+        store.hit("active", int(timezone.now().timestamp()) // 60, 60)
+
+        self.assertEqual(purge_throttle_counters(), 1)
+        self.assertEqual(
+            list(ThrottleCounter.objects.values_list("key", flat=True)),
+            ["active"],
+        )
+
+
+class DatabaseThrottleStoreRaceTests(TransactionTestCase):
+    def test_concurrent_hits_are_all_counted(self):
+        store = DatabaseThrottleStore()
+
+        def hit(_):
+            try:
+                current, _ = store.hit("key", 10, 60)
+                return current
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(8) as executor:
+            counts = sorted(executor.map(hit, range(100)))
+        self.assertEqual(counts, list(range(1, 101)))
+
+
+class SlidingWindowRateThrottleTests(APITestCase):
+    rates = {"anon": None, "user": "1000/day", "sensitive": "3/min"}
+
+    def setUp(self):
+        caches["throttle"].clear()
+        get_throttle_store.cache_clear()
+        rates = mock.patch.object(
+            SimpleRateThrottle, "THROTTLE_RATES", self.rates
+        )
+        rates.start()
+        self.addCleanup(rates.stop)
+        self.user = get_user_model().objects.create_user(
+            email="user@planetarium.com", password="test12345"
+        )
+
+    def test_wait_for_the_previous_window_to_weigh_less(self):
+        throttle = UserRateThrottle()
+        throttle.num_requests, throttle.duration = 10, 60
+        # 1 + 10 * (1 - 12 / 60) requests leave room for one at 12s
+        self.assertAlmostEqual(throttle.get_wait_time(6, 1, 10), 6)
+
+    def test_wait_for_the_next_window(self):
+        throttle = UserRateThrottle()
+        throttle.num_requests, throttle.duration = 10, 60
+        # 10 * (1 - 6 / 60) requests leave room for one at 66s
+        self.assertAlmostEqual(throttle.get_wait_time(30, 10, 0), 36)
+
+    def test_wait_out_the_window_at_a_zero_rate(self):
+        throttle = UserRateThrottle()
+        throttle.num_requests, throttle.duration = 0, 60
+        self.assertAlmostEqual(throttle.get_wait_time(20, 0, 0), 40)
+        self.assertAlmostEqual(throttle.get_wait_time(20, 0, 5), 40)
+
+    def test_zero_rate_is_throttled(self):
+        self.client.force_authenticate(self.user)
+        with mock.patch.dict(self.rates, {"user": "0/min"}):
+            response = self.client.get(reverse("planetarium:showtheme-list"))
+
+        self.assertEqual(response.status_code, 429)
+        # The rest of the current window
+        self.assertIn(int(response["Retry-After"]), range(1, 61))
+
+    def assert_sensitive_rate(self):
+        self.client.force_authenticate(self.user)
+        show_session = create_show_session()
+        codes = [
+            self.client.post(
+                reverse("planetarium:reservation-list"),
+                {
+                    "tickets": [
+                        {
+                            "row": 1,
+                            "seat": seat,
+                            "show_session": show_session.id,
+                        }
+                    ]
+                },
+                format="json",
+            ).status_code
+            for seat in range(1, 6)
+        ]
+        self.assertEqual(codes, [201, 201, 201, 429, 429])
+        # Only creating reservations is sensitive
+        response = self.client.get(reverse("planetarium:reservation-list"))
+        self.assertEqual(response.status_code, 200)
+
+        self.client.force_authenticate(None)
+        codes = [
+            self.client.post(
+                reverse("auth:token_obtain_pair"),
+                {"email": self.user.email, "password": "wrong"},
+            ).status_code
+            for _ in range(4)
+        ]
+        self.assertEqual(codes, [401, 401, 401, 429])
+
+    def test_seat_holds_are_sensitive(self):
+        self.client.force_authenticate(self.user)
+        show_session = create_show_session()
+        codes = [
+            self.client.post(
+                reverse("planetarium:seathold-list"),
+                {
+                    "show_session": show_session.id,
+                    "seats": [{"row": 1, "seat": seat}],
+                },
+                format="json",
+            ).status_code
+            for seat in range(1, 5)
+        ]
+        self.assertEqual(codes, [201, 201, 201, 429])
+        response = self.client.get(reverse("planetarium:seathold-list"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_sensitive_rate_in_the_cache(self):
+        self.assert_sensitive_rate()
+
+    @override_settings(
+        THROTTLE_STORE="planetarium.throttling.DatabaseThrottleStore"
+    )
+    def test_sensitive_rate_in_the_database(self):
+        self.assert_sensitive_rate()
+        self.assertTrue(ThrottleCounter.objects.exists())
+
+    @override_settings(
+        THROTTLE_STORE="planetarium.throttling.DatabaseThrottleStore"
+    )
+    async def test_async_views_count_in_the_database(self):
+        token = await sync_to_async(TokenObtainPairSerializer.get_token)(
+            self.user
+        )
+        response = await self.async_client.get(
+            reverse("planetarium:async-showsession-list"),
+            headers={"Authorization": f"Bearer {token.access_token}"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            await ThrottleCounter.objects.filter(
+                key__endswith=str(self.user.id)
+            ).acount(),
+            1,
+        )
+
+
+class SeatMapTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@planetarium.com", password="test12345"
+        )
+        self.client.force_authenticate(self.user)
+        self.show_session = create_show_session(rows=3, seats_in_row=5)
+        self.url = reverse(
+            "planetarium:showsession-seats", args=[self.show_session.id]
+        )
+
+    def get_seat_map(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        seat_map = response.data
+        bitmap = base64.b64decode(seat_map["bitmap"])
+        occupied = {
+            divmod(index, seat_map["seats_in_row"])
+            for index in range(len(bitmap) * 8)
+            if bitmap[index // 8] & (0x80 >> (index % 8))
+        }
+        occupied = {(row + 1, seat + 1) for row, seat in occupied}
+        return seat_map, occupied
+
+    def post(self, url_name, data):
+        # The seat maps are invalidated once the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse(f"planetarium:{url_name}"), data, format="json"
+            )
+
+    def reserve(self, row, seat):
+        return self.post(
+            "reservation-list",
+            {
+                "tickets": [
+                    {
+                        "row": row,
+                        "seat": seat,
+                        "show_session": self.show_session.id,
+                    }
+                ]
+            },
+        )
+
+    def test_seat_map_follows_reservations_and_holds(self):
+        seat_map, occupied = self.get_seat_map()
+        self.assertEqual((seat_map["rows"], seat_map["seats_in_row"]), (3, 5))
+        self.assertEqual(occupied, set())
+
+        self.assertEqual(self.reserve(1, 1).status_code, 201)
+        seat_map, occupied = self.get_seat_map()
+        self.assertEqual(occupied, {(1, 1)})
+        self.assertEqual(
+            (seat_map["tickets_taken"], seat_map["seats_held"]), (1, 0)
+        )
+
+        response = self.post(
+            "seathold-list",
+            {
+                "show_session": self.show_session.id,
+                "seats": [{"row": 2, "seat": 5}, {"row": 3, "seat": 3}],
+            },
+        )
+        self.assertEqual(response.status_code, 201)
+        seat_map, occupied = self.get_seat_map()
+        self.assertEqual(occupied, {(1, 1), (2, 5), (3, 3)})
+        self.assertEqual(
+            (seat_map["tickets_taken"], seat_map["seats_held"]), (1, 2)
+        )
+
+    def test_seat_map_follows_dome_changes(self):
+        self.reserve(3, 5)
+        self.get_seat_map()
+        planetarium_dome = self.show_session.planetarium_dome
+
+        planetarium_dome.seats_in_row = 6
+        planetarium_dome.save()
+        seat_map, occupied = self.get_seat_map()
+        self.assertEqual(seat_map["seats_in_row"], 6)
+        self.assertEqual(occupied, {(3, 5)})
+
+        # The ticket is left outside of the smaller dome
+        planetarium_dome.rows = 2
+        planetarium_dome.save()
+        seat_map, occupied = self.get_seat_map()
+        self.assertEqual(seat_map["rows"], 2)
+        self.assertEqual(seat_map["tickets_taken"], 1)
+        self.assertEqual(occupied, set())
+
+
+class ReservationRetryTests(APITestCase):
+    """A seat sold around the lock and the check, as in a race"""
+
+    def setUp(self):
+        caches["throttle"].clear()
+        self.user = get_user_model().objects.create_user(
+            email="user@planetarium.com", password="test12345"
+        )
+        self.client.force_authenticate(self.user)
+        self.show_session = create_show_session(rows=1, seats_in_row=2)
+        Ticket.objects.create(
+            row=1,
+            seat=1,
+            show_session=self.show_session,
+            reservation=Reservation.objects.create(user=self.user),
+        )
+        unchecked = mock.patch.object(
+            ReservationSerializer,
+            "find_unavailable_seats",
+            return_value=set(),
+        )
+        unchecked.start()
+        self.addCleanup(unchecked.stop)
+
+    def test_seat_sold_twice_is_unavailable(self):
+        response = self.client.post(
+            reverse("planetarium:reservation-list"),
+            {
+                "tickets": [
+                    {"row": 1, "seat": 1, "show_session": self.show_session.id}
+                ]
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            response.data["seats"],
+            [{"show_session": self.show_session.id, "row": 1, "seat": 1}],
+        )
+
+    def test_auto_assigned_seat_sold_twice_is_unavailable(self):
+        with mock.patch(
+            "planetarium.serializers.get_occupied_seats", return_value={}
+        ):
+            response = self.client.post(
+                reverse("planetarium:reservation-best-available"),
+                {"show_session": self.show_session.id, "quantity": 2},
+            )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(response.data["seats"]), 1)
+
+    def test_other_integrity_errors_are_not_retried(self):
+        with mock.patch.object(
+            ShowSession,
+            "adjust_tickets_sold",
+            side_effect=IntegrityError("tickets_sold check"),
+        ) as adjust_tickets_sold:
+            with self.assertRaises(IntegrityError):
+                self.client.post(
+                    reverse("planetarium:reservation-list"),
+                    {
+                        "tickets": [
+                            {
+                                "row": 1,
+                                "seat": 2,
+                                "show_session": self.show_session.id,
+                            }
+                        ]
+                    },
+                    format="json",
+                )
+        adjust_tickets_sold.assert_called_once()
+
+
+class CursorPaginationTests(APITestCase):
+    """Keyset pages over show sessions sharing their show_time"""
+
+    def setUp(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="user@planetarium.com", password="test12345"
+            )
+        )
+        show = AstronomyShow.objects.create(
+            title="Show", description="Description"
+        )
+        self.ids = []
+        for index in range(7):
+            dome = PlanetariumDome.objects.create(
+                name=f"Dome {index}", rows=10, seats_in_row=10
+            )
+            for show_time in ("2030-01-01T10:00Z", "2030-01-01T12:00Z"):
+                self.ids.append(
+                    ShowSession.objects.create(
+                        astronomy_show=show,
+                        planetarium_dome=dome,
+                        show_time=show_time,
+                    ).id
+                )
+        self.ids.sort(
+            key=lambda pk: (ShowSession.objects.get(pk=pk).show_time, pk)
+        )
+
+    def walk(self, url, link):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            ids.append([row["id"] for row in response.data["results"]])
+            url = response.data[link]
+        return ids
+
+    def test_every_page_forward_and_back(self):
+        pages = self.walk(
+            reverse("planetarium:showsession-list")
+            + "?pagination=cursor&limit=3",
+            "next",
+        )
+        self.assertEqual(sum(pages, []), self.ids)
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 3, 2])
+
+        last_page = self.client.get(
+            reverse("planetarium:showsession-list")
+            + "?pagination=cursor&limit=3"
+        )
+        for _ in range(len(pages) - 1):
+            last_page = self.client.get(last_page.data["next"])
+        back = self.walk(last_page.data["previous"], "previous")
+        self.assertEqual(back, pages[-2::-1])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            reverse("planetarium:showsession-list"),
+            {"cursor": base64.b64encode(b"p=[\"x\", \"1\"]").decode()},
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+
+class CachedResponseTests(APITestCase):
+    """Catalog responses are cached until a change invalidates them"""
+
+    def setUp(self):
+        get_catalog_cache().clear()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="user@planetarium.com", password="test12345"
+            )
+        )
+        self.theme = ShowTheme.objects.create(name="Stars")
+        self.show = AstronomyShow.objects.create(
+            title="Show", description="Description"
+        )
+        self.show.show_themes.set([self.theme])
+        self.url = reverse("planetarium:astronomyshow-list")
+
+    def get_shows(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return {
+            show["title"]: sorted(show["show_themes"])
+            for show in response.data["results"]
+        }
+
+    def test_cached_response_runs_no_queries(self):
+        first = self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_saved_show_is_fresh(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        self.show.title = "Renamed"
+        self.show.save()
+
+        self.assertEqual(self.get_shows(), {"Renamed": ["Stars"]})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_deleted_show_is_fresh(self):
+        self.get_shows()
+
+        self.show.delete()
+
+        self.assertEqual(self.get_shows(), {})
+
+    def test_saved_theme_is_fresh(self):
+        self.get_shows()
+
+        self.theme.name = "Planets"
+        self.theme.save()
+
+        self.assertEqual(self.get_shows(), {"Show": ["Planets"]})
+
+    def test_changed_show_themes_are_fresh(self):
+        self.get_shows()
+        planets = ShowTheme.objects.create(name="Planets")
+        self.get_shows()
+
+        self.show.show_themes.set([planets])
+        self.assertEqual(self.get_shows(), {"Show": ["Planets"]})
+
+        self.show.show_themes.add(self.theme)
+        self.assertEqual(self.get_shows(), {"Show": ["Planets", "Stars"]})
+
+        self.show.show_themes.clear()
+        self.assertEqual(self.get_shows(), {"Show": []})
+
+
+class InstrumentationTests(APITestCase):
+    """Per request timings, the metrics endpoint and query budgets"""
+
+    def setUp(self):
+        get_catalog_cache().clear()
+        registry.clear()
+        self.addCleanup(registry.clear)
+        self.user = get_user_model().objects.create_user(
+            email="user@planetarium.com", password="test12345"
+        )
+        self.client.force_authenticate(self.user)
+        ShowTheme.objects.create(name="Stars")
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("planetarium:showtheme-list"))
+
+        self.assertEqual(response.status_code, 200)
+        db, serialize, total = response["Server-Timing"].split(", ")
+        self.assertRegex(db, r'^db;dur=[\d.]+;desc="2 queries"$')
+        self.assertRegex(serialize, r"^serialize;dur=[\d.]+$")
+        self.assertRegex(total, r"^total;dur=[\d.]+$")
+
+    def test_metrics_are_admin_only(self):
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics_histograms(self):
+        self.client.get(reverse("planetarium:showtheme-list"))
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                email="admin@planetarium.com", password="test12345"
+            )
+        )
+
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, 200)
+        lines = response.content.decode().splitlines()
+        self.assertIn("# TYPE planetarium_db_queries histogram", lines)
+        self.assertIn(
+            'planetarium_db_queries_bucket{view="ShowThemeViewSet.list",'
+            'le="2"} 1',
+            lines,
+        )
+        self.assertIn(
+            'planetarium_db_queries_count{view="ShowThemeViewSet.list"} 1',
+            lines,
+        )
+        self.assertIn(
+            'planetarium_db_queries_sum{view="ShowThemeViewSet.list"} 2',
+            lines,
+        )
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_query_budget_exceeded(self):
+        with mock.patch.object(
+            ShowThemeViewSet, "query_budget", {"list": 1}
+        ):
+            with self.assertRaisesMessage(
+                QueryBudgetExceeded,
+                "ShowThemeViewSet.list ran 2 queries, the budget is 1",
+            ):
+                self.client.get(reverse("planetarium:showtheme-list"))
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_query_budget_exceeded_is_logged(self):
+        with mock.patch.object(
+            ShowThemeViewSet, "query_budget", {"list": 1}
+        ):
+            with self.assertLogs(
+                "planetarium_api.instrumentation", "WARNING"
+            ):
+                response = self.client.get(
+                    reverse("planetarium:showtheme-list")
+                )
+
+        self.assertEqual(response.status_code, 200)
+
+
+class SeedDataTests(TestCase):
+    @mock.patch(
+        "planetarium.management.commands.seed_data.timezone.now",
+        return_value=timezone.now(),
+    )
+    def test_second_run_skips_taken_slots(self, now):
+        options = {
+            "themes": 2,
+            "shows": 3,
+            "domes": 2,
+            "users": 2,
+            "days": 1,
+            "fill": 0.1,
+        }
+        call_command("seed_data", sessions=20, stdout=io.StringIO(), **options)
+        stdout = io.StringIO()
+        call_command("seed_data", sessions=20, stdout=stdout, **options)
+
+        # 13 hourly slots a day in each dome
+        self.assertEqual(ShowSession.objects.count(), 26)
+        self.assertIn("Only 6 free slots", stdout.getvalue())
+        for dome in PlanetariumDome.objects.all():
+            sessions = list(
+                ShowSession.objects.filter(planetarium_dome=dome).order_by(
+                    "show_time"
+                )
+            )
+            for session, following in zip(sessions, sessions[1:]):
+                self.assertLessEqual(session.end_time, following.show_time)
+
+
+class ReservationExportTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@planetarium.com", password="test12345"
+        )
+        self.admin = get_user_model().objects.create_superuser(
+            email="admin@planetarium.com", password="test12345"
+        )
+        self.client.force_authenticate(self.admin)
+        self.show_session = create_show_session()
+        self.other_session = ShowSession.objects.create(
+            astronomy_show=self.show_session.astronomy_show,
+            planetarium_dome=self.show_session.planetarium_dome,
+            show_time="2030-01-02T10:00Z",
+        )
+        self.tickets = []
+        for day, show_session in (
+            (1, self.show_session),
+            (2, self.show_session),
+            (3, self.other_session),
+        ):
+            reservation = Reservation.objects.create(user=self.user)
+            Reservation.objects.filter(pk=reservation.pk).update(
+                created_at=f"2029-06-0{day}T12:00Z"
+            )
+            self.tickets.append(
+                Ticket.objects.create(
+                    row=1,
+                    seat=day,
+                    show_session=show_session,
+                    reservation=reservation,
+                )
+            )
+        self.url = reverse("planetarium:reservation-export")
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export().splitlines()]
+
+        self.assertEqual(
+            [row["ticket_id"] for row in rows],
+            [ticket.id for ticket in self.tickets],
+        )
+        self.assertEqual(
+            rows[0],
+            {
+                "reservation_id": self.tickets[0].reservation_id,
+                "reserved_at": "2029-06-01T12:00:00Z",
+                "user_email": "user@planetarium.com",
+                "ticket_id": self.tickets[0].id,
+                "show_session_id": self.show_session.id,
+                "show_time": "2030-01-01T10:00:00Z",
+                "astronomy_show": "Show",
+                "planetarium_dome": "Dome",
+                "row": 1,
+                "seat": 1,
+            },
+        )
+
+    def test_csv(self):
+        response = self.client.get(self.url, {"output": "csv"})
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn("reservations.csv", response["Content-Disposition"])
+
+        rows = list(
+            csv.reader(
+                io.StringIO(b"".join(response.streaming_content).decode())
+            )
+        )
+
+        self.assertEqual(rows[0][:2], ["reservation_id", "reserved_at"])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(
+            rows[1],
+            [
+                str(self.tickets[0].reservation_id),
+                "2029-06-01T12:00:00Z",
+                "user@planetarium.com",
+                str(self.tickets[0].id),
+                str(self.show_session.id),
+                "2030-01-01T10:00:00Z",
+                "Show",
+                "Dome",
+                "1",
+                "1",
+            ],
+        )
+
+    def test_filters(self):
+        def ticket_ids(**params):
+            return [
+                json.loads(line)["ticket_id"]
+                for line in self.export(**params).splitlines()
+            ]
+
+        first, second, third = (ticket.id for ticket in self.tickets)
+        self.assertEqual(ticket_ids(date_from="2029-06-02"), [second, third])
+        self.assertEqual(ticket_ids(date_to="2029-06-02"), [first, second])
+        self.assertEqual(
+            ticket_ids(date_from="2029-06-02", date_to="2029-06-02"),
+            [second],
+        )
+        self.assertEqual(
+            ticket_ids(show_session=self.other_session.id), [third]
+        )
+
+    def test_date_to_before_date_from(self):
+        response = self.client.get(
+            self.url, {"date_from": "2029-06-02", "date_to": "2029-06-01"}
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    async def test_asgi_streams_async(self):
+        token = await sync_to_async(TokenObtainPairSerializer.get_token)(
+            self.admin
+        )
+
+        response = await self.async_client.get(
+            self.url,
+            {"show_session": self.other_session.id},
+            headers={"Authorization": f"Bearer {token.access_token}"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b"".join(
+            [chunk async for chunk in response.streaming_content]
+        )
+        self.assertEqual(
+            json.loads(content)["ticket_id"], self.tickets[2].id
+        )
+
+    def test_command(self):
+        stdout = io.StringIO()
+        call_command(
+            "export_reservations", "--date-from", "2029-06-03", stdout=stdout
+        )
+
+        rows = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(
+            [row["ticket_id"] for row in rows], [self.tickets[2].id]
+        )
+
+    def test_command_to_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "reservations.csv")
+
+        call_command(
+            "export_reservations",
+            "--format",
+            "csv",
+            "--show-session",
+            str(self.show_session.id),
+            "--output",
+            path,
+        )
+
+        with open(path, newline="") as export:
+            rows = list(csv.reader(export))
+        self.assertEqual(
+            [row[3] for row in rows[1:]],
+            [str(self.tickets[0].id), str(self.tickets[1].id)],
+        )
+
+    def test_command_date_to_before_date_from(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                "export_reservations",
+                "--date-from",
+                "2029-06-02",
+                "--date-to",
+                "2029-06-01",
+            )
+
+
+class ShowSessionListValuesTests(APITestCase):
+    """The values() rows render as the serializer renders instances"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@planetarium.com", password="test12345"
+        )
+        self.client.force_authenticate(self.user)
+        show_session = self.sold = create_show_session(
+            rows=4, seats_in_row=5
+        )
+        ShowSession.objects.create(
+            astronomy_show=show_session.astronomy_show,
+            planetarium_dome=show_session.planetarium_dome,
+            show_time="2030-01-01T12:30:15.250Z",
+        )
+        Ticket.objects.create(
+            row=1,
+            seat=1,
+            show_session=show_session,
+            reservation=Reservation.objects.create(user=self.user),
+        )
+
+    def assert_rendered_as_instances(self):
+        response = self.client.get(reverse("planetarium:showsession-list"))
+        self.assertEqual(response.status_code, 200)
+
+        show_sessions = list(
+            ShowSession.objects.select_related(
+                "astronomy_show", "planetarium_dome"
+            )
+        )
+        for show_session in show_sessions:
+            show_session.tickets_available = (
+                show_session.planetarium_dome.capacity
+                - show_session.tickets_sold
+            )
+        expected = ShowSessionListSerializer(show_sessions, many=True).data
+
+        # Same keys in the same order, the list itself is unordered
+        results = response.data["results"]
+        rendered = {row["id"]: list(row.items()) for row in results}
+        self.assertEqual(
+            rendered, {row["id"]: list(row.items()) for row in expected}
+        )
+        self.assertIn(
+            ("planetarium_dome_capacity", 20), rendered[self.sold.id]
+        )
+        self.assertIn(("tickets_available", 19), rendered[self.sold.id])
+
+    def test_rendered_as_instances(self):
+        self.assert_rendered_as_instances()
+
+    @override_settings(TIME_ZONE="America/New_York")
+    def test_rendered_as_instances_in_local_time(self):
+        self.assert_rendered_as_instances()
+
+
+class AvailabilityTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@planetarium.com", password="test12345"
+        )
+        self.client.force_authenticate(self.user)
+        self.show = AstronomyShow.objects.create(
+            title="Show", description="Description"
+        )
+        self.other_show = AstronomyShow.objects.create(
+            title="Other show", description="Description"
+        )
+        self.small_dome = PlanetariumDome.objects.create(
+            name="Small dome", rows=2, seats_in_row=4
+        )
+        self.dome = PlanetariumDome.objects.create(
+            name="Dome", rows=5, seats_in_row=4
+        )
+        # Four free seats, but no two of them side by side
+        self.fragmented = ShowSession.objects.create(
+            astronomy_show=self.show,
+            planetarium_dome=self.small_dome,
+            show_time="2030-01-01T10:00Z",
+        )
+        reservation = Reservation.objects.create(user=self.user)
+        for row in (1, 2):
+            for seat in (2, 3):
+                Ticket.objects.create(
+                    row=row,
+                    seat=seat,
+                    show_session=self.fragmented,
+                    reservation=reservation,
+                )
+        self.open = ShowSession.objects.create(
+            astronomy_show=self.show,
+            planetarium_dome=self.dome,
+            show_time="2030-01-01T10:00Z",
+        )
+        self.other_open = ShowSession.objects.create(
+            astronomy_show=self.other_show,
+            planetarium_dome=self.small_dome,
+            show_time="2030-01-02T10:00Z",
+        )
+        self.past = ShowSession.objects.create(
+            astronomy_show=self.show,
+            planetarium_dome=self.dome,
+            show_time=timezone.now() - timedelta(days=1),
+        )
+
+    def search(self, **params):
+        response = self.client.get(
+            reverse("planetarium:showsession-availability"), params
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def search_ids(self, **params):
+        return [row["id"] for row in self.search(**params)]
+
+    def test_fragmented_rows_are_excluded(self):
+        self.assertEqual(
+            self.search_ids(party_size=2), [self.open.id, self.other_open.id]
+        )
+        self.assertEqual(
+            self.search_ids(party_size=1),
+            [self.fragmented.id, self.open.id, self.other_open.id],
+        )
+
+    def test_show_and_dome_filters(self):
+        self.assertEqual(
+            self.search_ids(party_size=2, astronomy_show=self.other_show.id),
+            [self.other_open.id],
+        )
+        self.assertEqual(
+            self.search_ids(party_size=1, planetarium_dome=self.small_dome.id),
+            [self.fragmented.id, self.other_open.id],
+        )
+        self.assertEqual(
+            self.search_ids(
+                party_size=1,
+                astronomy_show=self.show.id,
+                planetarium_dome=self.small_dome.id,
+            ),
+            [self.fragmented.id],
+        )
+
+    def test_blocks_limit(self):
+        def blocks(**params):
+            (show_session,) = self.search(
+                party_size=2, planetarium_dome=self.dome.id, **params
+            )
+            return show_session["blocks"]
+
+        self.assertEqual(len(blocks()), 3)
+        self.assertEqual(len(blocks(blocks=1)), 1)
+        # One block per row of the dome at most
+        self.assertEqual(len(blocks(blocks=20)), 5)
+        for block in blocks(blocks=20):
+            self.assertEqual(block["seats"], [2, 3])
+
+    def test_upcoming_sessions_by_default(self):
+        self.assertNotIn(self.past.id, self.search_ids(party_size=1))
+        self.assertIn(
+            self.past.id,
+            self.search_ids(
+                party_size=1, date_from=timezone.localdate(self.past.show_time)
+            ),
+        )
@@ -0,0 +1,194 @@
+from datetime import datetime, timezone as dt_timezone
+from functools import cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import connection
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import throttling
+
+from planetarium.models import ThrottleCounter
+
+THROTTLE_CACHE_ALIAS = "throttle"
+
+
+class CacheThrottleStore:
+    """
+    Counters in the throttle cache, one key per window. Only shared by
+    the workers with a shared backend such as Redis or Memcached.
+    """
+
+    @property
+    def cache(self):
+        return caches[THROTTLE_CACHE_ALIAS]
+
+    def hit(self, key, window, duration):
+        """Count a request, return the (current, previous) window counts"""
+        current_key = f"{key}:{window}"
+        # Kept through the next window, where it is the previous one
+        if self.cache.add(current_key, 1, 2 * duration):
+            current = 1
+        else:
+            try:
+                current = self.cache.incr(current_key)
+            except ValueError:
+                # Expired since add()
+                self.cache.set(current_key, 1, 2 * duration)
+                current = 1
+        return current, self.cache.get(f"{key}:{window - 1}", 0)
+
+    def release(self, key, window, duration):
+        """Uncount a request rejected by the throttle"""
+        try:
+            self.cache.decr(f"{key}:{window}")
+        except ValueError:
+            pass
+
+
+class DatabaseThrottleStore:
+    """
+    Counters in the UNLOGGED ThrottleCounter table, updated by a single
+    upsert, for deployments without a shared cache
+    """
+
+    hit_sql = """
+        INSERT INTO {table} AS counter (
+            key, current_window, current_count, previous_count, expires_at
+        )
+        VALUES (%s, %s, 1, 0, %s)
+        ON CONFLICT (key) DO UPDATE SET
+            current_window = EXCLUDED.current_window,
+            current_count = CASE
+                WHEN counter.current_window = EXCLUDED.current_window
+                THEN counter.current_count + 1
+                ELSE 1
+            END,
+            previous_count = CASE
+                WHEN counter.current_window = EXCLUDED.current_window
+                THEN counter.previous_count
+                WHEN counter.current_window = EXCLUDED.current_window - 1
+                THEN counter.current_count
+                ELSE 0
+            END,
+            expires_at = EXCLUDED.expires_at
+        RETURNING current_count, previous_count
+    """
+
+    def hit(self, key, window, duration):
+        """Count a request, return the (current, previous) window counts"""
+        expires_at = datetime.fromtimestamp(
+            (window + 2) * duration, tz=dt_timezone.utc
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                self.hit_sql.format(
+                    table=connection.ops.quote_name(
+                        ThrottleCounter._meta.db_table
+                    )
+                ),
+                [key, window, expires_at],
+            )
+            return cursor.fetchone()
+
+    def release(self, key, window, duration):
+        """Uncount a request rejected by the throttle"""
+        ThrottleCounter.objects.filter(
+            key=key, current_window=window, current_count__gt=0
+        ).update(current_count=F("current_count") - 1)
+
+
+class NullThrottleStore:
+    """Count nothing, every request is let through, e.g. in benchmarks"""
+
+    def hit(self, key, window, duration):
+        return 0, 0
+
+    def release(self, key, window, duration):
+        pass
+
+
+@cache
+def get_throttle_store():
+    return import_string(settings.THROTTLE_STORE)()
+
+
+@receiver(setting_changed)
+def reset_throttle_store(setting, **kwargs):
+    if setting == "THROTTLE_STORE":
+        get_throttle_store.cache_clear()
+
+
+def purge_throttle_counters() -> int:
+    """Delete the counters of the keys idle for a whole window"""
+    deleted, _ = ThrottleCounter.objects.filter(
+        expires_at__lte=timezone.now()
+    ).delete()
+    return deleted
+
+
+class SlidingWindowRateThrottle(throttling.SimpleRateThrottle):
+    """
+    Count the requests of each key in fixed windows of the rate duration
+    in the THROTTLE_STORE, instead of a cached list of timestamps.
+
+    The requests of the sliding window ending now are estimated as the
+    current window count plus the previous window count weighted by the
+    share of the previous window still in the sliding one. That is two
+    counters per key, incremented atomically by the store, so the rate
+    holds across the workers sharing it. Rejected requests are not
+    counted.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        store = get_throttle_store()
+        window, elapsed = divmod(self.timer(), self.duration)
+        window = int(window)
+        current, previous = store.hit(self.key, window, self.duration)
+        weight = 1 - elapsed / self.duration
+        if current + previous * weight <= self.num_requests:
+            return True
+
+        store.release(self.key, window, self.duration)
+        self.wait_time = self.get_wait_time(elapsed, current - 1, previous)
+        return False
+
+    def get_wait_time(self, elapsed, current, previous) -> float:
+        """Seconds until the weight of the counts lets a request through"""
+        if self.num_requests == 0 or current == 0:
+            # A zero rate never lets one through, wait out the window
+            return self.duration - elapsed
+        if current < self.num_requests:
+            # Within this window, once the previous one weighs less
+            free = self.num_requests - current - 1
+            return self.duration * (1 - free / previous) - elapsed
+        # In the next window, where this one is the previous one
+        free = self.num_requests - 1
+        return self.duration * (2 - free / current) - elapsed
+
+    def wait(self):
+        return self.wait_time
+
+
+class AnonRateThrottle(throttling.AnonRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class UserRateThrottle(throttling.UserRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class ScopedRateThrottle(
+    throttling.ScopedRateThrottle, SlidingWindowRateThrottle
+):
+    """Rate of the throttle_scope of the view, none without it"""
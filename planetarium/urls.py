@@ -1,12 +1,20 @@
 from django.urls import path, include
 from rest_framework import routers
 
+from planetarium.async_views import (
+    AsyncShowSessionListView,
+    AsyncShowSessionDetailView,
+    AsyncAstronomyShowListView,
+    AsyncAstronomyShowDetailView,
+)
 from planetarium.views import (
     ShowThemeViewSet,
     AstronomyShowViewSet,
     PlanetariumDomeViewSet,
     ShowSessionViewSet,
     ReservationViewSet,
+    SeatHoldViewSet,
+    OccupancyViewSet,
 )
 
 app_name = "planetarium"
@@ -17,6 +25,32 @@ router.register("shows", AstronomyShowViewSet)
 router.register("domes", PlanetariumDomeViewSet)
 router.register("show_sessions", ShowSessionViewSet)
 router.register("reservations", ReservationViewSet)
+router.register("holds", SeatHoldViewSet)
+router.register(
+    "analytics/occupancy", OccupancyViewSet, basename="occupancy"
+)
 
 
-urlpatterns = [path("", include(router.urls))]
+urlpatterns = [
+    path("", include(router.urls)),
+    path(
+        "async/show_sessions/",
+        AsyncShowSessionListView.as_view(),
+        name="async-showsession-list",
+    ),
+    path(
+        "async/show_sessions/<int:pk>/",
+        AsyncShowSessionDetailView.as_view(),
+        name="async-showsession-detail",
+    ),
+    path(
+        "async/shows/",
+        AsyncAstronomyShowListView.as_view(),
+        name="async-astronomyshow-list",
+    ),
+    path(
+        "async/shows/<int:pk>/",
+        AsyncAstronomyShowDetailView.as_view(),
+        name="async-astronomyshow-detail",
+    ),
+]
@@ -1,16 +1,51 @@
-from django.db.models import F, Count
+from datetime import datetime, time, timedelta
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
-from rest_framework import viewsets, mixins
-from rest_framework.permissions import IsAuthenticated
-
+from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+
+from planetarium_api.instrumentation import InstrumentedViewMixin
+from planetarium.analytics import get_occupancy
+from planetarium.availability import (
+    AVAILABILITY_BATCH_SIZE,
+    find_available_sessions,
+)
+from planetarium.cache import CachedResponseMixin
+from planetarium.exceptions import SeatsUnavailable
+from planetarium.holds import release_holds
+from planetarium.export import (
+    EXPORT_FORMATS,
+    aget_export_rows,
+    aiter_export,
+    get_export_rows,
+    iter_export,
+)
+from planetarium.idempotency import IDEMPOTENCY_HEADER, IdempotentCreateMixin
 from planetarium.models import (
     ShowTheme,
     AstronomyShow,
     PlanetariumDome,
     ShowSession,
     Reservation,
+    Ticket,
+    SeatHold,
+    SessionOccupancy,
 )
+from planetarium.occupancy import count_held_seats, get_seat_map
+from planetarium.scheduling import find_overlapping_sessions
+from planetarium.pagination import ShowSessionPagination, ReservationPagination
 from planetarium.permissions import IsAdminOrIfAuthenticatedReadOnly
+from planetarium.prefetch import EagerLoadingMixin
 
 from planetarium.serializers import (
     ShowThemeSerializer,
@@ -23,15 +58,34 @@ from planetarium.serializers import (
     ReservationRetrieveSerializer,
     AstronomyShowListSerializer,
     AstronomyShowRetrieveSerializer,
+    ShowSessionSeatMapSerializer,
+    ReservationExportFilterSerializer,
+    ShowSessionAvailabilityFilterSerializer,
+    ShowSessionAvailabilitySerializer,
+    ReservationAutoAssignSerializer,
+    SeatHoldSerializer,
+    ShowSessionBulkCreateSerializer,
+    DomeScheduleFilterSerializer,
+    DomeScheduleSerializer,
+    OccupancyFilterSerializer,
+    OccupancySerializer,
+    AstronomyShowImageSerializer,
 )
 
 
-class ShowThemeViewSet(viewsets.ModelViewSet):
+class ShowThemeViewSet(
+    InstrumentedViewMixin,
+    CachedResponseMixin,
+    EagerLoadingMixin,
+    viewsets.ModelViewSet,
+):
+    cache_namespace = "themes"
+    query_budget = {"list": 3, "retrieve": 2}
     queryset = ShowTheme.objects.all()
     serializer_class = ShowThemeSerializer
 
     def get_queryset(self):
-        queryset = self.queryset
+        queryset = super().get_queryset()
 
         name = self.request.query_params.get("name")
         if name:
@@ -52,12 +106,27 @@ class ShowThemeViewSet(viewsets.ModelViewSet):
         return super().list(request, *args, **kwargs)
 
 
-class AstronomyShowViewSet(viewsets.ModelViewSet):
+class AstronomyShowViewSet(
+    InstrumentedViewMixin,
+    CachedResponseMixin,
+    EagerLoadingMixin,
+    viewsets.ModelViewSet,
+):
+    cache_namespace = "shows"
+    query_budget = {"list": 4, "retrieve": 3}
     queryset = AstronomyShow.objects.all()
     serializer_class = AstronomyShowSerializer
 
+    def initialize_request(self, request, *args, **kwargs):
+        # Always spool uploaded images to a temporary file in chunks, the
+        # storage then moves it into place instead of copying it. The
+        # handlers must be set before the request body is read.
+        if self.action_map.get(request.method.lower()) == "upload_image":
+            request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
     def get_queryset(self):
-        queryset = self.queryset
+        queryset = super().get_queryset()
 
         title = self.request.query_params.get("title")
         if title:
@@ -70,6 +139,8 @@ class AstronomyShowViewSet(viewsets.ModelViewSet):
             return AstronomyShowListSerializer
         if self.action == "retrieve":
             return AstronomyShowRetrieveSerializer
+        if self.action == "upload_image":
+            return AstronomyShowImageSerializer
         return self.serializer_class
 
     @extend_schema(
@@ -84,13 +155,37 @@ class AstronomyShowViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
-
-class PlanetariumDomeViewSet(viewsets.ModelViewSet):
+    @action(
+        methods=["POST"],
+        detail=True,
+        url_path="upload-image",
+        parser_classes=[MultiPartParser],
+    )
+    def upload_image(self, request, pk=None):
+        """
+        Upload the image of a show, its resized variants are made in
+        the background by process_images
+        """
+        show = self.get_object()
+        serializer = self.get_serializer(show, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+
+class PlanetariumDomeViewSet(
+    InstrumentedViewMixin,
+    CachedResponseMixin,
+    EagerLoadingMixin,
+    viewsets.ModelViewSet,
+):
+    cache_namespace = "domes"
+    query_budget = {"list": 3, "retrieve": 2, "schedule": 2}
     queryset = PlanetariumDome.objects.all()
     serializer_class = PlanetariumDomeSerializer
 
     def get_queryset(self):
-        queryset = self.queryset
+        queryset = super().get_queryset()
 
         name = self.request.query_params.get("name")
         if name:
@@ -110,13 +205,53 @@ class PlanetariumDomeViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @extend_schema(
+        parameters=[DomeScheduleFilterSerializer],
+        responses=DomeScheduleSerializer(many=True),
+    )
+    @action(methods=["GET"], detail=True, url_path="schedule")
+    def schedule(self, request, pk=None):
+        """
+        Show sessions taking dome time between date_from and date_to,
+        in the server time zone, in show time order
+        """
+        planetarium_dome = self.get_object()
+        filters = DomeScheduleFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+
+        tz = timezone.get_current_timezone()
+        start = datetime.combine(
+            filters.validated_data["date_from"], time.min, tzinfo=tz
+        )
+        end = datetime.combine(
+            filters.validated_data["date_to"] + timedelta(days=1),
+            time.min,
+            tzinfo=tz,
+        )
+        show_sessions = (
+            find_overlapping_sessions(planetarium_dome.id, start, end)
+            .order_by("show_time")
+            .values(
+                "id",
+                "show_time",
+                "end_time",
+                astronomy_show_title=F("astronomy_show__title"),
+            )
+        )
+        serializer = DomeScheduleSerializer(show_sessions, many=True)
+        return Response(serializer.data)
 
-class ShowSessionViewSet(viewsets.ModelViewSet):
+
+class ShowSessionViewSet(
+    InstrumentedViewMixin, EagerLoadingMixin, viewsets.ModelViewSet
+):
     queryset = ShowSession.objects.all()
     serializer_class = ShowSessionSerializer
+    pagination_class = ShowSessionPagination
+    query_budget = {"list": 3, "retrieve": 3, "seats": 3}
 
     def get_queryset(self):
-        queryset = self.queryset
+        queryset = super().get_queryset()
 
         show_title = self.request.query_params.get("show_title")
         dome_name = self.request.query_params.get("dome_name")
@@ -132,28 +267,121 @@ class ShowSessionViewSet(viewsets.ModelViewSet):
         if date:
             queryset = queryset.filter(show_time__date=date)
 
-        if self.action in ("list", "retrieve"):
-            queryset = queryset.select_related(
-                "astronomy_show",
-                "planetarium_dome",
-            ).annotate(
-                tickets_available=(
-                    F("planetarium_dome__rows")
-                    * F("planetarium_dome__seats_in_row")
-                    - Count("ticket")
-                )
+        capacity = F("planetarium_dome__rows") * F(
+            "planetarium_dome__seats_in_row"
+        )
+        # Held seats aren't available either, as in the seat map
+        tickets_available = capacity - F("tickets_sold") - count_held_seats()
+        if self.action == "list":
+            # Exactly the ShowSessionListSerializer fields, as dicts
+            queryset = queryset.values(
+                "id",
+                "show_time",
+                astronomy_show_title=F("astronomy_show__title"),
+                planetarium_dome_name=F("planetarium_dome__name"),
+                planetarium_dome_capacity=capacity,
+                tickets_available=tickets_available,
+            )
+        elif self.action == "retrieve":
+            queryset = queryset.annotate(tickets_available=tickets_available)
+        elif self.action == "seats":
+            queryset = queryset.select_related("planetarium_dome")
+        elif self.action == "availability":
+            queryset = queryset.values(
+                "id",
+                "show_time",
+                astronomy_show_title=F("astronomy_show__title"),
+                planetarium_dome_name=F("planetarium_dome__name"),
+                rows=F("planetarium_dome__rows"),
+                seats_in_row=F("planetarium_dome__seats_in_row"),
+                tickets_available=tickets_available,
             )
 
-        return queryset.distinct()
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "list":
             return ShowSessionListSerializer
         elif self.action == "retrieve":
             return ShowSessionRetrieveSerializer
+        elif self.action == "seats":
+            return ShowSessionSeatMapSerializer
+        elif self.action == "availability":
+            return ShowSessionAvailabilitySerializer
+        elif self.action == "bulk":
+            return ShowSessionBulkCreateSerializer
 
         return self.serializer_class
 
+    @action(methods=["GET"], detail=True, url_path="seats")
+    def seats(self, request, pk=None):
+        """Occupancy of every seat in the dome for a given show session"""
+        show_session = self.get_object()
+        serializer = self.get_serializer(get_seat_map(show_session))
+        return Response(serializer.data)
+
+    @extend_schema(
+        parameters=[ShowSessionAvailabilityFilterSerializer],
+        responses=ShowSessionAvailabilitySerializer(many=True),
+    )
+    @action(methods=["GET"], detail=False, url_path="availability")
+    def availability(self, request):
+        """
+        Upcoming show sessions that can seat party_size people side by
+        side, with suggested seat blocks closest to the centre
+        """
+        filters = ShowSessionAvailabilityFilterSerializer(
+            data=request.query_params
+        )
+        filters.is_valid(raise_exception=True)
+        party_size = filters.validated_data["party_size"]
+
+        queryset = self.get_queryset().filter(
+            planetarium_dome__seats_in_row__gte=party_size,
+            tickets_available__gte=party_size,
+        )
+        if "date_from" not in filters.validated_data:
+            queryset = queryset.filter(show_time__gte=timezone.now())
+        for param, lookup in (
+            ("date_from", "show_time__date__gte"),
+            ("date_to", "show_time__date__lte"),
+            ("astronomy_show", "astronomy_show_id"),
+            ("planetarium_dome", "planetarium_dome_id"),
+        ):
+            if param in filters.validated_data:
+                queryset = queryset.filter(
+                    **{lookup: filters.validated_data[param]}
+                )
+
+        show_sessions = find_available_sessions(
+            queryset.order_by("show_time", "id").iterator(
+                chunk_size=AVAILABILITY_BATCH_SIZE
+            ),
+            party_size,
+            filters.validated_data["limit"],
+            filters.validated_data["blocks"],
+        )
+        serializer = self.get_serializer(show_sessions, many=True)
+        return Response(serializer.data)
+
+    @extend_schema(
+        request=ShowSessionBulkCreateSerializer,
+        responses={201: ShowSessionSerializer(many=True)},
+    )
+    @action(methods=["POST"], detail=False, url_path="bulk")
+    def bulk(self, request):
+        """
+        Schedule a list of show sessions or a weekly recurrence at once,
+        rejected as a whole if any session overlaps another in its dome
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        show_sessions = serializer.save()
+        return Response(
+            ShowSessionSerializer(show_sessions, many=True).data,
+            status=status.HTTP_201_CREATED,
+        )
+
     @extend_schema(
         parameters=[
             OpenApiParameter(
@@ -179,18 +407,34 @@ class ShowSessionViewSet(viewsets.ModelViewSet):
         return super().list(request, *args, **kwargs)
 
 
+RESERVATION_CREATE_ATTEMPTS = 3
+
+
 class ReservationViewSet(
+    InstrumentedViewMixin,
+    IdempotentCreateMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.DestroyModelMixin,
     mixins.RetrieveModelMixin,
+    EagerLoadingMixin,
     viewsets.GenericViewSet,
 ):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
+    pagination_class = ReservationPagination
+    query_budget = {"list": 4, "retrieve": 7}
+
+    @property
+    def throttle_scope(self):
+        return "sensitive" if self.action == "create" else None
 
     def get_permissions(self):
-        if self.action in ("create", "destroy"):
+        if self.action == "export":
+            return [
+                IsAdminUser(),
+            ]
+        if self.action in ("create", "destroy", "best_available"):
             return [
                 IsAuthenticated(),
             ]
@@ -199,7 +443,7 @@ class ReservationViewSet(
         ]
 
     def get_queryset(self):
-        queryset = self.queryset.filter(user=self.request.user)
+        queryset = super().get_queryset().filter(user=self.request.user)
 
         date = self.request.query_params.get("date")
         show_session = self.request.query_params.get("show_session")
@@ -210,19 +454,84 @@ class ReservationViewSet(
                 tickets__show_session__id=int(show_session)
             )
 
-        if self.action in ("list", "retrieve"):
-            queryset = queryset.prefetch_related("tickets")
-
         return queryset.distinct()
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        self.save_reservation(serializer)
+
+    def save_reservation(self, serializer):
+        # Seats are locked and re-checked inside the serializer transaction,
+        # a seat sold twice only means a ticket was written around the lock
+        for attempt in range(1, RESERVATION_CREATE_ATTEMPTS + 1):
+            try:
+                return serializer.save(user=self.request.user)
+            except IntegrityError as error:
+                if not Ticket.is_seat_conflict(error):
+                    raise
+                if attempt == RESERVATION_CREATE_ATTEMPTS:
+                    seats = serializer.requested_seats
+                    raise SeatsUnavailable(
+                        Ticket.find_taken_seats(seats) or seats
+                    )
 
     def get_serializer_class(self):
         if self.action == "retrieve":
             return ReservationRetrieveSerializer
+        if self.action == "export":
+            return ReservationExportFilterSerializer
+        if self.action == "best_available":
+            return ReservationAutoAssignSerializer
         return self.serializer_class
 
+    @action(methods=["POST"], detail=False, url_path="best-available")
+    def best_available(self, request):
+        """
+        Reserve quantity seats of a show session, the server picks the
+        best available ones and keeps the party together
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.save_reservation(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        parameters=[ReservationExportFilterSerializer],
+        responses={
+            (200, content_type): OpenApiTypes.STR
+            for content_type, _ in EXPORT_FORMATS.values()
+        },
+    )
+    @action(methods=["GET"], detail=False, url_path="export")
+    def export(self, request):
+        """
+        Stream the tickets of all users with their reservation and show
+        session, one flat row per ticket, as NDJSON or CSV (?output=csv)
+        """
+        filters = self.get_serializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        output = filters.validated_data.pop("output")
+        content_type, extension = EXPORT_FORMATS[output]
+
+        # ASGI servers read the rows in chunks only from an async iterator
+        if isinstance(request._request, ASGIRequest):
+            chunks = aiter_export(
+                output, aget_export_rows(**filters.validated_data)
+            )
+        else:
+            chunks = iter_export(
+                output, get_export_rows(**filters.validated_data)
+            )
+
+        return StreamingHttpResponse(
+            chunks,
+            content_type=content_type,
+            headers={
+                "Content-Disposition": (
+                    f'attachment; filename="reservations.{extension}"'
+                )
+            },
+        )
+
     @extend_schema(
         parameters=[
             OpenApiParameter(
@@ -241,3 +550,91 @@ class ReservationViewSet(
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                IDEMPOTENCY_HEADER,
+                location=OpenApiParameter.HEADER,
+                description="Retries with the same key replay"
+                " the first response instead of reserving again",
+            ),
+        ]
+    )
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+
+class SeatHoldViewSet(
+    InstrumentedViewMixin,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    mixins.DestroyModelMixin,
+    mixins.RetrieveModelMixin,
+    EagerLoadingMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Hold seats for SEAT_HOLD_TTL while the booking is completed,
+    confirm the hold to reserve them or delete it to release them
+    """
+
+    queryset = SeatHold.objects.all()
+    serializer_class = SeatHoldSerializer
+    permission_classes = (IsAuthenticated,)
+    query_budget = {"list": 3, "retrieve": 3}
+
+    @property
+    def throttle_scope(self):
+        return "sensitive" if self.action == "create" else None
+
+    def get_queryset(self):
+        queryset = (
+            super()
+            .get_queryset()
+            .filter(user=self.request.user)
+            .select_related("show_session")
+        )
+        # Expired holds are still found, confirming one is a 410
+        if self.action == "list":
+            queryset = queryset.filter(expires_at__gt=timezone.now())
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            release_holds([instance.id], [instance.show_session_id])
+
+    @extend_schema(request=None, responses={201: ReservationSerializer})
+    @action(methods=["POST"], detail=True, url_path="confirm")
+    def confirm(self, request, pk=None):
+        """Reserve the held seats"""
+        serializer = self.get_serializer(self.get_object())
+        reservation = serializer.confirm(request.user)
+        return Response(
+            ReservationSerializer(reservation).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class OccupancyViewSet(InstrumentedViewMixin, viewsets.GenericViewSet):
+    queryset = SessionOccupancy.objects.all()
+    serializer_class = OccupancySerializer
+    permission_classes = (IsAdminUser,)
+    query_budget = {"list": 2}
+
+    @extend_schema(parameters=[OccupancyFilterSerializer])
+    def list(self, request):
+        """
+        Sessions, sold seats, capacity and fill rate per day, week or
+        month, optionally per show or dome. Read from the aggregates of
+        refresh_occupancy, not from the tickets.
+        """
+        filters = OccupancyFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+
+        page = self.paginate_queryset(get_occupancy(**filters.validated_data))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
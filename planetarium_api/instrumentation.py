@@ -0,0 +1,284 @@
+import bisect
+import logging
+import threading
+from contextlib import ExitStack
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+current_metrics = ContextVar("current_metrics", default=None)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.view_name = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - start
+            self.queries += 1
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """In-process histograms of the request metrics per view"""
+
+    histograms = {
+        "request_duration_seconds": SECONDS_BUCKETS,
+        "db_duration_seconds": SECONDS_BUCKETS,
+        "serialization_duration_seconds": SECONDS_BUCKETS,
+        "db_queries": QUERIES_BUCKETS,
+        "response_size_bytes": BYTES_BUCKETS,
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, view_name, values):
+        with self.lock:
+            view = self.views.setdefault(
+                view_name,
+                {
+                    name: Histogram(buckets)
+                    for name, buckets in self.histograms.items()
+                },
+            )
+            for name, value in values.items():
+                view[name].observe(value)
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for name in self.histograms:
+                metric = f"planetarium_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for view_name, view in sorted(self.views.items()):
+                    histogram = view[name]
+                    cumulative = 0
+                    for bucket, count in zip(
+                        histogram.buckets + ("+Inf",), histogram.counts
+                    ):
+                        cumulative += count
+                        lines.append(
+                            f'{metric}_bucket{{view="{view_name}",'
+                            f'le="{bucket}"}} {cumulative}'
+                        )
+                    lines.append(
+                        f'{metric}_sum{{view="{view_name}"}} {histogram.sum}'
+                    )
+                    lines.append(
+                        f'{metric}_count{{view="{view_name}"}} {cumulative}'
+                    )
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class InstrumentationMiddleware:
+    """
+    Count the queries and time spent per request, expose them in a
+    Server-Timing header and aggregate them in the metrics registry.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = perf_counter()
+        try:
+            with self.record_queries(metrics):
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.process_metrics(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = perf_counter()
+        # Connections are per thread, the async ORM queries run in the
+        # thread sensitive executor of the request
+        stack = await sync_to_async(self.record_queries)(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            current_metrics.reset(token)
+        return self.process_metrics(request, response, metrics, start)
+
+    @staticmethod
+    def record_queries(metrics) -> ExitStack:
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(
+                connection.execute_wrapper(metrics.record_query)
+            )
+        return stack
+
+    @staticmethod
+    def process_metrics(request, response, metrics, start):
+        duration = perf_counter() - start
+
+        response["Server-Timing"] = ", ".join(
+            (
+                f'db;dur={metrics.db_time * 1000:.1f};'
+                f'desc="{metrics.queries} queries"',
+                f"serialize;dur={metrics.serialization_time * 1000:.1f}",
+                f"total;dur={duration * 1000:.1f}",
+            )
+        )
+
+        view_name = metrics.view_name
+        if view_name is None and request.resolver_match is not None:
+            view_name = request.resolver_match.view_name
+        registry.observe(
+            view_name or "unresolved",
+            {
+                "request_duration_seconds": duration,
+                "db_duration_seconds": metrics.db_time,
+                "serialization_duration_seconds": (
+                    metrics.serialization_time
+                ),
+                "db_queries": metrics.queries,
+                "response_size_bytes": (
+                    0 if response.streaming else len(response.content)
+                ),
+            },
+        )
+        return response
+
+
+class TimedRepresentation:
+    """
+    Wrap the to_representation method of a serializer instance to add
+    its time, minus the queries it runs, to the request metrics
+    """
+
+    def __init__(self, to_representation):
+        self.to_representation = to_representation
+
+    def __call__(self, instance):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return self.to_representation(instance)
+        start, db_time = perf_counter(), metrics.db_time
+        try:
+            return self.to_representation(instance)
+        finally:
+            metrics.serialization_time += (
+                perf_counter() - start - (metrics.db_time - db_time)
+            )
+
+
+class InstrumentedViewMixin:
+    """
+    Name the request metrics after the view action, time serialization
+    and check the optional per action query budget, e.g.
+    query_budget = {"list": 3, "retrieve": 2}
+    """
+
+    query_budget = None
+
+    def get_metrics_name(self) -> str:
+        action = getattr(self, "action", None) or self.request.method.lower()
+        return f"{self.__class__.__name__}.{action}"
+
+    def get_query_budget(self):
+        if isinstance(self.query_budget, dict):
+            return self.query_budget.get(getattr(self, "action", None))
+        return self.query_budget
+
+    def initial(self, request, *args, **kwargs):
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.view_name = self.get_metrics_name()
+        super().initial(request, *args, **kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if current_metrics.get() is not None and not getattr(
+            self, "swagger_fake_view", False
+        ):
+            # An instance attribute, the serializer keeps its own class
+            serializer.to_representation = TimedRepresentation(
+                serializer.to_representation
+            )
+        return serializer
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        metrics = current_metrics.get()
+        budget = self.get_query_budget()
+        if metrics is not None and budget is not None:
+            if metrics.queries > budget:
+                message = (
+                    f"{self.get_metrics_name()} ran {metrics.queries} "
+                    f"queries, the budget is {budget}"
+                )
+                if settings.QUERY_BUDGET_RAISE:
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class MetricsView(APIView):
+    permission_classes = (IsAdminUser,)
+    schema = None
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(
+            registry.render(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
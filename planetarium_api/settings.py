@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "debug_toolbar",
     "rest_framework",
     "rest_framework_simplejwt",
@@ -53,6 +54,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "planetarium_api.instrumentation.InstrumentationMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -98,6 +100,31 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "catalog": {
+        "BACKEND": os.environ.get(
+            "CATALOG_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.environ.get("CATALOG_CACHE_LOCATION", "catalog"),
+        "TIMEOUT": 60 * 60,
+    },
+    "throttle": {
+        "BACKEND": os.environ.get(
+            "THROTTLE_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.environ.get("THROTTLE_CACHE_LOCATION", "throttle"),
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -127,6 +154,28 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTH_USER_MODEL = "user.User"
 
+# New passwords are hashed with PASSWORD_HASHER, the others only check
+# the existing hashes, which are rehashed with it on the next login
+PASSWORD_HASHERS = list(
+    dict.fromkeys(
+        [
+            os.environ.get(
+                "PASSWORD_HASHER", "user.hashers.Argon2PasswordHasher"
+            ),
+            "user.hashers.Argon2PasswordHasher",
+            "user.hashers.ScryptPasswordHasher",
+            "user.hashers.PBKDF2PasswordHasher",
+            "user.hashers.PBKDF2SHA1PasswordHasher",
+        ]
+    )
+)
+
+# Processes hashing the passwords per server process, 0 to hash them in
+# the request thread
+PASSWORD_HASHING_WORKERS = int(
+    os.environ.get("PASSWORD_HASHING_WORKERS", 2)
+)
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -147,6 +196,19 @@ MEDIA_URL = "/media/"
 
 STATIC_URL = "static/"
 
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+    # Show images and their variants, by content hash under MEDIA_ROOT
+    "show_images": {
+        "BACKEND": "planetarium.storage.ContentAddressedStorage",
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -157,13 +219,20 @@ REST_FRAMEWORK = {
         "planetarium.permissions.IsAdminOrIfAuthenticatedReadOnly",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.ClaimsJWTAuthentication",
     ),
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "planetarium.throttling.AnonRateThrottle",
+        "planetarium.throttling.UserRateThrottle",
+        "planetarium.throttling.ScopedRateThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {"anon": "10/day", "user": "1000/day"},
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "10/day",
+        "user": os.environ.get("USER_THROTTLE_RATE", "1000/day"),
+        # Creating reservations and seat holds and obtaining tokens, on top
+        # of the above
+        "sensitive": os.environ.get("SENSITIVE_THROTTLE_RATE", "10/min"),
+    },
     "DEFAULT_PAGINATION_CLASS": (
         "rest_framework.pagination.LimitOffsetPagination"
     ),
@@ -175,8 +244,54 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=45),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "ROTATE_REFRESH_TOKENS": True,
+    "TOKEN_OBTAIN_SERIALIZER": "user.serializers.TokenObtainPairSerializer",
+}
+
+# How long and for how many users each process trusts the is_active and
+# is_staff token claims checked by user.authentication
+JWT_USER_CACHE_TTL = timedelta(seconds=30)
+JWT_USER_CACHE_SIZE = 10000
+
+# Best available seats: the lowest weighted distance from the best row
+# (a fraction of the dome depth, 0 is the first row) and the middle seat
+SEAT_ASSIGNMENT = {
+    "BEST_ROW": 0.5,
+    "ROW_WEIGHT": 2.0,
+    "SEAT_WEIGHT": 1.0,
+    "MAX_QUANTITY": 20,
+}
+
+# Resized copies of the show images made by process_images, the image
+# is cropped to the size or only scaled down to fit in it
+IMAGE_VARIANTS = {
+    "thumbnail": {"size": (160, 160), "crop": True},
+    "card": {"size": (480, 480), "crop": False},
+    "full": {"size": (1600, 1600), "crop": False},
 }
 
+# Dome time taken by a session of a show without a duration
+SHOW_SESSION_DURATION = timedelta(hours=1)
+
+# Longest time seats can be held before they are reserved
+SEAT_HOLD_TTL = timedelta(minutes=10)
+
+# Most seats a user can hold at once in a show session
+SEAT_HOLD_MAX_SEATS = int(os.environ.get("SEAT_HOLD_MAX_SEATS", 20))
+
+# Where the throttles count the requests: CacheThrottleStore uses the
+# "throttle" cache, which must be shared (Redis, Memcached) to hold the
+# rates across workers; DatabaseThrottleStore uses Postgres instead
+THROTTLE_STORE = os.environ.get(
+    "THROTTLE_STORE", "planetarium.throttling.CacheThrottleStore"
+)
+
+# How long a reservation Idempotency-Key replays its first response
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# Log views exceeding their query budget, or fail loudly, as the test
+# settings do
+QUERY_BUDGET_RAISE = os.environ.get("QUERY_BUDGET_RAISE") == "True"
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Planetarium API",
     "DESCRIPTION": "Portfolio DRF project for planetarium management.",
@@ -0,0 +1,16 @@
+"""
+Settings of the test suite, select them with
+python manage.py test --settings=planetarium_api.test_settings
+or DJANGO_SETTINGS_MODULE=planetarium_api.test_settings for other runners.
+"""
+
+from planetarium_api.settings import *  # noqa: F401, F403
+
+QUERY_BUDGET_RAISE = True
+
+# Hash inline and fast, the project hashers still check their hashes
+PASSWORD_HASHERS = [
+    "django.contrib.auth.hashers.MD5PasswordHasher",
+    *PASSWORD_HASHERS,  # noqa: F405
+]
+PASSWORD_HASHING_WORKERS = 0
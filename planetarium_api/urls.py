@@ -26,6 +26,9 @@ from drf_spectacular.views import (
     SpectacularRedocView,
 )
 
+from planetarium_api.instrumentation import MetricsView
+from planetarium.storage import CONTENT_DIRECTORY, serve_content
+
 urlpatterns = (
     [
         path("admin/", admin.site.urls),
@@ -34,6 +37,7 @@ urlpatterns = (
             include("planetarium.urls", namespace="planetarium"),
         ),
         path("api/auth/", include("user.urls", namespace="auth")),
+        path("api/metrics/", MetricsView.as_view(), name="metrics"),
         path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
         path(
             "api/doc/swagger/",
@@ -46,6 +50,20 @@ urlpatterns = (
             name="redoc",
         ),
     ]
+    # Like static(), only in development
+    + (
+        [
+            # Never changes, cached for good by browsers and CDNs
+            path(
+                f"{settings.MEDIA_URL.strip('/')}/{CONTENT_DIRECTORY}/"
+                "<path:path>",
+                serve_content,
+                name="media-content",
+            ),
+        ]
+        if settings.DEBUG
+        else []
+    )
     + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     + debug_toolbar_urls()
 )
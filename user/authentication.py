@@ -0,0 +1,157 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.db import router
+from django.db.models import DEFERRED
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# Claims added to the tokens by user.serializers.TokenObtainPairSerializer
+USER_CLAIMS = ("is_active", "is_staff")
+
+
+class UserStateCache:
+    """
+    Thread safe LRU cache of the (is_active, is_staff, password hash) of
+    the users, each entry kept for ttl seconds
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, state = entry
+            if expires_at <= time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return state
+
+    def set(self, user_id, state):
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + self.ttl, state)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_states = UserStateCache(
+    settings.JWT_USER_CACHE_SIZE,
+    settings.JWT_USER_CACHE_TTL.total_seconds(),
+)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication trusting the is_active and is_staff claims of the
+    token instead of loading the user on every request.
+
+    The claims are checked against the state of the user kept in the
+    in-process user_states cache, loaded from the database at most once
+    per JWT_USER_CACHE_TTL. A deactivated or demoted user, or one whose
+    password changed, fails the check and is loaded as usual until
+    they get a new token. request.user is a User with only its id,
+    is_active and is_staff loaded, the other fields are fetched from the
+    database when they are first read.
+    """
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        claims = self.get_user_claims(validated_token)
+        if claims is not None:
+            state = user_states.get(user_id)
+            if state is None:
+                state = self.load_user_state(user_id)
+            if state == claims:
+                return self.get_claims_user(user_id, claims)
+        return super().get_user(validated_token)
+
+    def get_user_id(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                "Token contained no recognizable user identification"
+            )
+
+        try:
+            return self.user_model._meta.get_field(
+                api_settings.USER_ID_FIELD
+            ).to_python(user_id)
+        except Exception:
+            raise InvalidToken(
+                "Token contained no recognizable user identification"
+            )
+
+    @staticmethod
+    def get_user_claims(validated_token):
+        """The state of the user claimed by the token, None without it"""
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            return None
+        return (
+            *(validated_token[claim] for claim in USER_CLAIMS),
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+            if api_settings.CHECK_REVOKE_TOKEN
+            else None,
+        )
+
+    def get_user_states(self, user_id):
+        return self.user_model.objects.filter(
+            **{api_settings.USER_ID_FIELD: user_id}
+        ).values_list(*USER_CLAIMS, "password")
+
+    @staticmethod
+    def cache_user_state(user_id, row):
+        if row is None:
+            return None
+        *flags, password = row
+        state = (
+            *flags,
+            get_md5_hash_password(password)
+            if api_settings.CHECK_REVOKE_TOKEN
+            else None,
+        )
+        user_states.set(user_id, state)
+        return state
+
+    def load_user_state(self, user_id):
+        return self.cache_user_state(
+            user_id, self.get_user_states(user_id).first()
+        )
+
+    async def aload_user_state(self, user_id):
+        return self.cache_user_state(
+            user_id, await self.get_user_states(user_id).afirst()
+        )
+
+    def get_claims_user(self, user_id, claims):
+        loaded = dict(
+            zip(USER_CLAIMS, claims), **{api_settings.USER_ID_FIELD: user_id}
+        )
+        fields = self.user_model._meta.concrete_fields
+        # As if loaded by a query, so saving it updates the loaded row
+        return self.user_model.from_db(
+            router.db_for_read(self.user_model),
+            [field.attname for field in fields],
+            [loaded.get(field.attname, DEFERRED) for field in fields],
+        )
+
+
+class ClaimsJWTScheme(SimpleJWTScheme):
+    target_class = "user.authentication.ClaimsJWTAuthentication"
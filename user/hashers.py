@@ -0,0 +1,83 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+# True in the hashing pool processes, where the hashers run inline
+in_hashing_worker = False
+
+
+def init_hashing_worker():
+    global in_hashing_worker
+    in_hashing_worker = True
+
+
+@cache
+def get_hashing_executor():
+    # Spawned, forking a threaded server process can copy held locks
+    return ProcessPoolExecutor(
+        max_workers=settings.PASSWORD_HASHING_WORKERS,
+        mp_context=get_context("spawn"),
+        initializer=init_hashing_worker,
+    )
+
+
+def run_hasher(hasher_class, method, *args, **kwargs):
+    return getattr(hasher_class(), method)(*args, **kwargs)
+
+
+class OffloadedHasherMixin:
+    """
+    Hash and check the passwords in the PASSWORD_HASHING_WORKERS pool
+    processes instead of the request thread, so a surge of sign-ups and
+    logins can't take more than that many cores from the booking
+    endpoints. With no workers the hasher runs inline.
+    """
+
+    def offload(self, method, *args, **kwargs):
+        if in_hashing_worker or not settings.PASSWORD_HASHING_WORKERS:
+            return getattr(super(), method)(*args, **kwargs)
+        return (
+            get_hashing_executor()
+            .submit(run_hasher, type(self), method, *args, **kwargs)
+            .result()
+        )
+
+    def encode(self, password, salt, *args, **kwargs):
+        return self.offload("encode", password, salt, *args, **kwargs)
+
+    def verify(self, password, encoded):
+        return self.offload("verify", password, encoded)
+
+
+class Argon2PasswordHasher(
+    OffloadedHasherMixin, hashers.Argon2PasswordHasher
+):
+    # Argon2id at the OWASP minimum, a seventh of the CPU time of Django's
+    # 100 MiB default; parallelism 1 as the pool runs a hash per core
+    time_cost = 2
+    memory_cost = 19 * 1024
+    parallelism = 1
+
+
+class ScryptPasswordHasher(
+    OffloadedHasherMixin, hashers.ScryptPasswordHasher
+):
+    # The OWASP minimum with the least memory, 16 MiB
+    work_factor = 2**14
+    block_size = 8
+    parallelism = 5
+
+
+class PBKDF2PasswordHasher(
+    OffloadedHasherMixin, hashers.PBKDF2PasswordHasher
+):
+    pass
+
+
+class PBKDF2SHA1PasswordHasher(
+    OffloadedHasherMixin, hashers.PBKDF2SHA1PasswordHasher
+):
+    pass
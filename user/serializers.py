@@ -1,6 +1,9 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from django.utils.translation import gettext as _
+from rest_framework_simplejwt import serializers as jwt_serializers
+
+from user.authentication import USER_CLAIMS
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -32,3 +35,14 @@ class UserSerializer(serializers.ModelSerializer):
             user.save()
 
         return user
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+
+    @classmethod
+    def get_token(cls, user):
+        """Sign the state of the user checked by ClaimsJWTAuthentication"""
+        token = super().get_token(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
@@ -1,3 +1,137 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from user.authentication import user_states
+from user.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    get_hashing_executor,
+    init_hashing_worker,
+)
+
+
+class ClaimsJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+        user_states.clear()
+        self.user = get_user_model().objects.create_user(
+            email="user@planetarium.com", password="test12345"
+        )
+
+    def authenticate(self, password="test12345"):
+        response = self.client.post(
+            reverse("auth:token_obtain_pair"),
+            {"email": self.user.email, "password": password},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {response.data['access']}"
+        )
+
+    def test_claims_user_is_loaded_from_the_database(self):
+        self.authenticate()
+        self.client.get(reverse("auth:manage"))
+
+        response = self.client.get(reverse("auth:manage"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["email"], self.user.email)
+        user = response.renderer_context["request"].user
+        self.assertEqual(user._state.db, "default")
+        self.assertFalse(user._state.adding)
+
+    def test_claims_user_can_be_updated(self):
+        self.authenticate()
+
+        response = self.client.patch(
+            reverse("auth:manage"), {"password": "new12345"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.email, "user@planetarium.com")
+        self.assertTrue(self.user.check_password("new12345"))
+
+    def test_deactivated_user_is_rejected(self):
+        self.authenticate()
+        get_user_model().objects.filter(id=self.user.id).update(
+            is_active=False
+        )
+        user_states.clear()
+
+        response = self.client.get(reverse("auth:manage"))
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(
+    PASSWORD_HASHERS=[
+        "user.hashers.Argon2PasswordHasher",
+        "user.hashers.PBKDF2PasswordHasher",
+    ]
+)
+class PasswordHasherTests(APITestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+
+    def test_new_passwords_are_hashed_with_argon2id(self):
+        user = get_user_model().objects.create_user(
+            email="user@planetarium.com", password="test12345"
+        )
+
+        self.assertTrue(
+            user.password.startswith("argon2$argon2id$v=19$m=19456,t=2,p=1$")
+        )
+        self.assertTrue(user.check_password("test12345"))
+
+    def test_login_rehashes_with_the_preferred_hasher(self):
+        user = get_user_model().objects.create_user(
+            email="user@planetarium.com"
+        )
+        user.password = PBKDF2PasswordHasher().encode(
+            "test12345", "salt", iterations=1000
+        )
+        user.save(update_fields=["password"])
+
+        response = self.client.post(
+            reverse("auth:token_obtain_pair"),
+            {"email": user.email, "password": "test12345"},
+        )
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("argon2$"))
+        self.assertTrue(user.check_password("test12345"))
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1)
+    def test_passwords_are_hashed_in_the_pool(self):
+        get_hashing_executor.cache_clear()
+        executor = get_hashing_executor()
+        self.addCleanup(get_hashing_executor.cache_clear)
+        self.addCleanup(executor.shutdown)
+
+        with mock.patch.object(
+            executor, "submit", wraps=executor.submit
+        ) as submit:
+            user = get_user_model().objects.create_user(
+                email="user@planetarium.com", password="test12345"
+            )
+            self.assertTrue(user.check_password("test12345"))
+            self.assertFalse(user.check_password("wrong"))
+
+        self.assertEqual(submit.call_count, 3)
+        self.assertTrue(user.password.startswith("argon2$argon2id$"))
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1)
+    def test_pool_processes_hash_inline(self):
+        hasher = Argon2PasswordHasher()
+        with mock.patch("user.hashers.in_hashing_worker", False):
+            init_hashing_worker()
+            with mock.patch(
+                "user.hashers.get_hashing_executor"
+            ) as get_executor:
+                encoded = hasher.encode("test12345", hasher.salt())
+                self.assertTrue(hasher.verify("test12345", encoded))
+
+        get_executor.assert_not_called()
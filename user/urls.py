@@ -1,7 +1,6 @@
 from django.urls import path
-from user.views import CreateUserView, ManageUserView
+from user.views import CreateUserView, ManageUserView, TokenObtainPairView
 from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
     TokenRefreshView,
     TokenVerifyView
 )
@@ -1,17 +1,23 @@
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
+from rest_framework_simplejwt import views as jwt_views
 
+from planetarium_api.instrumentation import InstrumentedViewMixin
 from user.serializers import UserSerializer
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(InstrumentedViewMixin, generics.CreateAPIView):
     serializer_class = UserSerializer
     permission_classes = ()
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(InstrumentedViewMixin, generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):
         return self.request.user
+
+
+class TokenObtainPairView(jwt_views.TokenObtainPairView):
+    throttle_scope = "sensitive"